@@ -0,0 +1,83 @@
+"""Check result ingest and API response encoding with each JSON codec.
+
+Decodes synthetic CI log printed by checker (as `run_check()` does),
+encodes it for storage (as `Database.set_revision_check_result()` does)
+and encodes page of revisions listing (as API handlers do).
+
+Usage: python benchmarks/check_ingest.py [--tests N] [--revisions M]
+"""
+
+import argparse
+import base64
+import os
+import time
+
+from testing_server import json_codec
+
+
+def make_check_result(num_tests):
+    def suite(prefix):
+        return dict(
+            exit_code=1,
+            tests=[
+                ['{}_{}.cpp'.format(prefix, idx),
+                 [['build', 'ok', '', None, ['g++', '-std=c++14', '-O2']],
+                  ['run', 'failed' if idx % 7 == 0 else 'ok',
+                   'exit code 1' if idx % 7 == 0 else '',
+                   base64.b64encode(os.urandom(600)).decode()]],
+                 base64.b64encode(os.urandom(300)).decode()]
+                for idx in range(num_tests)])
+
+    return dict(
+        smoke_tests=suite('smoke'),
+        tests=suite('test'),
+        common_header_contents=base64.b64encode(os.urandom(2000)).decode())
+
+
+def make_revisions(num_revisions):
+    return [
+        dict(id=idx, user='user{}'.format(idx % 100),
+             assignment='linked_ptr', solution_id=idx * 3,
+             commit_message="Исправлена ошибка в operator=, #{}".format(idx),
+             state='checked', failure_signature='{:040x}'.format(idx))
+        for idx in range(num_revisions)]
+
+
+def bench(fn, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--revisions', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    check_result = make_check_result(args.tests)
+    revisions = make_revisions(args.revisions)
+    ci_log = json_codec.dumps(check_result)
+
+    print("check result of {} tests: {} KiB, listing of {} revisions".format(
+        args.tests, len(ci_log) // 1024, args.revisions))
+    print("{:<8} {:>14} {:>14} {:>14}".format(
+        "codec", "decode log ms", "encode row ms", "listing ms"))
+
+    for name in json_codec.available():
+        json_codec.use(name)
+        durations = [
+            bench(json_codec.loads, ci_log, args.repeat),
+            bench(json_codec.dumps, check_result, args.repeat),
+            bench(lambda items: b', '.join(
+                json_codec.dumpb(item) for item in items),
+                revisions, args.repeat),
+        ]
+        print("{:<8} {:>14.3f} {:>14.3f} {:>14.3f}".format(
+            name, *(duration * 1000 for duration in durations)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Publisher.publish() throughput with many subscribers.
+
+Usage: python benchmarks/pubsub_publish.py [--subscribers N] [--messages M]
+"""
+
+import argparse
+import asyncio
+import time
+
+from testing_server.pubsub import (
+    Publisher,
+    OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_COALESCE,
+    OVERFLOW_DISCONNECT,
+)
+
+
+def bench(num_subscribers, num_messages, maxsize, overflow, *, loop):
+    pub = Publisher(loop=loop)
+
+    subs = [
+        pub.subscribe('topic', maxsize=maxsize, overflow=overflow,
+                      key=lambda m: m % 10)
+        for _ in range(num_subscribers)]
+
+    start = time.perf_counter()
+    for i in range(num_messages):
+        pub.publish('topic', i)
+    duration = time.perf_counter() - start
+
+    for sub in subs:
+        if not sub.disconnected:
+            sub.close()
+
+    print("{:<12} maxsize={:<6} {:>10.0f} publishes/s "
+          "{:>12.0f} deliveries/s  dropped={}".format(
+              overflow, maxsize,
+              num_messages / duration,
+              num_messages * num_subscribers / duration,
+              pub.dropped))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--maxsize', type=int, default=100)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+
+    print("{} subscribers, {} messages".format(
+        args.subscribers, args.messages))
+    bench(args.subscribers, args.messages, 0, OVERFLOW_DROP_OLDEST,
+          loop=loop)
+    for overflow in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST,
+                     OVERFLOW_COALESCE, OVERFLOW_DISCONNECT):
+        bench(args.subscribers, args.messages, args.maxsize, overflow,
+              loop=loop)
+
+
+if __name__ == '__main__':
+    main()
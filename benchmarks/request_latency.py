@@ -0,0 +1,178 @@
+"""API request latency with default or uvloop event loop and each JSON
+codec.
+
+Starts server with stub database in child process for each combination
+of event loop and JSON codec and requests revision with check result
+(JSend response) and revisions listing (streamed response) from
+concurrent clients. Reports requests per second and latency percentiles.
+
+Usage: python benchmarks/request_latency.py [--clients N] [--requests M]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import aiohttp.web
+
+from testing_server import json_codec
+from testing_server.credentials_checker import HtpasswdCredentialsChecker
+from testing_server.server import Server
+from testing_server.token_provider import JWTTokenProvider
+
+sys.path.insert(0, os.path.dirname(__file__))
+from check_ingest import make_check_result, make_revisions  # noqa
+
+_SECRET = 'secret'
+_USER = 'user0'
+
+
+class _StubDatabase:
+    def __init__(self, num_tests, num_revisions):
+        self._check_result = make_check_result(num_tests)
+        self._revisions = make_revisions(num_revisions)
+
+    async def get_revision(self, id, *, fields):
+        revision = dict(self._revisions[0], user=_USER,
+                        check_result=self._check_result)
+        return {field: revision[field] for field in fields}
+
+    async def get_revisions(self, *, user=None, assignment=None, state=None,
+                            after=None, limit, fields):
+        start = 0 if after is None else after + 1
+        return [
+            {field: revision[field] for field in fields}
+            for revision in self._revisions[start:start + limit]]
+
+
+def serve(port, args):
+    if args.uvloop:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    json_codec.use(args.json_codec)
+
+    loop = asyncio.get_event_loop()
+
+    with tempfile.NamedTemporaryFile() as htpasswd:
+        htpasswd.write(b'user0:password\n')
+        htpasswd.flush()
+
+        app = aiohttp.web.Application(loop=loop)
+        app_server = Server(
+            app,
+            HtpasswdCredentialsChecker(htpasswd.name),
+            JWTTokenProvider(_SECRET),
+            _StubDatabase(args.tests, args.revisions),
+            loop=loop)
+        loop.run_until_complete(app_server.start())
+
+        handler = app.make_handler(access_log=None)
+        server = loop.run_until_complete(
+            loop.create_server(handler, 'localhost', port))
+        print("ready", flush=True)
+
+        # Runs until parent closes stdin.
+        loop.run_until_complete(loop.run_in_executor(None, sys.stdin.read))
+
+        server.close()
+        loop.run_until_complete(app_server.stop())
+        loop.run_until_complete(handler.finish_connections(1))
+
+
+async def run_clients(url, num_clients, num_requests, *, loop):
+    token = await JWTTokenProvider(_SECRET).generate_token(_USER)
+    headers = {'Authorization': 'Bearer ' + token.decode()}
+    latencies = []
+
+    async with aiohttp.ClientSession(loop=loop) as session:
+        async def client():
+            for _ in range(num_requests // num_clients):
+                start = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    assert response.status == 200
+                    await response.read()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[client() for _ in range(num_clients)], loop=loop)
+        duration = time.perf_counter() - start
+
+    latencies.sort()
+    return dict(
+        rps=len(latencies) / duration,
+        p50=latencies[len(latencies) // 2],
+        p99=latencies[int(len(latencies) * 0.99)])
+
+
+def bench(event_loop, codec, args, *, loop):
+    server_args = [
+        sys.executable, __file__, '--serve',
+        '--port', str(args.port),
+        '--json-codec', codec,
+        '--tests', str(args.tests),
+        '--revisions', str(args.revisions)]
+    if event_loop == 'uvloop':
+        server_args.append('--uvloop')
+
+    server = subprocess.Popen(
+        server_args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        env=os.environ.copy())
+    try:
+        assert server.stdout.readline().strip() == b'ready'
+
+        base_url = 'http://localhost:{}/users/{}/linked_ptr/'.format(
+            args.port, _USER)
+        for name, url in (('revision', base_url + '0/'),
+                          ('listing', base_url + '?limit=1000')):
+            stats = loop.run_until_complete(run_clients(
+                url, args.clients, args.requests, loop=loop))
+            print("{:<8} {:<8} {:<10} {:>8.0f} {:>10.2f} {:>10.2f}".format(
+                event_loop, codec, name, stats['rps'],
+                stats['p50'] * 1000, stats['p99'] * 1000))
+    finally:
+        server.stdin.close()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--revisions', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=18081)
+    parser.add_argument('--serve', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--uvloop', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--json-codec', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args)
+        return
+
+    event_loops = ['asyncio']
+    try:
+        import uvloop  # noqa
+        event_loops.append('uvloop')
+    except ImportError:
+        print("uvloop is not installed")
+
+    loop = asyncio.get_event_loop()
+
+    print("{:<8} {:<8} {:<10} {:>8} {:>10} {:>10}".format(
+        "loop", "codec", "request", "req/s", "p50 ms", "p99 ms"))
+    for event_loop in event_loops:
+        for codec in json_codec.available():
+            bench(event_loop, codec, args, loop=loop)
+
+
+if __name__ == '__main__':
+    main()
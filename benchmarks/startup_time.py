@@ -0,0 +1,76 @@
+"""Import time of server script.
+
+Imports `testing_server.scripts.server` in fresh interpreter with
+`python -X importtime` several times and reports median total import
+time and the slowest imported top-level packages. Requires Python 3.7+.
+tests/test_startup.py checks that role-specific packages are not
+imported.
+
+Usage: python benchmarks/startup_time.py [--runs N] [--top K]
+"""
+
+import argparse
+import collections
+import statistics
+import subprocess
+import sys
+import time
+
+_MODULE = 'testing_server.scripts.server'
+
+
+def import_times(module):
+    """Imports module in child interpreter, returns wall time and dict
+    of top-level package -> cumulative import time, both in seconds."""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE, check=True).stderr.decode()
+    duration = time.perf_counter() - start
+
+    times = collections.Counter()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('  ') or not cumulative.strip().isdigit():
+            # Nested import or header.
+            continue
+        package = name.strip().split('.')[0]
+        times[package] += int(cumulative) / 1e6
+    return duration, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--module', default=_MODULE)
+    args = parser.parse_args()
+
+    durations = []
+    totals = []
+    packages = collections.defaultdict(list)
+    for _ in range(args.runs):
+        duration, times = import_times(args.module)
+        durations.append(duration)
+        totals.append(sum(times.values()))
+        for package, package_time in times.items():
+            packages[package].append(package_time)
+
+    print("interpreter with import: {:.1f} ms".format(
+        statistics.median(durations) * 1000))
+    print("imports:                 {:.1f} ms".format(
+        statistics.median(totals) * 1000))
+    print()
+    print("{:<30} {:>10}".format("package", "ms"))
+    slowest = sorted(
+        ((statistics.median(package_times), package)
+         for package, package_times in packages.items()),
+        reverse=True)
+    for package_time, package in slowest[:args.top]:
+        print("{:<30} {:>10.1f}".format(package, package_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Load test of check progress broadcast over web sockets.
+
+Starts server with stub database in child process, connects N web socket
+clients which watch the same revision and publishes events. Reports
+delivery throughput and server CPU time per 1000 connected sockets.
+
+Usage: python benchmarks/ws_broadcast.py [--clients N] [--events M]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import aiohttp.web
+
+from testing_server.credentials_checker import HtpasswdCredentialsChecker
+from testing_server.pubsub import Publisher
+from testing_server.server import Server
+from testing_server.token_provider import JWTTokenProvider
+
+_REVISION_ID = 1
+_SECRET = 'secret'
+
+
+class _StubDatabase:
+    async def get_revision_user(self, revision_id):
+        return 'user'
+
+
+def serve(port, num_clients, num_events, event_size, *, loop):
+    with tempfile.NamedTemporaryFile() as htpasswd:
+        htpasswd.write(b'user:password\n')
+        htpasswd.flush()
+
+        publisher = Publisher(loop=loop)
+        app = aiohttp.web.Application(loop=loop)
+        app_server = Server(
+            app,
+            HtpasswdCredentialsChecker(htpasswd.name),
+            JWTTokenProvider(_SECRET),
+            _StubDatabase(),
+            loop=loop,
+            publisher=publisher,
+            ws_flush_interval=0.05)
+        loop.run_until_complete(app_server.start())
+
+        handler = app.make_handler()
+        server = loop.run_until_complete(
+            loop.create_server(handler, 'localhost', port))
+        print("ready", flush=True)
+
+        async def publish_events():
+            broadcaster = app_server.broadcaster
+            while broadcaster.num_websockets < num_clients:
+                await asyncio.sleep(0.01, loop=loop)
+
+            cpu_start = time.process_time()
+            line = 'x' * event_size
+            for i in range(num_events):
+                publisher.publish(
+                    'check.bench.{}'.format(_REVISION_ID),
+                    {'type': 'output', 'revision': _REVISION_ID,
+                     'line': line, 'seq': i})
+                if i % 100 == 0:
+                    await asyncio.sleep(0, loop=loop)
+
+            while broadcaster.num_websockets > 0:
+                await asyncio.sleep(0.01, loop=loop)
+
+            return dict(
+                cpu=time.process_time() - cpu_start,
+                frames_encoded=broadcaster.frames_encoded,
+                frames_sent=broadcaster.frames_sent,
+                max_rss_kb=resource.getrusage(
+                    resource.RUSAGE_SELF).ru_maxrss)
+
+        stats = loop.run_until_complete(publish_events())
+        print(json.dumps(stats), flush=True)
+
+        server.close()
+        loop.run_until_complete(app_server.stop())
+        loop.run_until_complete(handler.finish_connections(1))
+
+
+async def run_clients(port, num_clients, num_events, *, loop):
+    token = JWTTokenProvider(_SECRET)
+    token = (await token.generate_token('user')).decode()
+
+    url = 'http://localhost:{}/api/ws'.format(port)
+    received = 0
+
+    async with aiohttp.ClientSession(loop=loop) as session:
+        async def client():
+            nonlocal received
+            async with session.ws_connect(url) as ws:
+                ws.send_json({'type': 'AUTH', 'token': token})
+                await ws.receive_json()
+                ws.send_json({
+                    'type': 'SUBSCRIBE', 'token': token,
+                    'revision': _REVISION_ID})
+                await ws.receive_json()
+
+                num_received = 0
+                while num_received < num_events:
+                    data = await ws.receive_json()
+                    num_received += len(data['events'])
+                    received += len(data['events'])
+
+        tasks = [loop.create_task(client()) for _ in range(num_clients)]
+        start = time.perf_counter()
+        await asyncio.gather(*tasks, loop=loop)
+        return time.perf_counter() - start, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--event-size', type=int, default=80)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--serve', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+
+    if args.serve:
+        serve(args.port, args.clients, args.events, args.event_size,
+              loop=loop)
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, __file__, '--serve',
+         '--port', str(args.port),
+         '--clients', str(args.clients),
+         '--events', str(args.events),
+         '--event-size', str(args.event_size)],
+        stdout=subprocess.PIPE, env=os.environ.copy())
+    try:
+        assert server.stdout.readline().strip() == b'ready'
+
+        duration, received = loop.run_until_complete(
+            run_clients(args.port, args.clients, args.events, loop=loop))
+        stats = json.loads(server.stdout.readline().decode())
+    finally:
+        server.wait(timeout=30)
+
+    print("{} clients, {} events of {} bytes".format(
+        args.clients, args.events, args.event_size))
+    print("delivered {} events in {:.2f} s: {:.0f} events/s".format(
+        received, duration, received / duration))
+    print("server CPU: {:.2f} s, {:.3f} s per 1000 sockets".format(
+        stats['cpu'], stats['cpu'] * 1000 / args.clients))
+    print("frames encoded: {}, sent: {}, server max RSS: {} KiB".format(
+        stats['frames_encoded'], stats['frames_sent'], stats['max_rss_kb']))
+
+
+if __name__ == '__main__':
+    main()
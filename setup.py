@@ -43,7 +43,7 @@ setup(
     install_requires=[
         'aiohttp',
         'aiohttp-cors',
-        'aiopg',
+        'aiopg>=0.14.0',
         'async-timeout',
         'asyncssh',
         'aioxmlrpc',
@@ -60,7 +60,9 @@ setup(
     },
     entry_points={
         'console_scripts': [
-            'testing-server=testing_server.scripts.server:main'
+            'testing-server=testing_server.scripts.server:main',
+            'testing-server-migrate-blobs='
+            'testing_server.scripts.migrate_blobs:main',
         ],
     },
 )
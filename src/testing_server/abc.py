@@ -56,3 +56,22 @@ class AbstracePublisher(ABC):
 
 class AbstractDatabase(ABC):
     pass
+
+
+class AbstractBlobStore(ABC):
+
+    @abstractmethod
+    def path(self, blob_id):
+        """Returns path to the file with blob contents."""
+
+    @abstractmethod
+    async def exists(self, blob_id):
+        """Returns is blob stored."""
+
+    @abstractmethod
+    async def read(self, blob_id):
+        """Returns blob contents or None if blob is not stored."""
+
+    @abstractmethod
+    async def store(self, blob_id, data):
+        """Stores blob contents."""
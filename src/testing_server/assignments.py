@@ -0,0 +1,101 @@
+import collections
+import logging
+import posixpath
+
+__all__ = ('Assignment', 'AssignmentRegistry')
+
+_logger = logging.getLogger(__name__)
+
+
+class Assignment(collections.namedtuple(
+        'Assignment',
+        ['id', 'name', 'svn_path', 'trac_component', 'tests_dir',
+         'common_header', 'active'])):
+    __slots__ = ()
+
+    @property
+    def solution_name(self):
+        """Name of solution file, e.g. "linked_ptr.hpp"."""
+        return posixpath.basename(self.svn_path)
+
+    @property
+    def common_header_name(self):
+        return posixpath.basename(self.common_header)
+
+
+class AssignmentRegistry:
+    """In-memory copy of assignments table.
+
+    Assignments are read on each pipeline step, but change rarely, so they
+    are loaded once and reloaded by `refresh()` only when table contents
+    have changed.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._version = None
+
+        # id -> Assignment
+        self._assignments = {}
+        self._active = {}
+        self._path_to_id = {}
+        self._component_to_id = {}
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def all(self):
+        """Dict of id -> Assignment of all assignments."""
+        return self._assignments
+
+    @property
+    def active(self):
+        """Dict of id -> Assignment of active assignments."""
+        return self._active
+
+    def get(self, assignment_id):
+        return self._assignments.get(assignment_id)
+
+    def path_to_assignment_id(self):
+        """Returns dict of SVN path -> id of active assignments."""
+        return self._path_to_id
+
+    def component_to_assignment_id(self):
+        """Returns dict of Trac component -> id of active assignments."""
+        return self._component_to_id
+
+    async def refresh(self):
+        """Reloads assignments if they were changed.
+
+        Returns True if assignments were reloaded.
+        """
+        version = await self._db.get_assignments_version()
+        if version is not None and version == self._version:
+            return False
+
+        assignments = {
+            row['id']: Assignment(**{
+                field: row[field] for field in Assignment._fields})
+            for row in await self._db.get_assignments()}
+
+        # Replaced all at once, so readers never see partially updated
+        # registry.
+        self._assignments = assignments
+        self._active = {
+            assignment_id: assignment
+            for assignment_id, assignment in assignments.items()
+            if assignment.active}
+        self._path_to_id = {
+            assignment.svn_path: assignment_id
+            for assignment_id, assignment in self._active.items()}
+        self._component_to_id = {
+            assignment.trac_component: assignment_id
+            for assignment_id, assignment in self._active.items()}
+        self._version = version
+
+        _logger.info("Loaded {} assignments ({} active)".format(
+            len(assignments), len(self._active)))
+
+        return True
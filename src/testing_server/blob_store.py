@@ -0,0 +1,82 @@
+import contextlib
+import functools
+import logging
+import os
+import re
+import tempfile
+
+from .abc import AbstractBlobStore
+
+__all__ = ('FilesystemBlobStore',)
+
+_logger = logging.getLogger(__name__)
+
+# Blob ids are hex-encoded SHA-256 digests.
+_BLOB_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class FilesystemBlobStore(AbstractBlobStore):
+    """Content-addressed blob storage in sharded directory tree.
+
+    Blob with id "abcdef..." is stored in "<root>/ab/cd/abcdef...".
+    """
+
+    def __init__(self, root, *, loop, executor=None):
+        self._root = os.path.abspath(root)
+        self._loop = loop
+        self._executor = executor
+
+    @property
+    def root(self):
+        return self._root
+
+    def path(self, blob_id):
+        if not _BLOB_ID_RE.match(blob_id):
+            raise ValueError("Invalid blob id: {!r}".format(blob_id))
+        return os.path.join(self._root, blob_id[:2], blob_id[2:4], blob_id)
+
+    async def _run(self, func, *args):
+        return await self._loop.run_in_executor(
+            self._executor, functools.partial(func, *args))
+
+    async def exists(self, blob_id):
+        return await self._run(os.path.isfile, self.path(blob_id))
+
+    async def read(self, blob_id):
+        return await self._run(self._read, self.path(blob_id))
+
+    async def store(self, blob_id, data):
+        await self._run(self._write, self.path(blob_id), data)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        if os.path.isfile(path):
+            # Content addressed: existing file already has the same data.
+            return
+
+        dir_path = os.path.dirname(path)
+        os.makedirs(dir_path, exist_ok=True)
+
+        # Write to temporary file in the same directory and atomically
+        # rename it, so readers never see partially written blob.
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+        _logger.debug("Stored blob {} ({} bytes)".format(path, len(data)))
@@ -0,0 +1,177 @@
+import asyncio
+import collections
+import time
+
+__all__ = ('LRUCache', 'TTLCache')
+
+
+class LRUCache:
+    """LRU cache bounded by total size of stored values.
+
+    Intended for immutable values (e.g. content-addressed blobs), so
+    entries never expire, they only get evicted.
+
+    Concurrent misses for the same key share single fetch.
+    """
+
+    def __init__(self, max_size, *, loop, sizeof=len):
+        self._max_size = max_size
+        self._loop = loop
+        self._sizeof = sizeof
+
+        # key -> (value, size), least recently used first.
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        # key -> fetching task
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            coalesced=self.coalesced,
+            entries=len(self._entries),
+            size=self._size,
+            max_size=self._max_size,
+        )
+
+    async def get(self, key, fetch):
+        """Returns cached value or value returned by `await fetch(key)`.
+
+        None values are not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._loop.create_task(self._fetch(key, fetch))
+            self._pending[key] = task
+        else:
+            self.coalesced += 1
+
+        # Cancellation of one of the waiters shouldn't cancel fetch for
+        # others.
+        return await asyncio.shield(task, loop=self._loop)
+
+    async def _fetch(self, key, fetch):
+        try:
+            value = await fetch(key)
+        finally:
+            del self._pending[key]
+
+        if value is not None:
+            self.put(key, value)
+
+        return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self._max_size:
+            return
+
+        old_entry = self._entries.pop(key, None)
+        if old_entry is not None:
+            self._size -= old_entry[1]
+
+        self._entries[key] = (value, size)
+        self._size += size
+
+        while self._size > self._max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+
+class TTLCache:
+    """LRU cache bounded by number of entries with per-entry expiration
+    time.
+    """
+
+    def __init__(self, max_entries, *, clock=time.time):
+        self._max_entries = max_entries
+        self._clock = clock
+
+        # key -> (value, expiration time), least recently used first.
+        self._entries = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+            expirations=self.expirations,
+            evictions=self.evictions,
+            entries=len(self._entries),
+            max_entries=self._max_entries,
+        )
+
+    def get(self, key):
+        """Returns cached value or None if it's missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, expires):
+        """Caches value until `expires` time (in `clock` units)."""
+        if expires <= self._clock():
+            return
+
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires)
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,117 @@
+"""Helpers for CI check result documents produced by `testing.py`.
+
+Check result has the following structure::
+
+    {
+        'common_header_contents': <blob id>,
+        'smoke_tests': {
+            'exit_code': <int>,
+            'tests': [
+                [test_file_name,
+                 [[stage_name, status, info, log_blob_id(, command)],
+                  ...],
+                 test_source_blob_id],
+                ...
+            ],
+        },
+        'tests': {<same as 'smoke_tests'>},
+    }
+
+Stage status 0 means success.
+"""
+
+import hashlib
+import itertools
+
+__all__ = (
+    'SUITES', 'iter_test_results', 'failures_suite', 'get_failures',
+    'failure_signature', 'group_tests',
+)
+
+SUITES = ('smoke_tests', 'tests')
+
+
+def iter_test_results(check_result):
+    """Yields normalized row (as dict) for each test stage."""
+    for suite in SUITES:
+        tests = check_result[suite]['tests']
+        for test_index, (test_file_name, stages, test_source) in \
+                enumerate(tests):
+            for stage_index, stage_row in enumerate(stages):
+                if len(stage_row) == 5:
+                    stage_name, status, info, log_id, command = stage_row
+                else:
+                    stage_name, status, info, log_id = stage_row
+                    command = None
+
+                yield dict(
+                    suite=suite,
+                    test=test_file_name,
+                    test_index=test_index,
+                    stage=stage_name,
+                    stage_index=stage_index,
+                    status=status,
+                    info=info,
+                    log_blob_id=log_id,
+                    command=command,
+                    source_blob_id=test_source,
+                )
+
+
+def failures_suite(smoke_tests_exit_code):
+    """Returns suite which failures are reported to user.
+
+    Main tests failures are reported only if smoke tests passed.
+    """
+    if smoke_tests_exit_code != 0:
+        return 'smoke_tests'
+    else:
+        return 'tests'
+
+
+def get_failures(check_result):
+    """Returns sorted list of (suite, test, stage, status) of failed stages.
+
+    Same list is returned by `Database.get_revision_failures()` for stored
+    check result.
+    """
+    suite = failures_suite(check_result['smoke_tests']['exit_code'])
+    return sorted(
+        (row['suite'], row['test'], row['stage'], row['status'])
+        for row in iter_test_results(check_result)
+        if row['suite'] == suite and row['status'] != 0)
+
+
+def failure_signature(failures):
+    """Returns compact hash of list returned by `get_failures()`.
+
+    Check results with the same set of failed stages have equal signatures.
+    """
+    hash = hashlib.sha256()
+    for failure in sorted(failures):
+        hash.update('\t'.join(map(str, failure)).encode())
+        hash.update(b'\n')
+    return hash.hexdigest()
+
+
+def group_tests(rows):
+    """Groups normalized rows back into check result tests list.
+
+    Rows should be ordered by test and stage indices.
+    """
+    tests = []
+    for _, test_rows in itertools.groupby(
+            rows, key=lambda row: (row['suite'], row['test_index'])):
+        test_rows = list(test_rows)
+        stages = []
+        for row in test_rows:
+            stage = [row['stage'], row['status'], row['info'],
+                     row['log_blob_id']]
+            if row['command'] is not None:
+                stage.append(row['command'])
+            stages.append(stage)
+
+        tests.append(
+            [test_rows[0]['test'], stages, test_rows[0]['source_blob_id']])
+
+    return tests
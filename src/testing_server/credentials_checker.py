@@ -1,12 +1,108 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import hmac
+import logging
+import os
+import time
+
 from passlib.apache import HtpasswdFile
 
 from .abc import AbstractCredentialsChecker
+from .cache import TTLCache
+
+_logger = logging.getLogger(__name__)
 
 
 class HtpasswdCredentialsChecker(AbstractCredentialsChecker):
 
-    def __init__(self, htpasswd_file):
+    def __init__(self, htpasswd_file, *,
+                 max_workers=4,
+                 cache_ttl=60,
+                 cache_size=1000,
+                 reload_check_interval=1,
+                 loop=None):
+        """
+        :param max_workers: number of threads for password hashes
+            verification, which is too slow to run in event loop.
+        :param cache_ttl: time in seconds for which successful verification
+            is cached.
+        :param reload_check_interval: minimal interval in seconds between
+            checks if htpasswd file was modified.
+        """
+        self._htpasswd_file = htpasswd_file
+        self._cache_ttl = cache_ttl
+        self._reload_check_interval = reload_check_interval
+        self._loop = loop
+
         self._ht = HtpasswdFile(htpasswd_file)
+        self._mtime = os.stat(htpasswd_file).st_mtime
+        self._last_reload_check = time.monotonic()
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+        self._cache = TTLCache(cache_size, clock=time.monotonic)
+        # Cache keys are keyed hashes, so passwords are not kept in memory.
+        self._cache_secret = os.urandom(32)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def close(self):
+        self._executor.shutdown(wait=False)
 
     async def check_password(self, login, password):
-        return self._ht.check_password(login, password)
+        loop = self._loop or asyncio.get_event_loop()
+
+        await self._reload_if_changed(loop)
+
+        key = hmac.new(
+            self._cache_secret,
+            login.encode() + b'\0' + password.encode(),
+            hashlib.sha256).digest()
+        if self._cache.get(key):
+            return True
+
+        # Use current file version even if it is reloaded concurrently.
+        ht = self._ht
+        valid = bool(await loop.run_in_executor(
+            self._executor, ht.check_password, login, password))
+
+        if valid and ht is self._ht:
+            self._cache.put(key, True, time.monotonic() + self._cache_ttl)
+
+        return valid
+
+    async def _reload_if_changed(self, loop):
+        now = time.monotonic()
+        if now - self._last_reload_check < self._reload_check_interval:
+            return
+        self._last_reload_check = now
+
+        try:
+            mtime = os.stat(self._htpasswd_file).st_mtime
+        except OSError:
+            _logger.exception("Failed to stat htpasswd file")
+            return
+
+        if mtime == self._mtime:
+            return
+
+        _logger.info("htpasswd file changed, reloading")
+
+        # Parse new file version aside and replace atomically, so
+        # verifications running in threads are not affected.
+        try:
+            ht = await loop.run_in_executor(
+                self._executor, HtpasswdFile, self._htpasswd_file)
+        except Exception:
+            # E.g. file is being written, previous version is used until
+            # the next successful reload.
+            _logger.exception("Failed to reload htpasswd file")
+            return
+
+        self._ht = ht
+        self._mtime = mtime
+        # Passwords might have been changed or removed.
+        self._cache.clear()
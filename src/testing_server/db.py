@@ -1,56 +1,49 @@
+import datetime
 import logging
 import hashlib
-import json
 
+import psycopg2.extras
 from aiopg.sa import create_engine
+from aiopg.sa.engine import get_dialect
 
 import sqlalchemy
-from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, join
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, LargeBinary, DateTime, Boolean,
+    ForeignKey, Index, join)
 from sqlalchemy.sql.expression import func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import insert, JSONB
 
+from . import json_codec
+from . import metrics
 from .abc import AbstractDatabase
+from .check_result import (
+    iter_test_results, failures_suite, get_failures, failure_signature,
+    group_tests)
+from .revision_fields import REVISION_FIELDS, REVISION_LIST_FIELDS
 
-__all__ = ('Database',)
+__all__ = ('Database', 'REVISION_FIELDS', 'REVISION_LIST_FIELDS')
 
 _logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+_REVISIONS = metrics.Gauge(
+    'revisions', "Number of revisions by assignment and state.",
+    ['assignment', 'state'])
+_POOL_CONNECTIONS = metrics.Gauge(
+    'db_pool_connections', "Number of connections in database pool.",
+    ['state'])
+_POOL_MAX_CONNECTIONS = metrics.Gauge(
+    'db_pool_max_connections', "Maximum size of database pool.")
+
+# JSON values are encoded by SQLAlchemy and decoded by psycopg2 (so
+# SQLAlchemy deserializer does nothing), both use `json_codec`.
+_DIALECT = get_dialect(json_serializer=json_codec.dumps)
+
 _DEBUG_DROP_SCHEMA = False
 _DEBUG_CREATE_SCHEMA = False
 
-# TODO
-LINKED_PTR_ASSIGNMENT_ID = 1
-LINKED_PTR_PATH = "ha3/linked_ptr.hpp"
-LINKED_PTR_COMPONENT = "HA#3 linked_ptr"
-
-LAZY_STRING_ASSIGNMENT_ID = 2
-LAZY_STRING_PATH = "ha5/lazy_string.hpp"
-LAZY_STRING_COMPONENT = "HA#5 lazy_string"
-
-FUNCTION_ASSIGNMENT_ID = 3
-FUNCTION_PATH = "ha4/fn.hpp"
-FUNCTION_COMPONENT = "HA#4 function"
-
-BIND_ASSIGNMENT_ID = 4
-BIND_PATH = "ha6/bind.hpp"
-BIND_COMPONENT = "HA#6 bind"
-
-COMPONENT_TO_ASSIGNMENT_ID = {
-    LINKED_PTR_COMPONENT: LINKED_PTR_ASSIGNMENT_ID,
-    LAZY_STRING_COMPONENT: LAZY_STRING_ASSIGNMENT_ID,
-    FUNCTION_COMPONENT: FUNCTION_ASSIGNMENT_ID,
-    BIND_COMPONENT: BIND_ASSIGNMENT_ID,
-}
-
-PATH_TO_ASSIGNMENT_ID = {
-    LINKED_PTR_PATH: LINKED_PTR_ASSIGNMENT_ID,
-    LAZY_STRING_PATH: LAZY_STRING_ASSIGNMENT_ID,
-    FUNCTION_PATH: FUNCTION_ASSIGNMENT_ID,
-    BIND_PATH: BIND_ASSIGNMENT_ID,
-}
 
 class Assignments(Base):
     __tablename__ = 'assignments'
@@ -66,6 +59,15 @@ class Assignments(Base):
     # "HA#3 linked_ptr"
     trac_component = Column(String, nullable=False)
 
+    # "linked_ptr/tests/"
+    tests_dir = Column(String, nullable=False)
+
+    # "linked_ptr/tests/common.h"
+    common_header = Column(String, nullable=False)
+
+    # Inactive assignments are neither synced nor checked.
+    active = Column(Boolean, nullable=False, server_default=sqlalchemy.true())
+
 
 class Tickets(Base):
     __tablename__ = 'tickets'
@@ -84,11 +86,17 @@ class Blobs(Base):
     __tablename__ = 'blobs'
 
     id = Column(String, primary_key=True)
-    blob = Column(LargeBinary, nullable=False)
+    # NULL if blob contents are stored in blob store.
+    blob = Column(LargeBinary, nullable=True)
+    size = Column(BigInteger, nullable=True)
 
 
 class Revisions(Base):
     __tablename__ = 'revisions'
+    __table_args__ = (
+        Index('ix_revisions_assignment_state', 'assignment_id', 'state'),
+        Index('ix_revisions_user_assignment', 'user', 'assignment_id', 'id'),
+    )
 
     # Subversion commit id.
     id = Column(Integer, primary_key=True)
@@ -104,13 +112,201 @@ class Revisions(Base):
     # 'obsolete', 'new', 'checking', 'checked', 'failed', 'reported'
     state = Column(String, nullable=False)
 
-    # TODO: store normalized or as JSON field.
-    check_result = Column(String, nullable=True)
+    # Checker which is checking revision (in 'checking' state) and when
+    # its claim expires if it will not be renewed.
+    claimed_by = Column(String, nullable=True)
+    claim_expires = Column(DateTime(timezone=True), nullable=True)
+
+    # Whole check result document, normalized test results are stored in
+    # test_results table.
+    check_result = Column(JSONB, nullable=True)
+    # Hash of failed stages in check result, see
+    # `check_result.failure_signature()`.
+    failure_signature = Column(String, nullable=True, index=True)
+
+
+class TestResults(Base):
+    __tablename__ = 'test_results'
+    __table_args__ = (
+        Index('ix_test_results_revision',
+              'revision_id', 'suite', 'test_index', 'stage_index'),
+        Index('ix_test_results_failed',
+              'revision_id', 'suite',
+              postgresql_where=sqlalchemy.text('status <> 0')),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    revision_id = Column(
+        'revision_id', Integer, ForeignKey('revisions.id'),
+        nullable=False)
+    # 'smoke_tests' or 'tests'
+    suite = Column(String, nullable=False)
+    # Test file name.
+    test = Column(String, nullable=False)
+    test_index = Column(Integer, nullable=False)
+    stage = Column(String, nullable=False)
+    stage_index = Column(Integer, nullable=False)
+    # 0 - success, 1 - failure, 2 - warning, 3 - exception.
+    status = Column(Integer, nullable=False)
+    info = Column(String, nullable=True)
+    command = Column(JSONB, nullable=True)
+    log_blob_id = Column(String, nullable=True)
+    source_blob_id = Column(String, nullable=True)
+
+
+class PubsubPayloads(Base):
+    __tablename__ = 'pubsub_payloads'
+
+    # Payloads which don't fit into NOTIFY are passed by reference.
+    id = Column(Integer, primary_key=True)
+    payload = Column(String, nullable=False)
+    created = Column(DateTime(timezone=True), nullable=False,
+                     server_default=func.now())
 
 assignments_tbl = Assignments.__table__
 tickets_tbl = Tickets.__table__
 revisions_tbl = Revisions.__table__
 blobs_tbl = Blobs.__table__
+test_results_tbl = TestResults.__table__
+pubsub_payloads_tbl = PubsubPayloads.__table__
+
+
+# Idempotent statements for upgrading schema of existing deployments.
+SCHEMA_UPGRADE_SQL = [
+    "ALTER TABLE blobs ADD COLUMN IF NOT EXISTS size BIGINT",
+    "ALTER TABLE blobs ALTER COLUMN blob DROP NOT NULL",
+    "UPDATE blobs SET size = octet_length(blob) WHERE size IS NULL",
+
+    # Type change rewrites table, so it's done only once.
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+                AND table_name = 'revisions'
+                AND column_name = 'check_result'
+                AND data_type <> 'jsonb'
+        ) THEN
+            ALTER TABLE revisions ALTER COLUMN check_result TYPE JSONB
+                USING check_result::jsonb;
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS test_results (
+        id SERIAL NOT NULL,
+        revision_id INTEGER NOT NULL,
+        suite VARCHAR NOT NULL,
+        test VARCHAR NOT NULL,
+        test_index INTEGER NOT NULL,
+        stage VARCHAR NOT NULL,
+        stage_index INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        info VARCHAR,
+        command JSONB,
+        log_blob_id VARCHAR,
+        source_blob_id VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(revision_id) REFERENCES revisions (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_test_results_revision ON test_results "
+    "(revision_id, suite, test_index, stage_index)",
+    "CREATE INDEX IF NOT EXISTS ix_test_results_failed ON test_results "
+    "(revision_id, suite) WHERE status <> 0",
+    # Normalize already stored check results.
+    """
+    INSERT INTO test_results (
+        revision_id, suite, test, test_index, stage, stage_index, status,
+        info, command, log_blob_id, source_blob_id)
+    SELECT
+        r.id, s.suite, t.value->>0, t.idx - 1, st.value->>0, st.idx - 1,
+        (st.value->>1)::int, st.value->>2, st.value->4, st.value->>3,
+        t.value->>2
+    FROM revisions r
+    CROSS JOIN (VALUES ('smoke_tests'), ('tests')) AS s(suite)
+    CROSS JOIN LATERAL jsonb_array_elements(
+        r.check_result->s.suite->'tests') WITH ORDINALITY AS t(value, idx)
+    CROSS JOIN LATERAL jsonb_array_elements(
+        t.value->1) WITH ORDINALITY AS st(value, idx)
+    WHERE r.check_result IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM test_results tr WHERE tr.revision_id = r.id)
+    """,
+
+    "ALTER TABLE revisions ADD COLUMN IF NOT EXISTS failure_signature "
+    "VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_revisions_failure_signature "
+    "ON revisions (failure_signature)",
+
+    "ALTER TABLE revisions ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE revisions ADD COLUMN IF NOT EXISTS claim_expires "
+    "TIMESTAMP WITH TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_revisions_assignment_state "
+    "ON revisions (assignment_id, state)",
+    "CREATE INDEX IF NOT EXISTS ix_revisions_user_assignment "
+    "ON revisions (\"user\", assignment_id, id)",
+
+    """
+    CREATE TABLE IF NOT EXISTS pubsub_payloads (
+        id SERIAL NOT NULL,
+        payload VARCHAR NOT NULL,
+        created TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+
+    # Assignments configuration used to be hardcoded.
+    "ALTER TABLE assignments ADD COLUMN IF NOT EXISTS tests_dir VARCHAR",
+    "ALTER TABLE assignments ADD COLUMN IF NOT EXISTS common_header VARCHAR",
+    "ALTER TABLE assignments ADD COLUMN IF NOT EXISTS active BOOLEAN "
+    "DEFAULT true NOT NULL",
+    """
+    INSERT INTO assignments (
+        id, name, svn_path, trac_component, tests_dir, common_header)
+    VALUES
+        (1, 'linked_ptr', 'ha3/linked_ptr.hpp', 'HA#3 linked_ptr',
+         'linked_ptr/tests/', 'linked_ptr/tests/common.h'),
+        (2, 'lazy_string', 'ha5/lazy_string.hpp', 'HA#5 lazy_string',
+         'lazy_string/tests/', 'lazy_string/tests/common.h'),
+        (3, 'function', 'ha4/fn.hpp', 'HA#4 function',
+         'function/tests/', 'function/tests/common.h'),
+        (4, 'bind', 'ha6/bind.hpp', 'HA#6 bind',
+         'bind/tests/', 'bind/tests/common.h')
+    ON CONFLICT (id) DO UPDATE SET
+        tests_dir = coalesce(assignments.tests_dir, EXCLUDED.tests_dir),
+        common_header = coalesce(
+            assignments.common_header, EXCLUDED.common_header)
+    """,
+    "ALTER TABLE assignments ALTER COLUMN tests_dir SET NOT NULL",
+    "ALTER TABLE assignments ALTER COLUMN common_header SET NOT NULL",
+    "SELECT setval(pg_get_serial_sequence('assignments', 'id'), "
+    "(SELECT max(id) FROM assignments))",
+]
+
+def _select_revisions(fields):
+    columns = {
+        'id': revisions_tbl.c.id,
+        'user': revisions_tbl.c.user,
+        'assignment': assignments_tbl.c.name.label('assignment'),
+        'solution_id': revisions_tbl.c.solution_id,
+        'commit_message': revisions_tbl.c.commit_message,
+        'state': revisions_tbl.c.state,
+        'failure_signature': revisions_tbl.c.failure_signature,
+        'check_result': revisions_tbl.c.check_result,
+    }
+
+    join_stmt = sqlalchemy.join(
+        revisions_tbl, assignments_tbl,
+        revisions_tbl.c.assignment_id == assignments_tbl.c.id)
+
+    return sqlalchemy.select(
+        [columns[field] for field in fields]
+    ).select_from(
+        join_stmt
+    )
 
 
 def mock_engine():
@@ -139,18 +335,33 @@ def gen_drop_sql(metadata):
 
 class Database(AbstractDatabase):
 
-    def __init__(self, dsn, *, loop):
+    def __init__(self, dsn, *, loop, blob_store=None, blob_cache=None):
         self._dsn = dsn
         self._loop = loop
+        self._blob_store = blob_store
+        self._blob_cache = blob_cache
         self._engine = None
 
+    @property
+    def blob_store(self):
+        return self._blob_store
+
+    @property
+    def blob_cache(self):
+        return self._blob_cache
+
     @property
     def engine(self):
         assert self._engine is not None
         return self._engine
 
     async def start(self):
-        self._engine = await create_engine(self._dsn, loop=self._loop)
+        for register in (psycopg2.extras.register_default_json,
+                         psycopg2.extras.register_default_jsonb):
+            register(globally=True, loads=json_codec.loads)
+        # Per-connection registration of standard decoders is disabled.
+        self._engine = await create_engine(
+            self._dsn, dialect=_DIALECT, enable_json=False, loop=self._loop)
 
         if _DEBUG_DROP_SCHEMA:
             async with self.engine.acquire() as conn:
@@ -162,40 +373,81 @@ class Database(AbstractDatabase):
                 sql = gen_create_sql(Base.metadata)
                 await conn.execute(sql)
 
-                stmt = assignments_tbl.insert().values(
-                    id=LINKED_PTR_ASSIGNMENT_ID,
-                    name="linked_ptr",
-                    svn_path=LINKED_PTR_PATH,
-                    trac_component=LINKED_PTR_COMPONENT,
-                )
-                await conn.execute(stmt)
-                stmt = assignments_tbl.insert().values(
-                    id=LAZY_STRING_ASSIGNMENT_ID,
-                    name="lazy_string",
-                    svn_path=LAZY_STRING_PATH,
-                    trac_component=LAZY_STRING_COMPONENT,
-                )
-                await conn.execute(stmt)
-                stmt = assignments_tbl.insert().values(
-                    id=FUNCTION_ASSIGNMENT_ID,
-                    name="function",
-                    svn_path=FUNCTION_PATH,
-                    trac_component=FUNCTION_COMPONENT,
-                )
-                await conn.execute(stmt)
-                stmt = assignments_tbl.insert().values(
-                    id=BIND_ASSIGNMENT_ID,
-                    name="bind",
-                    svn_path=BIND_PATH,
-                    trac_component=BIND_COMPONENT,
+            # Initial assignments are inserted by schema upgrade.
+            await self.upgrade_schema()
+
+    async def upgrade_schema(self):
+        async with self.engine.acquire() as conn:
+            for sql in SCHEMA_UPGRADE_SQL:
+                _logger.info("Upgrading schema: {}".format(sql))
+                await conn.execute(sql)
+
+        await self._fill_failure_signatures()
+
+    async def _fill_failure_signatures(self):
+        stmt = sqlalchemy.select(
+            [revisions_tbl.c.id]
+        ).where(
+            revisions_tbl.c.check_result.isnot(None) &
+            revisions_tbl.c.failure_signature.is_(None)
+        )
+
+        async with self.engine.acquire() as conn:
+            ids = []
+            async for row in conn.execute(stmt):
+                ids.append(row.id)
+
+        for id in ids:
+            signature = failure_signature(
+                await self.get_revision_failures(id))
+            async with self.engine.acquire() as conn:
+                stmt = revisions_tbl.update().values(
+                    failure_signature=signature
+                ).where(
+                    revisions_tbl.c.id == id
                 )
                 await conn.execute(stmt)
 
+        _logger.info("Filled failure signatures for {} revisions".format(
+            len(ids)))
+
     async def stop(self):
         self._engine.terminate()
         await self._engine.wait_closed()
         self._engine = None
 
+    async def collect_metrics(self):
+        """Updates revision queue depths and connection pool metrics."""
+        engine = self.engine
+        _POOL_CONNECTIONS.labels('free').set(engine.freesize)
+        _POOL_CONNECTIONS.labels('used').set(engine.size - engine.freesize)
+        _POOL_MAX_CONNECTIONS.set(engine.maxsize)
+
+        join_stmt = sqlalchemy.join(
+            revisions_tbl, assignments_tbl,
+            revisions_tbl.c.assignment_id == assignments_tbl.c.id)
+
+        stmt = sqlalchemy.select([
+            assignments_tbl.c.name,
+            revisions_tbl.c.state,
+            func.count(),
+        ]).select_from(
+            join_stmt
+        ).group_by(
+            assignments_tbl.c.name,
+            revisions_tbl.c.state,
+        )
+
+        async with engine.acquire() as conn:
+            rows = []
+            async for row in conn.execute(stmt):
+                rows.append(row)
+
+        # States which have no revisions anymore are not reported.
+        _REVISIONS.clear()
+        for assignment, state, count in rows:
+            _REVISIONS.labels(assignment, state).set(count)
+
     async def get_last_synced_svn_revision(self):
         async with self.engine.acquire() as conn:
             stmt = sqlalchemy.select([func.max(revisions_tbl.c.id)])
@@ -232,15 +484,174 @@ class Database(AbstractDatabase):
                 stmt))
             await conn.execute(stmt)
 
-    async def reset_revision_checking_state(self):
+    async def reset_expired_revision_claims(self):
+        """Fails checks which claim wasn't renewed in time (e.g. checker
+        died).
+        """
+        stmt = revisions_tbl.update().values(
+            state='failed',
+            claimed_by=None,
+            claim_expires=None,
+        ).where(
+            (revisions_tbl.c.state == 'checking') &
+            (revisions_tbl.c.claim_expires.is_(None) |
+             (revisions_tbl.c.claim_expires < func.now()))
+        )
+        async with self.engine.acquire() as conn:
+            result = await conn.execute(stmt)
+            if result.rowcount:
+                _logger.warning(
+                    "Reset {} revisions with expired checking claim".format(
+                        result.rowcount))
+
+    async def get_assignments(self):
+        """Returns list of all assignments as dicts."""
+        stmt = sqlalchemy.select(
+            [assignments_tbl]
+        ).order_by(
+            assignments_tbl.c.id
+        )
+
+        async with self.engine.acquire() as conn:
+            assignments = []
+            async for row in conn.execute(stmt):
+                assignments.append(dict(row))
+
+        return assignments
+
+    async def get_assignments_version(self):
+        """Returns hash of assignments table contents, which changes when
+        any assignment is added, removed or modified."""
+        stmt = sqlalchemy.text(
+            "SELECT md5(coalesce("
+            "string_agg(a::text, ',' ORDER BY a.id), '')) "
+            "FROM assignments a")
+
+        async with self.engine.acquire() as conn:
+            return await conn.scalar(stmt)
+
+    async def mark_obsolete_revisions(self, assignment_ids):
+        """Marks all revisions of assignments except latest for each user
+        as obsolete."""
+        newer = revisions_tbl.alias('newer')
+        has_newer = sqlalchemy.exists().where(
+            (newer.c.user == revisions_tbl.c.user) &
+            (newer.c.assignment_id == revisions_tbl.c.assignment_id) &
+            (newer.c.id > revisions_tbl.c.id)
+        )
+
         stmt = revisions_tbl.update().values(
-            state='failed'
+            state='obsolete'
         ).where(
-            revisions_tbl.c.state == 'checking'
+            revisions_tbl.c.assignment_id.in_(assignment_ids) &
+            # Running checks will be marked after they finish.
+            revisions_tbl.c.state.notin_(['obsolete', 'checking']) &
+            has_newer
         )
+
         async with self.engine.acquire() as conn:
             await conn.execute(stmt)
 
+    async def claim_checkable_solution(self, assignment_ids, owner, lease):
+        """Atomically moves one checkable revision of one of assignments
+        to 'checking' state.
+
+        Revisions are claimed by `owner` for `lease` seconds (claim should
+        be renewed with `renew_revision_claim()`). Revisions claimed by
+        concurrent checkers are skipped.
+
+        Returns (revision id, assignment id) of claimed revision or None
+        if there is nothing to check.
+        """
+        newer = revisions_tbl.alias('newer')
+        has_newer = sqlalchemy.exists().where(
+            (newer.c.user == revisions_tbl.c.user) &
+            (newer.c.assignment_id == revisions_tbl.c.assignment_id) &
+            (newer.c.id > revisions_tbl.c.id)
+        )
+
+        join_stmt = sqlalchemy.join(
+            revisions_tbl, tickets_tbl,
+            (tickets_tbl.c.user == revisions_tbl.c.user) &
+            (tickets_tbl.c.assignment_id == revisions_tbl.c.assignment_id))
+
+        checkable = revisions_tbl.c.state.in_(['new', 'failed'])
+
+        candidate = sqlalchemy.select(
+            [revisions_tbl.c.id]
+        ).select_from(
+            join_stmt
+        ).where(
+            revisions_tbl.c.assignment_id.in_(assignment_ids) &
+            checkable &
+            ~has_newer
+        ).order_by(
+            # New revisions first.
+            revisions_tbl.c.state == 'failed',
+            revisions_tbl.c.id,
+        ).limit(1).with_for_update(
+            of=revisions_tbl, skip_locked=True
+        )
+
+        stmt = revisions_tbl.update().values(
+            state='checking',
+            claimed_by=owner,
+            claim_expires=func.now() + datetime.timedelta(seconds=lease),
+        ).where(
+            (revisions_tbl.c.id == candidate.as_scalar()) &
+            checkable
+        ).returning(
+            revisions_tbl.c.id,
+            revisions_tbl.c.assignment_id,
+        )
+
+        async with self.engine.acquire() as conn:
+            rows = []
+            async for row in conn.execute(stmt):
+                rows.append(row)
+
+        if not rows:
+            return None
+
+        revision_id, assignment_id = rows[0]
+        _logger.debug("Revision {} claimed by {!r}".format(
+            revision_id, owner))
+
+        return revision_id, assignment_id
+
+    async def renew_revision_claim(self, id, owner, lease):
+        """Returns False if revision is not claimed by `owner` anymore."""
+        stmt = revisions_tbl.update().values(
+            claim_expires=func.now() + datetime.timedelta(seconds=lease),
+        ).where(
+            (revisions_tbl.c.id == id) &
+            (revisions_tbl.c.state == 'checking') &
+            (revisions_tbl.c.claimed_by == owner)
+        )
+
+        async with self.engine.acquire() as conn:
+            result = await conn.execute(stmt)
+            return result.rowcount > 0
+
+    async def release_revision_claim(self, id, owner, state):
+        """Moves revision claimed by `owner` to `state`.
+
+        Returns False if revision is not claimed by `owner` anymore.
+        """
+        stmt = revisions_tbl.update().values(
+            state=state,
+            claimed_by=None,
+            claim_expires=None,
+        ).where(
+            (revisions_tbl.c.id == id) &
+            (revisions_tbl.c.state == 'checking') &
+            (revisions_tbl.c.claimed_by == owner)
+        )
+
+        async with self.engine.acquire() as conn:
+            result = await conn.execute(stmt)
+            return result.rowcount > 0
+
     async def get_revision_state(self, id):
         async with self.engine.acquire() as conn:
             stmt = sqlalchemy.select(
@@ -267,19 +678,179 @@ class Database(AbstractDatabase):
             ).where(
                 revisions_tbl.c.id == id
             )
-            data = await conn.scalar(stmt)
-            if data is not None:
-                return json.loads(data)
+            return await conn.scalar(stmt)
+
+    async def set_revision_check_result(self, id, check_result, *,
+                                        owner=None):
+        """Stores check result of revision.
+
+        If `owner` is given, result is stored only if revision is still
+        claimed by it. Returns False if result is not stored.
+        """
+        test_results = [
+            dict(revision_id=id, **row)
+            for row in iter_test_results(check_result)]
+
+        signature = failure_signature(get_failures(check_result))
 
-    async def set_revision_check_result(self, id, check_result):
         async with self.engine.acquire() as conn:
-            stmt = revisions_tbl.update().values(
-                check_result=json.dumps(check_result)
+            async with conn.begin():
+                condition = revisions_tbl.c.id == id
+                if owner is not None:
+                    condition &= (
+                        (revisions_tbl.c.state == 'checking') &
+                        (revisions_tbl.c.claimed_by == owner))
+
+                stmt = revisions_tbl.update().values(
+                    check_result=check_result,
+                    failure_signature=signature,
+                ).where(condition)
+                _logger.debug("Update SQL statement {}".format(stmt))
+                result = await conn.execute(stmt)
+                if not result.rowcount:
+                    return False
+
+                stmt = test_results_tbl.delete().where(
+                    test_results_tbl.c.revision_id == id)
+                await conn.execute(stmt)
+
+                if test_results:
+                    stmt = test_results_tbl.insert().values(test_results)
+                    await conn.execute(stmt)
+
+        return True
+
+    async def get_revision_failure_signature(self, id):
+        async with self.engine.acquire() as conn:
+            stmt = sqlalchemy.select(
+                [revisions_tbl.c.failure_signature]
             ).where(
                 revisions_tbl.c.id == id
             )
-            _logger.debug("Update SQL statement {}".format(stmt))
-            await conn.execute(stmt)
+            return await conn.scalar(stmt)
+
+    async def get_revision_check_summary(self, id):
+        """Returns (smoke tests exit code, tests exit code, common header
+        blob id) or None if revision is not checked.
+        """
+        check_result = revisions_tbl.c.check_result
+        stmt = sqlalchemy.select([
+            check_result[('smoke_tests', 'exit_code')].astext,
+            check_result[('tests', 'exit_code')].astext,
+            check_result['common_header_contents'].astext,
+        ]).where(
+            (revisions_tbl.c.id == id) &
+            check_result.isnot(None)
+        )
+
+        async with self.engine.acquire() as conn:
+            rows = []
+            async for row in conn.execute(stmt):
+                rows.append(row)
+
+        if not rows:
+            return None
+
+        smoke_tests_exit_code, tests_exit_code, common_header_id = rows[0]
+        return (int(smoke_tests_exit_code), int(tests_exit_code),
+                common_header_id)
+
+    async def get_revision_failed_tests(self, id, suite):
+        """Returns list of tests in check result format which have failed
+        stages.
+        """
+        failed_tests = sqlalchemy.select(
+            [test_results_tbl.c.test_index]
+        ).where(
+            (test_results_tbl.c.revision_id == id) &
+            (test_results_tbl.c.suite == suite) &
+            (test_results_tbl.c.status != 0)
+        )
+
+        stmt = sqlalchemy.select(
+            [test_results_tbl]
+        ).where(
+            (test_results_tbl.c.revision_id == id) &
+            (test_results_tbl.c.suite == suite) &
+            test_results_tbl.c.test_index.in_(failed_tests)
+        ).order_by(
+            test_results_tbl.c.test_index,
+            test_results_tbl.c.stage_index,
+        )
+
+        async with self.engine.acquire() as conn:
+            rows = []
+            async for row in conn.execute(stmt):
+                rows.append(dict(row))
+
+        return group_tests(rows)
+
+    async def get_revision_failures(self, id):
+        """Returns sorted list of (suite, test, stage, status) of stages
+        failed in reported suite or None if revision is not checked.
+
+        See `check_result.get_failures()`.
+        """
+        summary = await self.get_revision_check_summary(id)
+        if summary is None:
+            return None
+
+        suite = failures_suite(summary[0])
+
+        stmt = sqlalchemy.select([
+            test_results_tbl.c.suite,
+            test_results_tbl.c.test,
+            test_results_tbl.c.stage,
+            test_results_tbl.c.status,
+        ]).where(
+            (test_results_tbl.c.revision_id == id) &
+            (test_results_tbl.c.suite == suite) &
+            (test_results_tbl.c.status != 0)
+        )
+
+        async with self.engine.acquire() as conn:
+            failures = []
+            async for row in conn.execute(stmt):
+                failures.append(tuple(row))
+
+        return sorted(failures)
+
+    async def get_test_failure_stats(self, assignment_id):
+        """Returns list of (suite, test, stage, number of failed revisions)
+        for actual (not obsolete) revisions, most failing first.
+        """
+        join_stmt = sqlalchemy.join(
+            test_results_tbl, revisions_tbl,
+            test_results_tbl.c.revision_id == revisions_tbl.c.id)
+
+        num_revisions = func.count(
+            sqlalchemy.distinct(test_results_tbl.c.revision_id))
+
+        stmt = sqlalchemy.select([
+            test_results_tbl.c.suite,
+            test_results_tbl.c.test,
+            test_results_tbl.c.stage,
+            num_revisions.label('num_revisions'),
+        ]).select_from(
+            join_stmt
+        ).where(
+            (revisions_tbl.c.assignment_id == assignment_id) &
+            (revisions_tbl.c.state != 'obsolete') &
+            (test_results_tbl.c.status != 0)
+        ).group_by(
+            test_results_tbl.c.suite,
+            test_results_tbl.c.test,
+            test_results_tbl.c.stage,
+        ).order_by(
+            num_revisions.desc()
+        )
+
+        async with self.engine.acquire() as conn:
+            stats = []
+            async for row in conn.execute(stmt):
+                stats.append(tuple(row))
+
+        return stats
 
     async def get_revision_user(self, id):
         stmt = sqlalchemy.select(
@@ -302,7 +873,8 @@ class Database(AbstractDatabase):
             (revisions_tbl.c.solution_id == blobs_tbl.c.id))
 
         stmt = sqlalchemy.select(
-            [revisions_tbl.c.user, blobs_tbl.c.blob]
+            [revisions_tbl.c.user, revisions_tbl.c.solution_id,
+             blobs_tbl.c.blob]
         ).where(
             revisions_tbl.c.id == id
         ).select_from(
@@ -315,10 +887,125 @@ class Database(AbstractDatabase):
                 rows.append(row)
 
         assert len(rows) == 1
+        user, solution_id, blob = rows[0]
+
+        if blob is None:
+            blob = await self._read_stored_blob(solution_id)
+
+        return user, blob
+
+    async def get_revisions(self, *, user=None, assignment=None, state=None,
+                            after=None, limit, fields=REVISION_LIST_FIELDS):
+        """Returns page of revisions ordered by id as list of dicts.
+
+        Revisions are paginated by id: next page starts after the last
+        returned revision id.
+
+        :param assignment: assignment name.
+        :param fields: requested fields, subset of `REVISION_FIELDS`.
+        """
+        condition = sqlalchemy.true()
+        if user is not None:
+            condition &= revisions_tbl.c.user == user
+        if assignment is not None:
+            condition &= assignments_tbl.c.name == assignment
+        if state is not None:
+            condition &= revisions_tbl.c.state == state
+        if after is not None:
+            condition &= revisions_tbl.c.id > after
+
+        stmt = _select_revisions(fields).where(
+            condition
+        ).order_by(
+            revisions_tbl.c.id
+        ).limit(limit)
+
+        async with self.engine.acquire() as conn:
+            revisions = []
+            async for row in conn.execute(stmt):
+                revisions.append(dict(zip(fields, row)))
+
+        return revisions
 
-        return rows[0][0], rows[0][1]
+    async def get_revision(self, id, *, fields=REVISION_FIELDS):
+        """Returns revision as dict or None if it doesn't exist."""
+        stmt = _select_revisions(fields).where(revisions_tbl.c.id == id)
+
+        async with self.engine.acquire() as conn:
+            rows = []
+            async for row in conn.execute(stmt):
+                rows.append(row)
+
+        if rows:
+            return dict(zip(fields, rows[0]))
+        else:
+            return None
+
+    async def get_users(self, *, after=None, limit):
+        """Returns page of users with tickets ordered by user name.
+
+        Each user is returned as dict with list of assignments with
+        ticket id and last revision id.
+        """
+        condition = sqlalchemy.true()
+        if after is not None:
+            condition = tickets_tbl.c.user > after
+
+        users = sqlalchemy.select(
+            [tickets_tbl.c.user]
+        ).distinct().where(
+            condition
+        ).order_by(
+            tickets_tbl.c.user
+        ).limit(limit)
+
+        last_revision = sqlalchemy.select(
+            [func.max(revisions_tbl.c.id)]
+        ).where(
+            (revisions_tbl.c.user == tickets_tbl.c.user) &
+            (revisions_tbl.c.assignment_id == tickets_tbl.c.assignment_id)
+        ).as_scalar()
+
+        join_stmt = sqlalchemy.join(
+            tickets_tbl, assignments_tbl,
+            tickets_tbl.c.assignment_id == assignments_tbl.c.id)
+
+        stmt = sqlalchemy.select([
+            tickets_tbl.c.user,
+            assignments_tbl.c.name,
+            tickets_tbl.c.id,
+            last_revision,
+        ]).select_from(
+            join_stmt
+        ).where(
+            tickets_tbl.c.user.in_(users)
+        ).order_by(
+            tickets_tbl.c.user,
+            assignments_tbl.c.name,
+        )
+
+        result = []
+        async with self.engine.acquire() as conn:
+            async for user, assignment, ticket_id, last_revision in \
+                    conn.execute(stmt):
+                if not result or result[-1]['user'] != user:
+                    result.append(dict(user=user, assignments=[]))
+                result[-1]['assignments'].append(dict(
+                    assignment=assignment,
+                    ticket_id=ticket_id,
+                    last_revision=last_revision,
+                ))
+
+        return result
 
     async def get_blob(self, blob_id):
+        if self._blob_cache is not None:
+            # Blob ids are content hashes, so cached blobs never get stale.
+            return await self._blob_cache.get(blob_id, self._get_blob)
+        else:
+            return await self._get_blob(blob_id)
+
+    async def _get_blob(self, blob_id):
         stmt = sqlalchemy.select(
             [blobs_tbl.c.blob]
         ).where(blobs_tbl.c.id == blob_id)
@@ -328,10 +1015,23 @@ class Database(AbstractDatabase):
             async for row in conn.execute(stmt):
                 rows.append(row)
 
-            if rows:
-                return rows[0].blob
-            else:
-                return None
+        if not rows:
+            return None
+
+        if rows[0].blob is None:
+            return await self._read_stored_blob(blob_id)
+        else:
+            return rows[0].blob
+
+    async def _read_stored_blob(self, blob_id):
+        assert self._blob_store is not None, \
+            "Blob {} is not stored in database, but blob store is not " \
+            "configured".format(blob_id)
+        data = await self._blob_store.read(blob_id)
+        if data is None:
+            raise RuntimeError(
+                "Blob {} is missing in blob store".format(blob_id))
+        return data
 
     async def store_blob(self, data):
         hash = hashlib.sha256()
@@ -347,10 +1047,17 @@ class Database(AbstractDatabase):
                 found, stmt
             ))
             if not found:
+                if self._blob_store is not None:
+                    # Blob file must exist before it's referenced from
+                    # database.
+                    await self._blob_store.store(id, data)
+                    values = dict(id=id, blob=None, size=len(data))
+                else:
+                    values = dict(id=id, blob=data, size=len(data))
+
                 # Still might be inserted in background.
                 stmt = insert(blobs_tbl).values(
-                    id=id,
-                    blob=data,
+                    **values
                 ).on_conflict_do_nothing(
                     index_elements=['id']
                 )
@@ -358,6 +1065,45 @@ class Database(AbstractDatabase):
 
         return id
 
+    async def migrate_blobs_to_store(self, batch_size=100):
+        """Moves blobs contents from database to blob store.
+
+        Returns number of migrated blobs.
+        """
+        assert self._blob_store is not None
+
+        num_migrated = 0
+        while True:
+            stmt = sqlalchemy.select(
+                [blobs_tbl.c.id, blobs_tbl.c.blob]
+            ).where(
+                blobs_tbl.c.blob.isnot(None)
+            ).limit(batch_size)
+
+            async with self.engine.acquire() as conn:
+                rows = []
+                async for row in conn.execute(stmt):
+                    rows.append(row)
+
+                if not rows:
+                    return num_migrated
+
+                for row in rows:
+                    data = bytes(row.blob)
+                    await self._blob_store.store(row.id, data)
+
+                    stmt = blobs_tbl.update().values(
+                        blob=None,
+                        size=len(data),
+                    ).where(
+                        blobs_tbl.c.id == row.id
+                    )
+                    await conn.execute(stmt)
+
+                    num_migrated += 1
+
+            _logger.info("Migrated {} blobs".format(num_migrated))
+
     async def get_user_with_tickets(self, course, assignment):
         async with self.engine.acquire() as conn:
             stmt = sqlalchemy.select(
@@ -424,20 +1170,21 @@ class Database(AbstractDatabase):
 
         return [solution.id for solution in solutions]
 
-    async def get_reportable_solutions(self, assignment_id):
+    async def get_reportable_solutions(self, assignment_ids):
+        """Returns list of (revision id, ticket id, assignment id) of
+        checked revisions of assignments."""
         join_stmt = sqlalchemy.join(
             tickets_tbl, revisions_tbl,
             (tickets_tbl.c.user == revisions_tbl.c.user) &
             (tickets_tbl.c.assignment_id == revisions_tbl.c.assignment_id))
 
         stmt = sqlalchemy.select(
-            [revisions_tbl.c.id, revisions_tbl.c.user,
-             revisions_tbl.c.solution_id, revisions_tbl.c.commit_message,
-             tickets_tbl.c.id.label('ticket_id'), revisions_tbl.c.state]
+            [revisions_tbl.c.id, tickets_tbl.c.id.label('ticket_id'),
+             revisions_tbl.c.assignment_id]
         ).select_from(
             join_stmt
         ).where(
-            (tickets_tbl.c.assignment_id == assignment_id) &
+            revisions_tbl.c.assignment_id.in_(assignment_ids) &
             (revisions_tbl.c.state == 'checked')
         ).order_by(
             revisions_tbl.c.id
@@ -453,4 +1200,38 @@ class Database(AbstractDatabase):
 
         _logger.debug("Reportable solutions:\n{!r}".format(solutions))
 
-        return [(solution.id, solution.ticket_id) for solution in solutions]
+        return [tuple(solution) for solution in solutions]
+
+    async def notify(self, channel, payload):
+        async with self.engine.acquire() as conn:
+            await conn.execute(
+                sqlalchemy.select([func.pg_notify(channel, payload)]))
+
+    async def store_pubsub_payload(self, payload):
+        stmt = pubsub_payloads_tbl.insert().values(
+            payload=payload
+        ).returning(
+            pubsub_payloads_tbl.c.id
+        )
+
+        async with self.engine.acquire() as conn:
+            return await conn.scalar(stmt)
+
+    async def get_pubsub_payload(self, id):
+        stmt = sqlalchemy.select(
+            [pubsub_payloads_tbl.c.payload]
+        ).where(
+            pubsub_payloads_tbl.c.id == id
+        )
+
+        async with self.engine.acquire() as conn:
+            return await conn.scalar(stmt)
+
+    async def delete_old_pubsub_payloads(self, max_age):
+        stmt = pubsub_payloads_tbl.delete().where(
+            pubsub_payloads_tbl.c.created <
+            func.now() - datetime.timedelta(seconds=max_age)
+        )
+
+        async with self.engine.acquire() as conn:
+            await conn.execute(stmt)
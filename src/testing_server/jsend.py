@@ -1,11 +1,12 @@
 import functools
-import json
 import logging
 import traceback
 
 import aiohttp.web
 from aiohttp import hdrs
 
+from . import json_codec
+
 __all__ = ('JSendError', 'JSendFail', 'jsend_handler')
 
 JSEND_DUMP_TRACEBACKS = False
@@ -48,7 +49,11 @@ def jsend_handler(handler):
         headers = None
 
         try:
-            response['data'] = await handler(*args)
+            data = await handler(*args)
+            if isinstance(data, aiohttp.web.StreamResponse):
+                # Handler has already streamed response by itself.
+                return data
+            response['data'] = data
 
         except JSendFail as ex:
             http_code = ex.http_code
@@ -93,7 +98,7 @@ def jsend_handler(handler):
                 "Handler raised unknown exception.")
 
         try:
-            text = json.dumps(response)
+            text = json_codec.dumps(response)
         except TypeError:
             _logger.exception("Response serialization failed.")
 
@@ -0,0 +1,123 @@
+"""JSON encoding and decoding with the fastest available library.
+
+By default orjson is used if it's installed, then ujson, then standard
+`json` module. All JSON (de)serialization of server goes through this
+module, so codec may be switched by `use()` at startup.
+"""
+
+import collections
+import json
+import logging
+
+__all__ = ('dumps', 'dumpb', 'loads', 'use', 'available', 'current',
+           'JSONDecodeError')
+
+_logger = logging.getLogger(__name__)
+
+# All codecs raise subclasses of ValueError on invalid input.
+JSONDecodeError = ValueError
+
+_Codec = collections.namedtuple('_Codec', 'name dumps dumpb loads')
+
+
+def _make_orjson():
+    import orjson
+
+    # Standard `json` converts non-string keys (e.g. ints) too.
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj):
+        return orjson.dumps(obj, option=option)
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=option).decode()
+
+    return _Codec('orjson', dumps, dumpb, orjson.loads)
+
+
+def _make_ujson():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False)
+
+    def dumpb(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode()
+
+    return _Codec('ujson', dumps, dumpb, ujson.loads)
+
+
+def _make_json():
+    def dumpb(obj):
+        return json.dumps(obj).encode()
+
+    return _Codec('json', json.dumps, dumpb, json.loads)
+
+
+# Codecs in order of preference.
+_FACTORIES = collections.OrderedDict([
+    ('orjson', _make_orjson),
+    ('ujson', _make_ujson),
+    ('json', _make_json),
+])
+
+_codec = None
+
+
+def available():
+    """Returns names of installed codecs in order of preference."""
+    names = []
+    for name, factory in _FACTORIES.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name=None):
+    """Selects codec by name or the fastest installed one if `name` is
+    None. Returns name of selected codec.
+
+    Raises ImportError if requested codec is not installed.
+    """
+    global _codec
+
+    if name is not None:
+        if name not in _FACTORIES:
+            raise ValueError("Unknown JSON codec {!r}".format(name))
+        _codec = _FACTORIES[name]()
+    else:
+        for factory in _FACTORIES.values():
+            try:
+                _codec = factory()
+            except ImportError:
+                continue
+            break
+
+    _logger.debug("Using JSON codec {!r}".format(_codec.name))
+    return _codec.name
+
+
+def current():
+    """Returns name of currently used codec."""
+    return _codec.name
+
+
+def dumps(obj):
+    """Serializes object to JSON str."""
+    return _codec.dumps(obj)
+
+
+def dumpb(obj):
+    """Serializes object to UTF-8 encoded JSON bytes."""
+    return _codec.dumpb(obj)
+
+
+def loads(data):
+    """Deserializes JSON from str or bytes."""
+    return _codec.loads(data)
+
+
+use()
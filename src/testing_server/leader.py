@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import logging
+import time
+
+from . import metrics
+
+__all__ = ('LeaderElection', 'LeaderScheduler', 'advisory_lock_key')
+
+_logger = logging.getLogger(__name__)
+
+_IS_LEADER = metrics.Gauge(
+    'scheduler_leader',
+    "Whether this process is leader (1) or standby (0) for scheduler.",
+    ['scheduler'])
+
+
+def advisory_lock_key(namespace, name):
+    """Returns PostgreSQL advisory lock key (signed 64-bit integer) for
+    name, the same in all processes."""
+    digest = hashlib.sha256('{}:{}'.format(namespace, name).encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+class LeaderElection:
+    """Elects single process among replicas to run each background job.
+
+    Leadership is session-level PostgreSQL advisory lock per scheduler
+    name. All locks of process are held on single dedicated connection,
+    so PostgreSQL releases them as soon as the process dies or its
+    connection breaks. Standby processes try to take locks every
+    `poll_interval` seconds, which bounds failover time.
+    """
+
+    def __init__(self, db, *,
+                 namespace='testing_server',
+                 poll_interval=5,
+                 loop):
+        self._db = db
+        self._namespace = namespace
+        self._poll_interval = poll_interval
+        self._loop = loop
+
+        # Serializes queries on dedicated connection.
+        self._conn_lock = asyncio.Lock(loop=loop)
+        self._conn = None
+        self._task = None
+        self._last_poll = None
+
+        # name -> LeaderScheduler
+        self._candidates = collections.OrderedDict()
+
+    @property
+    def healthy(self):
+        """Is election running and was the last poll recent."""
+        if self._task is None or self._last_poll is None:
+            return False
+        return time.monotonic() - self._last_poll < 3 * self._poll_interval
+
+    def wrap(self, scheduler):
+        """Returns scheduler which runs only while this process is leader
+        for scheduler name."""
+        return LeaderScheduler(
+            self, scheduler,
+            advisory_lock_key(self._namespace, scheduler.name))
+
+    async def start(self):
+        assert self._task is None
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        assert self._task is not None
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+        async with self._conn_lock:
+            await self._resign_all()
+
+    async def _add(self, candidate):
+        assert candidate.name not in self._candidates, \
+            "Scheduler {!r} is already added".format(candidate.name)
+        self._candidates[candidate.name] = candidate
+
+    async def _remove(self, candidate):
+        async with self._conn_lock:
+            del self._candidates[candidate.name]
+            if not candidate.is_leader:
+                return
+
+            await candidate._resign()
+            if self._conn is not None:
+                try:
+                    await self._conn.scalar(
+                        'SELECT pg_advisory_unlock(%(key)s)',
+                        key=candidate.lock_key)
+                except Exception:
+                    _logger.exception(
+                        "Failed to release leadership for {!r}".format(
+                            candidate.name))
+                    await self._close_connection()
+
+    async def _run(self):
+        while True:
+            try:
+                async with self._conn_lock:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception("Leader election failed, resigning")
+                async with self._conn_lock:
+                    await self._resign_all()
+
+            await asyncio.sleep(self._poll_interval, loop=self._loop)
+
+    async def _poll(self):
+        if self._conn is None:
+            self._conn = await self._db.engine.acquire()
+
+        standby = [candidate for candidate in self._candidates.values()
+                   if not candidate.is_leader and not candidate.draining]
+        if not standby:
+            # Raises if connection is broken, i.e. locks are lost.
+            await self._conn.scalar('SELECT 1')
+            self._last_poll = time.monotonic()
+            return
+
+        # All locks are tried in single round trip.
+        acquired_keys = set()
+        async for key, acquired in self._conn.execute(
+                'SELECT key, pg_try_advisory_lock(key) '
+                'FROM unnest(%(keys)s::bigint[]) AS key',
+                keys=[candidate.lock_key for candidate in standby]):
+            if acquired:
+                acquired_keys.add(key)
+        self._last_poll = time.monotonic()
+
+        for candidate in standby:
+            if candidate.lock_key in acquired_keys:
+                _logger.info("Became leader for {!r}".format(candidate.name))
+                await candidate._lead()
+
+    async def _resign_all(self):
+        # Jobs are stopped before locks are released, so they never run in
+        # two processes at once.
+        for candidate in self._candidates.values():
+            if candidate.is_leader:
+                await candidate._resign()
+
+        await self._close_connection()
+
+    async def _close_connection(self):
+        conn, self._conn = self._conn, None
+        self._last_poll = None
+        if conn is None:
+            return
+
+        try:
+            # Connection returns to pool, so it must not keep locks.
+            await conn.execute('SELECT pg_advisory_unlock_all()')
+        except Exception:
+            # Broken connection is discarded by pool.
+            _logger.exception("Failed to release advisory locks")
+        finally:
+            self._db.engine.release(conn)
+
+
+class LeaderScheduler:
+    """Scheduler which runs only while this process is leader for its name.
+
+    Has the same interface as `PeriodicScheduler`, standby scheduler is
+    healthy while leader election works.
+    """
+
+    def __init__(self, election, scheduler, lock_key):
+        self._election = election
+        self._scheduler = scheduler
+        self._lock_key = lock_key
+        self._is_leader = False
+        self._draining = False
+        self._is_leader_gauge = _IS_LEADER.labels(scheduler.name)
+
+    @property
+    def name(self):
+        return self._scheduler.name
+
+    @property
+    def lock_key(self):
+        return self._lock_key
+
+    @property
+    def is_leader(self):
+        return self._is_leader
+
+    @property
+    def draining(self):
+        return self._draining
+
+    @property
+    def healthy(self):
+        if self._is_leader:
+            return self._scheduler.healthy
+        return self._election.healthy
+
+    def status(self):
+        return dict(self._scheduler.status(),
+                    healthy=self.healthy, leader=self._is_leader)
+
+    def trigger(self):
+        self._scheduler.trigger()
+
+    async def start(self):
+        await self._election._add(self)
+
+    async def stop(self):
+        await self._election._remove(self)
+
+    async def drain(self, timeout):
+        """Finishes current run if this process is leader, leadership
+        is not taken anymore."""
+        self._draining = True
+        if self._is_leader:
+            await self._scheduler.drain(timeout)
+
+    async def _lead(self):
+        await self._scheduler.start()
+        self._is_leader = True
+        self._is_leader_gauge.set(1)
+
+    async def _resign(self):
+        _logger.info("Resigning leadership for {!r}".format(self.name))
+        self._is_leader = False
+        self._is_leader_gauge.set(0)
+        await self._scheduler.stop()
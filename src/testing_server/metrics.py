@@ -0,0 +1,255 @@
+import bisect
+import collections
+import contextlib
+import logging
+import math
+import time
+
+__all__ = ('Counter', 'Gauge', 'Histogram', 'Registry', 'REGISTRY')
+
+_logger = logging.getLogger(__name__)
+
+# Histogram buckets upper bounds in seconds.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+    300, 600,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Collection of metrics exposed in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+        self._collectors = []
+
+    def register(self, metric):
+        assert metric.name not in self._metrics, \
+            "Metric {!r} is already registered".format(metric.name)
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, collector):
+        """Adds coroutine function which is awaited before exposition to
+        update metrics which are computed on demand (e.g. queue depths).
+        """
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        self._collectors.remove(collector)
+
+    async def collect(self):
+        for collector in list(self._collectors):
+            try:
+                await collector()
+            except Exception:
+                _logger.exception(
+                    "Metrics collector {!r} failed".format(collector))
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append('# HELP {} {}'.format(
+                metric.name, _escape_help(metric.documentation)))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for label_values, child in list(metric._children.items()):
+                labels = tuple(zip(metric.labelnames, label_values))
+                for suffix, extra_labels, value in child._samples():
+                    lines.append('{}{}{} {}'.format(
+                        metric.name, suffix,
+                        _format_labels(labels + extra_labels),
+                        _format_value(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+
+# Default registry, metrics of all modules are registered in it.
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), *,
+                 registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        # label values -> child
+        self._children = collections.OrderedDict()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+        if registry is None:
+            registry = REGISTRY
+        registry.register(self)
+
+    def labels(self, *label_values):
+        """Returns child metric for label values.
+
+        Children are cheap to keep, so callers on hot paths may look them
+        up once.
+        """
+        label_values = tuple(map(str, label_values))
+        child = self._children.get(label_values)
+        if child is None:
+            assert len(label_values) == len(self.labelnames), \
+                "Expected values for labels {!r}".format(self.labelnames)
+            child = self._new_child()
+            self._children[label_values] = child
+        return child
+
+    def clear(self):
+        """Removes all children, e.g. before setting values for currently
+        existing label values."""
+        assert self.labelnames
+        self._children.clear()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        assert amount >= 0
+        self.value += amount
+
+    def _samples(self):
+        return [('_total', (), self.value)]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def _samples(self):
+        return [('', (), self.value)]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    __slots__ = ('_upper_bounds', 'buckets', 'sum', 'count')
+
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+        # Non-cumulative counts, the last bucket is +Inf.
+        self.buckets = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observes duration of the block."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start)
+
+    def _samples(self):
+        samples = []
+        cumulative_count = 0
+        for upper_bound, count in zip(
+                self._upper_bounds + (math.inf,), self.buckets):
+            cumulative_count += count
+            samples.append(
+                ('_bucket', (('le', _format_value(upper_bound)),),
+                 cumulative_count))
+        samples.append(('_sum', (), self.sum))
+        samples.append(('_count', (), self.count))
+        return samples
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), *,
+                 buckets=DEFAULT_BUCKETS, registry=None):
+        self._upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def _new_child(self):
+        return _HistogramChild(self._upper_bounds)
+
+
+def _escape_help(text):
+    return text.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', r'\\').replace('\n', r'\n').replace(
+                '"', r'\"'))
+        for name, value in labels))
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    elif value == math.inf:
+        return '+Inf'
+    elif value == -math.inf:
+        return '-Inf'
+    elif math.isnan(value):
+        return 'NaN'
+    else:
+        return repr(float(value))
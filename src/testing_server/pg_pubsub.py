@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import async_timeout
+
+from . import json_codec
+from .abc import AbstracePublisher
+from .pubsub import Publisher, OVERFLOW_DROP_OLDEST
+
+__all__ = ('PostgresPublisher',)
+
+_logger = logging.getLogger(__name__)
+
+# NOTIFY payload must be shorter than 8000 bytes.
+_MAX_NOTIFY_PAYLOAD_SIZE = 7900
+
+# Interval of checking that listening connection is alive.
+_LISTEN_HEALTH_CHECK_INTERVAL = 30
+
+# Delay before reconnecting of broken listening connection.
+_RECONNECT_DELAY = 1
+
+
+class PostgresPublisher(AbstracePublisher):
+    """Publisher which delivers messages between processes using
+    PostgreSQL LISTEN/NOTIFY.
+
+    All topics are multiplexed over single channel, which is listened on
+    dedicated connection from database pool. Messages must be
+    JSON-serializable. Messages which don't fit into NOTIFY payload are
+    stored in `pubsub_payloads` table and only their id is sent.
+
+    Published messages are delivered to local subscribers through
+    PostgreSQL too, so all subscribers see messages in the same order.
+    """
+
+    def __init__(self, db, *,
+                 channel='testing_server_pubsub',
+                 payload_max_age=3600,
+                 maxsize=0,
+                 overflow=OVERFLOW_DROP_OLDEST,
+                 loop):
+        self._db = db
+        self._channel = channel
+        self._payload_max_age = payload_max_age
+        self._loop = loop
+
+        self._local = Publisher(loop=loop, maxsize=maxsize, overflow=overflow)
+        self._outgoing = asyncio.Queue(loop=loop)
+        self._listen_conn = None
+        self._listener_task = None
+        self._sender_task = None
+        self._last_payloads_cleanup = None
+
+    async def start(self):
+        assert self._listener_task is None
+        await self._listen()
+        self._listener_task = self._loop.create_task(self._listener())
+        self._sender_task = self._loop.create_task(self._sender())
+
+    async def stop(self):
+        assert self._listener_task is not None
+        for task in (self._listener_task, self._sender_task):
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._listener_task = None
+        self._sender_task = None
+
+        await self._unlisten()
+
+    def publish(self, topic, message):
+        self._outgoing.put_nowait((topic, message))
+
+    def subscribe(self, topic, **kwargs):
+        return self._local.subscribe(topic, **kwargs)
+
+    async def _listen(self):
+        conn = await self._db.engine.acquire()
+        try:
+            await conn.execute('LISTEN "{}"'.format(self._channel))
+        except BaseException:
+            self._db.engine.release(conn)
+            raise
+        self._listen_conn = conn
+
+    async def _unlisten(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+
+        try:
+            await conn.execute('UNLISTEN "{}"'.format(self._channel))
+        except Exception:
+            _logger.exception("UNLISTEN failed")
+        finally:
+            self._db.engine.release(conn)
+
+    async def _sender(self):
+        while True:
+            topic, message = await self._outgoing.get()
+            try:
+                await self._send(topic, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception(
+                    "Failed to publish message to topic {!r}".format(topic))
+
+    async def _send(self, topic, message):
+        payload = json_codec.dumps(dict(topic=topic, message=message))
+
+        if len(payload.encode()) > _MAX_NOTIFY_PAYLOAD_SIZE:
+            payload_id = await self._db.store_pubsub_payload(payload)
+            payload = json_codec.dumps(dict(ref=payload_id))
+
+            now = time.monotonic()
+            if (self._last_payloads_cleanup is None or
+                    now - self._last_payloads_cleanup >
+                    self._payload_max_age):
+                self._last_payloads_cleanup = now
+                await self._db.delete_old_pubsub_payloads(
+                    self._payload_max_age)
+
+        await self._db.notify(self._channel, payload)
+
+    async def _listener(self):
+        while True:
+            try:
+                await self._receive()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception(
+                    "Listening for notifications failed, reconnecting")
+
+                await self._unlisten()
+                # Connection is acquired again by the next _receive().
+                await asyncio.sleep(_RECONNECT_DELAY, loop=self._loop)
+
+    async def _receive(self):
+        if self._listen_conn is None:
+            await self._listen()
+
+        notifies = self._listen_conn.connection.notifies
+        while True:
+            try:
+                with async_timeout.timeout(
+                        _LISTEN_HEALTH_CHECK_INTERVAL, loop=self._loop):
+                    notify = await notifies.get()
+            except asyncio.TimeoutError:
+                # Raises if connection is broken.
+                await self._listen_conn.scalar('SELECT 1')
+                continue
+
+            try:
+                await self._dispatch(notify.payload)
+            except Exception:
+                _logger.exception(
+                    "Failed to dispatch notification {!r}".format(
+                        notify.payload))
+
+    async def _dispatch(self, payload):
+        data = json_codec.loads(payload)
+        if 'ref' in data:
+            stored_payload = await self._db.get_pubsub_payload(data['ref'])
+            if stored_payload is None:
+                _logger.error(
+                    "Payload {} is missing".format(data['ref']))
+                return
+            data = json_codec.loads(stored_payload)
+
+        self._local.publish(data['topic'], data['message'])
@@ -1,19 +1,150 @@
 import asyncio
+import collections
 
 from .abc import AbstracePublisher, AbstractSubscriber
 
-__all__ = ('Publisher',)
+__all__ = (
+    'Publisher', 'DISCONNECTED',
+    'OVERFLOW_DROP_OLDEST', 'OVERFLOW_DROP_NEWEST', 'OVERFLOW_COALESCE',
+    'OVERFLOW_DISCONNECT',
+)
+
+# What to do when message is published to subscriber with full queue.
+# Drop the oldest queued message.
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+# Drop published message.
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+# Replace queued message with the same key, otherwise drop the oldest
+# queued message.
+OVERFLOW_COALESCE = 'coalesce'
+# Unsubscribe subscriber, DISCONNECTED is put in its queue.
+OVERFLOW_DISCONNECT = 'disconnect'
+
+_OVERFLOW_POLICIES = frozenset([
+    OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_COALESCE,
+    OVERFLOW_DISCONNECT,
+])
+
+
+class _Disconnected:
+    def __repr__(self):
+        return 'DISCONNECTED'
+
+
+# Last message in queue of subscriber disconnected due to overflow.
+DISCONNECTED = _Disconnected()
+
+
+class _CoalescingQueue(asyncio.Queue):
+    """Queue which holds only the latest message for each key."""
+
+    def __init__(self, maxsize=0, *, key, loop):
+        self._key = key
+        super().__init__(maxsize, loop=loop)
+
+    def _init(self, maxsize):
+        self._queue = collections.OrderedDict()
+
+    def _put(self, item):
+        self._queue[self._key(item)] = item
+
+    def _get(self):
+        return self._queue.popitem(last=False)[1]
+
+    def replace(self, item):
+        """Replaces queued message with the same key.
+
+        Returns False if there is no such message.
+        """
+        key = self._key(item)
+        if key in self._queue:
+            self._queue[key] = item
+            return True
+        else:
+            return False
+
+
+class _TopicTrie:
+    """Index of subscribers by topic pattern.
+
+    Topics are hierarchical, levels are separated by dots, e.g.
+    "check.linked_ptr.123". In pattern "*" matches exactly one level and
+    "#" matches zero or more levels. Matching costs O(topic depth) (for
+    patterns without "#").
+    """
+
+    class _Node:
+        __slots__ = ('children', 'subscribers')
+
+        def __init__(self):
+            self.children = {}
+            self.subscribers = set()
+
+    def __init__(self):
+        self._root = self._Node()
+
+    def add(self, pattern, subscriber):
+        node = self._root
+        for part in pattern.split('.'):
+            node = node.children.setdefault(part, self._Node())
+        node.subscribers.add(subscriber)
+
+    def remove(self, pattern, subscriber):
+        path = [self._root]
+        parts = pattern.split('.')
+        for part in parts:
+            path.append(path[-1].children[part])
+
+        path[-1].subscribers.remove(subscriber)
+
+        # Prune nodes left without subscribers.
+        for part, node, parent in zip(
+                reversed(parts), reversed(path), reversed(path[:-1])):
+            if node.subscribers or node.children:
+                break
+            del parent.children[part]
+
+    def match(self, topic):
+        result = set()
+        self._match(self._root, topic.split('.'), 0, result)
+        return result
+
+    def _match(self, node, parts, idx, result):
+        multi_level = node.children.get('#')
+        if multi_level is not None:
+            for next_idx in range(idx, len(parts) + 1):
+                self._match(multi_level, parts, next_idx, result)
+
+        if idx == len(parts):
+            result.update(node.subscribers)
+            return
+
+        child = node.children.get(parts[idx])
+        if child is not None:
+            self._match(child, parts, idx + 1, result)
+
+        single_level = node.children.get('*')
+        if single_level is not None:
+            self._match(single_level, parts, idx + 1, result)
 
 
 class Publisher(AbstracePublisher):
     class _Subscriber(AbstractSubscriber):
-        def __init__(self, publisher, topic, *, loop):
+        def __init__(self, publisher, topic, *, maxsize, overflow, key,
+                     loop):
             self._publisher = publisher
             self._topic = topic
+            self._overflow = overflow
             self._loop = loop
 
-            self._queue = asyncio.Queue(loop=loop)
+            if overflow == OVERFLOW_COALESCE:
+                self._queue = _CoalescingQueue(maxsize, key=key, loop=loop)
+            else:
+                self._queue = asyncio.Queue(maxsize, loop=loop)
             self._subscribed = False
+            self._disconnected = False
+
+            self.dropped = 0
 
         @property
         def topic(self):
@@ -21,9 +152,14 @@ class Publisher(AbstracePublisher):
 
         @property
         def queue(self):
-            assert self._subscribed
+            assert self._subscribed or self._disconnected
             return self._queue
 
+        @property
+        def disconnected(self):
+            """Is subscriber disconnected due to queue overflow."""
+            return self._disconnected
+
         def close(self):
             assert self._subscribed
             self._publisher._unsubscribe(self)
@@ -35,22 +171,92 @@ class Publisher(AbstracePublisher):
             if self._subscribed:
                 self.close()
 
-    def __init__(self, *, loop):
-        # topic -> set of subscribers
+        def _deliver(self, message):
+            queue = self._queue
+
+            if self._overflow == OVERFLOW_COALESCE and queue.replace(message):
+                return
+
+            if not queue.full():
+                queue.put_nowait(message)
+                return
+
+            if self._overflow == OVERFLOW_DROP_NEWEST:
+                self._drop(1)
+
+            elif self._overflow == OVERFLOW_DISCONNECT:
+                self._drop(queue.qsize() + 1)
+                self.close()
+                self._disconnected = True
+                self._publisher.disconnected += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(DISCONNECTED)
+
+            else:
+                # OVERFLOW_DROP_OLDEST or OVERFLOW_COALESCE with new key.
+                queue.get_nowait()
+                self._drop(1)
+                queue.put_nowait(message)
+
+        def _drop(self, num_messages):
+            self.dropped += num_messages
+            self._publisher.dropped += num_messages
+
+    def __init__(self, *, loop, maxsize=0, overflow=OVERFLOW_DROP_OLDEST):
+        """
+        :param maxsize: default subscriber queue capacity, 0 means
+            unbounded.
+        :param overflow: default subscriber queue overflow policy.
+        """
+        assert overflow in _OVERFLOW_POLICIES
+
         self._loop = loop
-        self._subscribers = {}
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._subscribers = _TopicTrie()
+
+        # Total number of messages dropped due to queue overflow.
+        self.dropped = 0
+        # Total number of subscribers disconnected due to queue overflow.
+        self.disconnected = 0
 
     def publish(self, topic, message):
-        for sub in list(self._subscribers.get(topic, [])):
-            sub.queue.put_nowait(message)
+        """Publishes message to subscribers of topic or matching topic
+        pattern."""
+        assert '*' not in topic and '#' not in topic, \
+            "Wildcards are not allowed in published topic"
+
+        for sub in self._subscribers.match(topic):
+            sub._deliver(message)
+
+    def subscribe(self, topic, *, maxsize=None, overflow=None, key=None):
+        """Subscribes to topic.
+
+        :param topic: topic name or pattern with "*" (matches one level)
+            or "#" (matches zero or more levels) wildcards, e.g.
+            "check.linked_ptr.*".
+        :param maxsize: queue capacity, 0 means unbounded.
+        :param overflow: queue overflow policy, one of `OVERFLOW_*`.
+        :param key: function returning message key, required for
+            OVERFLOW_COALESCE policy.
+        """
+        if maxsize is None:
+            maxsize = self._maxsize
+        if overflow is None:
+            overflow = self._overflow
+        assert overflow in _OVERFLOW_POLICIES
+        assert overflow != OVERFLOW_COALESCE or key is not None, \
+            "Key function is required for coalescing"
 
-    def subscribe(self, topic):
-        sub = self._Subscriber(self, topic, loop=self._loop)
-        self._subscribers.setdefault(topic, set()).add(sub)
+        sub = self._Subscriber(
+            self, topic,
+            maxsize=maxsize, overflow=overflow, key=key, loop=self._loop)
+        self._subscribers.add(topic, sub)
         sub._subscribed = True
 
         return sub
 
     def _unsubscribe(self, sub):
         sub._subscribed = False
-        self._subscribers[sub.topic].remove(sub)
+        self._subscribers.remove(sub.topic, sub)
@@ -0,0 +1,83 @@
+import collections
+import time
+
+__all__ = ('TokenBucketLimiter',)
+
+
+class TokenBucketLimiter:
+    """Token bucket rate limiter with separate bucket for each key.
+
+    Buckets are refilled with `rate` tokens per second up to `burst`
+    tokens. Buckets which are surely full again are forgotten, expiration
+    is O(1) amortized, since buckets are kept ordered by last update time.
+    """
+
+    def __init__(self, rate, burst, *, max_keys=100000, clock=time.monotonic):
+        assert rate > 0
+        assert burst >= 1
+
+        self._rate = rate
+        self._burst = burst
+        self._max_keys = max_keys
+        self._clock = clock
+        # Time of refilling empty bucket.
+        self._refill_time = burst / rate
+
+        # key -> (tokens, last update time), least recently updated first.
+        self._buckets = collections.OrderedDict()
+
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, key, tokens=1):
+        """Returns 0 if `tokens` are available for `key` or time in
+        seconds after which they will be available.
+        """
+        now = self._clock()
+        self._expire(now)
+        return self._retry_after(self._tokens(key, now), tokens)
+
+    def consume(self, key, tokens=1):
+        """Takes `tokens` from `key` bucket if they are available.
+
+        Returns 0 on success or time in seconds after which tokens will be
+        available.
+        """
+        now = self._clock()
+        self._expire(now)
+
+        available = self._tokens(key, now)
+        retry_after = self._retry_after(available, tokens)
+        if not retry_after:
+            available -= tokens
+
+        self._buckets.pop(key, None)
+        self._buckets[key] = (available, now)
+
+        while len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+
+        return retry_after
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self._burst
+
+        tokens, updated = bucket
+        return min(self._burst, tokens + (now - updated) * self._rate)
+
+    def _retry_after(self, available, tokens):
+        if available >= tokens:
+            return 0
+        self.rejected += 1
+        return (tokens - available) / self._rate
+
+    def _expire(self, now):
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self._refill_time:
+                break
+            del self._buckets[key]
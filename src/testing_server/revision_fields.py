@@ -0,0 +1,13 @@
+"""Revision fields exposed by API, kept apart from `db` so web server
+doesn't import database dependencies to validate requests."""
+
+__all__ = ('REVISION_FIELDS', 'REVISION_LIST_FIELDS')
+
+# Revision fields which can be requested from `Database.get_revisions()`.
+REVISION_FIELDS = (
+    'id', 'user', 'assignment', 'solution_id', 'commit_message', 'state',
+    'failure_signature', 'check_result',
+)
+# Large check result is not included in listings by default.
+REVISION_LIST_FIELDS = tuple(
+    field for field in REVISION_FIELDS if field != 'check_result')
@@ -1,10 +1,48 @@
 import asyncio
+import collections
 import contextlib
 import logging
+import random
+import time
 
 import async_timeout
 
-__all__ = ('PeriodicScheduler',)
+from . import metrics
+
+__all__ = (
+    'PeriodicScheduler', 'SchedulerRun', 'MORE_WORK', 'IDLE',
+    'run_concurrently', 'raise_failures',
+)
+
+_logger = logging.getLogger(__name__)
+
+# Values which periodic function may return.
+# More work remains, run again immediately.
+MORE_WORK = 'more_work'
+# No work was found, sleep longer each time (up to `max_idle_period`).
+IDLE = 'idle'
+
+# Outcomes of periodic function run.
+RUN_SUCCESS = 'success'
+RUN_ERROR = 'error'
+RUN_TIMEOUT = 'timeout'
+
+# Run of periodic function: start time (Unix time), duration in seconds,
+# outcome (one of `RUN_*`) and name of raised exception type or None.
+SchedulerRun = collections.namedtuple(
+    'SchedulerRun', 'start duration outcome exception_type')
+
+_RUN_DURATION = metrics.Histogram(
+    'scheduler_run_duration_seconds',
+    "Duration of periodic function runs.", ['scheduler'])
+_ERRORS = metrics.Counter(
+    'scheduler_errors',
+    "Number of periodic function runs failed with exception.",
+    ['scheduler'])
+_TIMEOUTS = metrics.Counter(
+    'scheduler_timeouts',
+    "Number of periodic function runs cancelled due to timeout.",
+    ['scheduler'])
 
 
 class PeriodicScheduler:
@@ -13,7 +51,21 @@ class PeriodicScheduler:
                  start_immediately=True,
                  max_consec_errors=20,
                  crashloop_period=None,
-                 timeout=None, loop):
+                 timeout=None,
+                 history_size=50,
+                 max_idle_period=None,
+                 idle_backoff=2,
+                 jitter=0.1,
+                 loop):
+        """
+        :param history_size: number of recent runs kept in `history`.
+        :param max_idle_period: maximum sleep time after consecutive runs
+            which returned `IDLE`, by default `period`.
+        :param idle_backoff: sleep time multiplier for consecutive `IDLE`
+            runs.
+        :param jitter: sleep time is randomized by this fraction, so
+            schedulers of different processes don't run in lockstep.
+        """
         assert asyncio.iscoroutinefunction(coro)
 
         self._loop = loop
@@ -24,6 +76,23 @@ class PeriodicScheduler:
         self._timeout = timeout
         self._num_consec_errors = 0
         self._task = None
+        self._draining = False
+
+        if max_idle_period is None:
+            max_idle_period = period
+        self._max_idle_period = max_idle_period
+        self._idle_backoff = idle_backoff
+        self._jitter = jitter
+        # Sleep time after the last `IDLE` run, None if the last run found
+        # work.
+        self._idle_delay = None
+        self._trigger = asyncio.Event(loop=loop)
+
+        self._history = collections.deque(maxlen=history_size)
+        # Start time of current run (Unix time and monotonic), None if
+        # periodic function is not running.
+        self._run_start = None
+        self._last_success = None
 
         if name is None:
             name = str(self)
@@ -35,6 +104,63 @@ class PeriodicScheduler:
 
         self._logger = logging.getLogger(__name__ + '.' + name)
 
+        self._run_duration = _RUN_DURATION.labels(name)
+        self._errors = _ERRORS.labels(name)
+        self._timeouts = _TIMEOUTS.labels(name)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def history(self):
+        """Recent runs (`SchedulerRun`), oldest first."""
+        return list(self._history)
+
+    @property
+    def healthy(self):
+        """Is scheduler started, not crash looping and current run
+        didn't exceed timeout (i.e. is not stuck)."""
+        if self._task is None or self._task.done():
+            return False
+
+        if self._num_consec_errors >= self._max_consec_errors:
+            return False
+
+        if self._run_start is not None and self._timeout is not None:
+            _, start_monotonic = self._run_start
+            # Timed out run should have been cancelled by now.
+            return time.monotonic() - start_monotonic < self._timeout * 1.5
+
+        return True
+
+    def status(self):
+        """Returns JSON-serializable scheduler state and run history."""
+        running_for = None
+        if self._run_start is not None:
+            running_for = time.monotonic() - self._run_start[1]
+
+        return dict(
+            name=self._name,
+            period=self._period,
+            timeout=self._timeout,
+            healthy=self.healthy,
+            running_for=running_for,
+            idle_delay=self._idle_delay,
+            last_success=self._last_success,
+            num_consec_errors=self._num_consec_errors,
+            history=[run._asdict() for run in self._history],
+        )
+
+    def trigger(self):
+        """Wakes scheduler up to run periodic function without waiting
+        for the end of period.
+
+        If function is running now, it will be run again right after
+        finish.
+        """
+        self._trigger.set()
+
     async def start(self):
         assert self._task is None
         self._task = self._loop.create_task(self._runner())
@@ -45,31 +171,80 @@ class PeriodicScheduler:
         await self._task
         self._task = None
         self._num_consec_errors = 0
+        self._draining = False
+
+    async def drain(self, timeout):
+        """Waits until current run of periodic function finishes and
+        doesn't start new runs.
+
+        Run is cancelled if it doesn't finish in `timeout` seconds.
+        Scheduler still should be stopped with `stop()`.
+        """
+        assert self._task is not None
+        self._draining = True
+        if self._run_start is None:
+            # Sleeping between runs.
+            self._task.cancel()
+
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._task, loop=self._loop), timeout,
+                loop=self._loop)
+        except asyncio.TimeoutError:
+            self._logger.warning(
+                "Periodic function didn't finish in {} s, "
+                "cancelling".format(timeout))
+            self._task.cancel()
+            await self._task
 
     async def _runner(self):
         with contextlib.suppress(asyncio.CancelledError):
             if not self._start_immediately:
-                await asyncio.sleep(self._period)
+                await self._sleep(self._period)
 
             while True:
                 self._logger.debug("Starting periodic function")
+                self._trigger.clear()
+                self._run_start = (time.time(), time.monotonic())
+                exception_type = None
+                result = None
                 try:
                     with async_timeout.timeout(self._timeout):
-                        await self._coro()
+                        result = await self._coro()
 
-                except TimeoutError:
+                except asyncio.TimeoutError:
                     self._logger.exception("Periodic function timeout")
                     self._num_consec_errors += 1
+                    self._timeouts.inc()
+                    outcome = RUN_TIMEOUT
 
-                except Exception:
+                except Exception as ex:
                     self._num_consec_errors += 1
+                    self._errors.inc()
                     self._logger.exception(
                         "Periodic function raise exception "
                         "({} time).".format(self._num_consec_errors))
+                    outcome = RUN_ERROR
+                    exception_type = type(ex).__name__
 
                 else:
                     self._logger.debug("Periodic function finished")
                     self._num_consec_errors = 0
+                    outcome = RUN_SUCCESS
+
+                finally:
+                    start, start_monotonic = self._run_start
+                    self._run_start = None
+
+                duration = time.monotonic() - start_monotonic
+                self._run_duration.observe(duration)
+                self._history.append(SchedulerRun(
+                    start, duration, outcome, exception_type))
+                if outcome == RUN_SUCCESS:
+                    self._last_success = start + duration
+
+                if self._draining:
+                    return
 
                 if self._num_consec_errors >= self._max_consec_errors:
                     self._logger.debug(
@@ -80,5 +255,64 @@ class PeriodicScheduler:
                     await asyncio.sleep(
                         self._crashloop_period, loop=self._loop)
 
+                elif result == MORE_WORK:
+                    self._logger.debug("More work remains, running again")
+                    self._idle_delay = None
+                    # Let other tasks run.
+                    await asyncio.sleep(0, loop=self._loop)
+
+                elif result == IDLE:
+                    if self._idle_delay is None:
+                        self._idle_delay = self._period
+                    else:
+                        self._idle_delay = min(
+                            self._idle_delay * self._idle_backoff,
+                            self._max_idle_period)
+                    await self._sleep(self._idle_delay)
+
                 else:
-                    await asyncio.sleep(self._period, loop=self._loop)
+                    self._idle_delay = None
+                    await self._sleep(self._period)
+
+    async def _sleep(self, delay):
+        """Sleeps for randomized `delay` or until triggered."""
+        delay *= random.uniform(1 - self._jitter, 1 + self._jitter)
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                self._trigger.wait(), delay, loop=self._loop)
+
+
+async def run_concurrently(coro_fn, keys, *, timeout=None, loop):
+    """Runs `coro_fn(key)` for all keys concurrently, each with its own
+    timeout, so slow or failing run doesn't affect others.
+
+    Returns dict key -> result or raised exception.
+    """
+    async def run(key):
+        try:
+            with async_timeout.timeout(timeout, loop=loop):
+                return await coro_fn(key)
+
+        except asyncio.TimeoutError as ex:
+            _logger.error("Run for {!r} timed out".format(key))
+            return ex
+
+        except asyncio.CancelledError:
+            # It's subclass of Exception before Python 3.8.
+            raise
+
+        except Exception as ex:
+            _logger.exception("Run for {!r} failed".format(key))
+            return ex
+
+    keys = list(keys)
+    results = await asyncio.gather(*[run(key) for key in keys], loop=loop)
+    return dict(zip(keys, results))
+
+
+def raise_failures(results):
+    """Raises if some of `run_concurrently()` results is exception."""
+    failed = sorted(key for key, result in results.items()
+                    if isinstance(result, Exception))
+    if failed:
+        raise RuntimeError("Runs for {!r} failed".format(failed))
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import sys
+
+import configargparse
+
+from testing_server.blob_store import FilesystemBlobStore
+from testing_server.db import Database
+
+__all__ = ('main',)
+
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate_blobs(postgres_uri, blob_store_dir, *, batch_size=100):
+    loop = asyncio.get_event_loop()
+
+    blob_store = FilesystemBlobStore(blob_store_dir, loop=loop)
+    db = Database(postgres_uri, loop=loop, blob_store=blob_store)
+
+    loop.run_until_complete(db.start())
+    try:
+        loop.run_until_complete(db.upgrade_schema())
+        num_migrated = loop.run_until_complete(
+            db.migrate_blobs_to_store(batch_size=batch_size))
+    finally:
+        loop.run_until_complete(db.stop())
+        loop.close()
+
+    _logger.info("Done: {} blobs moved to {}".format(
+        num_migrated, blob_store_dir))
+
+    return 0
+
+
+def main():
+    parser = configargparse.ArgumentParser(
+        description="Move blobs from PostgreSQL to blob store directory",
+        auto_env_var_prefix="TESTING_SERVER_")
+    parser.add_argument(
+        "-l",
+        dest="log_level",
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        default='INFO',
+        help="Set the logging level. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--postgres-uri",
+        required=True,
+        help="libpq connection string for PostgreSQL."
+    )
+    parser.add_argument(
+        "--blob-store-dir",
+        required=True,
+        help="Directory for storing blobs as files."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="Number of blobs moved per database query "
+             "(default: %(default)r)",
+    )
+
+    args = parser.parse_args()
+
+    format_string = '%(asctime)-15s %(name)s %(levelname)s: %(message)s'
+    logging.basicConfig(format=format_string, level=args.log_level)
+
+    try:
+        return migrate_blobs(args.postgres_uri, args.blob_store_dir,
+                             batch_size=args.batch_size)
+
+    except Exception:
+        _logger.exception("Blobs migration failed")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,32 +1,29 @@
 import asyncio
 import contextlib
 import functools
+import ipaddress
 import logging
+import os
 import signal
 import sys
 
 import configargparse
 import aiohttp.web
-import raven
-import raven_aiohttp
 import yarl
-from raven.handlers.logging import SentryHandler
-from aioxmlrpc.client import ServerProxy
 
 from testing_server import __version__ as PROJECT_VERSION
-from testing_server.credentials_checker import HtpasswdCredentialsChecker
-from testing_server.server import Server
+from testing_server import json_codec
+from testing_server import metrics
+from testing_server.assignments import AssignmentRegistry
+from testing_server.blob_store import FilesystemBlobStore
+from testing_server.cache import LRUCache
+from testing_server.leader import LeaderElection
+from testing_server.pubsub import Publisher
+from testing_server.ratelimit import TokenBucketLimiter
+from testing_server.pg_pubsub import PostgresPublisher
+from testing_server.supervisor import Supervisor
 from testing_server.token_provider import JWTTokenProvider
-from testing_server.db import (
-    Database, LINKED_PTR_ASSIGNMENT_ID, LAZY_STRING_ASSIGNMENT_ID,
-    FUNCTION_ASSIGNMENT_ID, BIND_ASSIGNMENT_ID,
-    PATH_TO_ASSIGNMENT_ID,
-    COMPONENT_TO_ASSIGNMENT_ID)
-from testing_server.trac import sync_tickets
-from testing_server.svn import sync_svn
-from testing_server.scheduler import PeriodicScheduler
-from testing_server.test_runner import check_solutions
-from testing_server.trac_reporter import report_solutions
+from testing_server.scheduler import PeriodicScheduler, MORE_WORK, IDLE
 
 __all__ = ('main',)
 
@@ -36,6 +33,27 @@ _logger = logging.getLogger(__name__)
 _DEBUG_SYNC_TICKETS = False
 _DEBUG_SYNC_SVN = False
 
+# Maximum number of revisions checked in one run of checking scheduler by
+# single worker.
+_MAX_CHECKS_PER_RUN = 3
+
+# Process roles.
+# Serves HTTP API and web sockets.
+ROLE_WEB = 'web'
+# Syncs Subversion and Trac.
+ROLE_SYNC = 'sync'
+# Checks solutions.
+ROLE_CHECKER = 'checker'
+# Reports check results to Trac.
+ROLE_REPORTER = 'reporter'
+
+ALL_ROLES = (ROLE_WEB, ROLE_SYNC, ROLE_CHECKER, ROLE_REPORTER)
+
+# Seconds after the first termination signal during which the same signal
+# is ignored. Worker may get it twice: sent to whole control group (e.g.
+# by systemd) and forwarded by supervisor.
+_REPEATED_SIGNAL_INTERVAL = 2
+
 
 def _setup_logging(level=logging.DEBUG):
     format_string = '%(asctime)-15s %(name)s %(levelname)s: %(message)s'
@@ -45,18 +63,65 @@ def _setup_logging(level=logging.DEBUG):
     logging.getLogger('asyncio').setLevel(logging.WARNING)
 
 
-def _setup_termination(*, loop: asyncio.AbstractEventLoop):
+def _setup_termination(*, drain=None, loop: asyncio.AbstractEventLoop):
+    """Stops loop on SIGINT or SIGTERM.
+
+    If `drain` coroutine function is given, loop is stopped after it
+    finishes. Second signal stops loop immediately, unless it's received
+    within `_REPEATED_SIGNAL_INTERVAL` seconds after the first one.
+    """
+    drain_start = None
+
+    async def drain_and_stop():
+        try:
+            await drain()
+        except Exception:
+            _logger.exception("Draining failed")
+        finally:
+            loop.stop()
+
     def on_signal(signame):
-        _logger.info("Received signal %s. Exiting..." % signame)
+        nonlocal drain_start
+
+        if drain_start is not None and \
+                loop.time() - drain_start < _REPEATED_SIGNAL_INTERVAL:
+            _logger.info("Received signal %s again, ignoring" % signame)
+            return
 
-        loop.call_soon(lambda: loop.stop())
+        if drain is None or drain_start is not None:
+            _logger.info("Received signal %s. Exiting..." % signame)
+            loop.call_soon(lambda: loop.stop())
+            return
+
+        _logger.info("Received signal %s. Draining..." % signame)
+        drain_start = loop.time()
+        loop.create_task(drain_and_stop())
 
     for signame in ('SIGINT', 'SIGTERM'):
         loop.add_signal_handler(getattr(signal, signame),
                                 functools.partial(on_signal, signame))
 
 
+def _setup_uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        _logger.warning("uvloop is not installed, using default event loop")
+        return
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    _logger.info("Using uvloop event loop")
+
+
 def _setup_sentry(*, loop):
+    if not os.environ.get('SENTRY_DSN'):
+        # Raven client is disabled without DSN anyway.
+        return
+
+    import raven
+    import raven_aiohttp
+    from raven.handlers.logging import SentryHandler
+
     sentry_client = raven.Client(
         transport=functools.partial(raven_aiohttp.AioHttpTransport, loop=loop),
         release=PROJECT_VERSION
@@ -86,6 +151,15 @@ def _setup_sentry(*, loop):
     loop.set_exception_handler(loop_exception_handler)
 
 
+def _run_safely(run, **kwargs):
+    try:
+        return run(**kwargs)
+
+    except Exception:
+        _logger.exception("Server failed")
+        return 1
+
+
 def run_server(hostname, port, htpasswd, token_secret, postgres_uri,
                trac_xmlrpc_uri,
                *,
@@ -93,16 +167,59 @@ def run_server(hostname, port, htpasswd, token_secret, postgres_uri,
                svn_username=None,
                svn_password=None,
                worker_ssh_params,
+               blob_store_dir=None,
+               blob_cache_size=0,
+               postgres_pubsub=False,
+               leader_election=False,
+               ws_flush_interval=0.2,
+               login_limits_per_ip=None,
+               failed_login_limits=None,
+               trusted_proxies=(),
+               admin_users=(),
                enable_cors=False,
+               enable_metrics=False,
+               max_idle_period=300,
+               check_concurrency=2,
+               assignment_check_concurrency=1,
+               report_concurrency=2,
+               assignment_report_concurrency=1,
+               check_timeout=60 * 10,
+               report_timeout=60,
+               drain_timeout=60 * 2,
                skip_svn_sync=False,
                skip_trac_sync=False,
                skip_checking=False,
-               skip_reporting=False):
+               skip_reporting=False,
+               roles=ALL_ROLES,
+               reuse_port=False,
+               status_port=None,
+               use_uvloop=False):
+    """Runs server with given roles until termination signal.
+
+    :param reuse_port: allow several processes to serve on the same port
+        (SO_REUSEPORT), connections are balanced between them by kernel.
+    :param status_port: port for readiness check, schedulers status and
+        metrics of process which runs background jobs without web role.
+    :param use_uvloop: use uvloop event loop if it's installed.
+    :param drain_timeout: seconds to wait for running checks and other
+        background jobs on termination, 0 disables draining.
+    """
     shutdown_timeout = 10
 
-    credentials_checker = HtpasswdCredentialsChecker(htpasswd)
+    serve_http = ROLE_WEB in roles
+    skip_svn_sync = skip_svn_sync or ROLE_SYNC not in roles
+    skip_trac_sync = skip_trac_sync or ROLE_SYNC not in roles
+    skip_checking = skip_checking or ROLE_CHECKER not in roles
+    skip_reporting = skip_reporting or ROLE_REPORTER not in roles
+    run_background = not (
+        skip_svn_sync and skip_trac_sync and skip_checking and
+        skip_reporting)
+
     token_provider = JWTTokenProvider(token_secret)
 
+    if use_uvloop:
+        _setup_uvloop()
+
     loop = asyncio.get_event_loop()
     if False:
         # TODO: asyncssh currently broken due to this
@@ -111,52 +228,155 @@ def run_server(hostname, port, htpasswd, token_secret, postgres_uri,
         # for details.
         asyncio.get_child_watcher().attach_loop(loop)
 
-    _setup_termination(loop=loop)
+    schedulers = []
+    # Set on termination, no new solutions are claimed for checking.
+    draining = asyncio.Event(loop=loop)
+
+    async def drain():
+        draining.set()
+        _logger.info("Waiting up to {} s for background jobs to "
+                     "finish...".format(drain_timeout))
+        await asyncio.gather(
+            *[scheduler.drain(drain_timeout) for scheduler in schedulers],
+            loop=loop)
+
+    _setup_termination(drain=drain if drain_timeout > 0 else None, loop=loop)
     _setup_sentry(loop=loop)
 
     with contextlib.ExitStack() as exit_stack:
         exit_stack.callback(loop.close)
 
-        db = Database(postgres_uri, loop=loop)
+        blob_store = None
+        if blob_store_dir is not None:
+            blob_store = FilesystemBlobStore(blob_store_dir, loop=loop)
+
+        blob_cache = None
+        if blob_cache_size > 0:
+            blob_cache = LRUCache(blob_cache_size, loop=loop)
+
+        # Imported by workers, not by supervisor process. Modules of
+        # background jobs are imported only by roles which run them, see
+        # tests/test_startup.py.
+        from testing_server.db import Database
+
+        db = Database(postgres_uri, loop=loop,
+                      blob_store=blob_store, blob_cache=blob_cache)
         loop.run_until_complete(db.start())
         exit_stack.callback(
             lambda: loop.run_until_complete(db.stop()))
 
-        trac_rpc = ServerProxy(trac_xmlrpc_uri, loop=loop)
-        exit_stack.callback(trac_rpc.close)
+        if enable_metrics:
+            metrics.REGISTRY.add_collector(db.collect_metrics)
+            exit_stack.callback(
+                metrics.REGISTRY.remove_collector, db.collect_metrics)
+
+        if postgres_pubsub:
+            # Deliver check progress between processes and nodes.
+            publisher = PostgresPublisher(db, loop=loop)
+            loop.run_until_complete(publisher.start())
+            exit_stack.callback(
+                lambda: loop.run_until_complete(publisher.stop()))
+        else:
+            publisher = Publisher(loop=loop)
+
+        trac_rpc = None
+        if not (skip_trac_sync and skip_reporting):
+            from aioxmlrpc.client import ServerProxy
+
+            trac_rpc = ServerProxy(trac_xmlrpc_uri, loop=loop)
+            exit_stack.callback(trac_rpc.close)
+
+        registry = AssignmentRegistry(db)
+        if run_background:
+            loop.run_until_complete(registry.refresh())
+
+        if not skip_trac_sync:
+            from testing_server.trac import sync_tickets
+        if not skip_svn_sync:
+            from testing_server.svn import sync_svn
+        if not skip_checking:
+            from testing_server.test_runner import (
+                check_solutions, make_claim_owner)
+
+            # Identifies this process in claims on checked revisions.
+            checker_id = make_claim_owner()
+        if not skip_reporting:
+            from testing_server.trac_reporter import report_solutions
+
+        def trigger(name):
+            """Wakes up scheduler if it runs in this process."""
+            for scheduler in schedulers:
+                if scheduler.name == name:
+                    scheduler.trigger()
+
+        async def do_assignments_refresh():
+            if not await registry.refresh():
+                return IDLE
+
+            # New assignments may already have tickets and solutions.
+            trigger("trac_sync")
+            trigger("svn_sync")
 
         async def do_tickets_sync():
             await sync_tickets(
-                db, trac_rpc, COMPONENT_TO_ASSIGNMENT_ID)
+                db, trac_rpc, registry.component_to_assignment_id())
 
         async def do_svn_sync():
-            await sync_svn(
+            num_added = await sync_svn(
                 db,
-                PATH_TO_ASSIGNMENT_ID,
+                registry.path_to_assignment_id(),
                 svn_uri=svn_uri,
                 svn_username=svn_username,
                 svn_password=svn_password,
                 loop=loop)
 
+            if not num_added:
+                return IDLE
+
+            trigger("check_solutions_sync")
+
+        # Limited number of checks per run keeps run time far from timeout
+        # during backlog.
+        max_checks = _MAX_CHECKS_PER_RUN * check_concurrency
+
         async def do_check_solutions():
-            await check_solutions(db, LINKED_PTR_ASSIGNMENT_ID,
-                                  ssh_params=worker_ssh_params, loop=loop)
-            await check_solutions(db, LAZY_STRING_ASSIGNMENT_ID,
-                                  ssh_params=worker_ssh_params, loop=loop)
-            await check_solutions(db, FUNCTION_ASSIGNMENT_ID,
-                                  ssh_params=worker_ssh_params, loop=loop)
-            await check_solutions(db, BIND_ASSIGNMENT_ID,
-                                  ssh_params=worker_ssh_params, loop=loop)
+            # Solutions of all active assignments are claimed together, but
+            # each assignment has limited number of check slots, so backlog
+            # of one of them doesn't delay others.
+            try:
+                num_checked = await check_solutions(
+                    db, registry.active,
+                    ssh_params=worker_ssh_params,
+                    owner=checker_id, publisher=publisher,
+                    max_checks=max_checks,
+                    concurrency=check_concurrency,
+                    assignment_concurrency=assignment_check_concurrency,
+                    check_timeout=check_timeout,
+                    draining=draining,
+                    loop=loop)
+            except Exception:
+                # Results of successful checks still should be reported.
+                trigger("post_reports")
+                raise
+
+            if num_checked:
+                trigger("post_reports")
+
+            if num_checked >= max_checks:
+                return MORE_WORK
+            elif not num_checked:
+                return IDLE
 
         async def do_post_reports():
-            await report_solutions(
-                db, trac_rpc, LINKED_PTR_ASSIGNMENT_ID, loop=loop)
-            await report_solutions(
-                db, trac_rpc, LAZY_STRING_ASSIGNMENT_ID, loop=loop)
-            await report_solutions(
-                db, trac_rpc, FUNCTION_ASSIGNMENT_ID, loop=loop)
-            await report_solutions(
-                db, trac_rpc, BIND_ASSIGNMENT_ID, loop=loop)
+            num_reported = await report_solutions(
+                db, trac_rpc, registry.active,
+                concurrency=report_concurrency,
+                assignment_concurrency=assignment_report_concurrency,
+                timeout=report_timeout,
+                loop=loop)
+
+            if not num_reported:
+                return IDLE
 
         # if False:
         #     loop.run_until_complete(
@@ -173,78 +393,163 @@ def run_server(hostname, port, htpasswd, token_secret, postgres_uri,
         #                          loop=loop))
         #     return
 
-        if _DEBUG_SYNC_TICKETS:
+        if _DEBUG_SYNC_TICKETS and not skip_trac_sync:
             loop.run_until_complete(do_tickets_sync())
-        if _DEBUG_SYNC_SVN:
+        if _DEBUG_SYNC_SVN and not skip_svn_sync:
             loop.run_until_complete(do_svn_sync())
 
+        election = None
+        if leader_election and run_background:
+            election = LeaderElection(db, loop=loop)
+            loop.run_until_complete(election.start())
+            exit_stack.callback(
+                lambda: loop.run_until_complete(election.stop()))
+
+        def start_scheduler(scheduler, *, exclusive=True):
+            """Starts scheduler, exclusive schedulers run only in one of
+            replicas if leader election is enabled."""
+            if election is not None and exclusive:
+                scheduler = election.wrap(scheduler)
+            schedulers.append(scheduler)
+            loop.run_until_complete(scheduler.start())
+            exit_stack.callback(
+                lambda: loop.run_until_complete(scheduler.stop()))
+
+        if run_background:
+            assignments_refresh = PeriodicScheduler(
+                do_assignments_refresh, 60, "assignments_refresh",
+                timeout=60,
+                max_idle_period=max_idle_period,
+                loop=loop)
+            start_scheduler(assignments_refresh, exclusive=False)
+
         if not skip_svn_sync:
             svn_sync = PeriodicScheduler(
                 do_svn_sync, 30, "svn_sync",
                 timeout=60 * 10,
+                max_idle_period=max_idle_period,
                 loop=loop)
-            loop.run_until_complete(svn_sync.start())
-            exit_stack.callback(lambda: loop.run_until_complete(svn_sync.stop()))
+            start_scheduler(svn_sync)
 
         if not skip_trac_sync:
             trac_sync = PeriodicScheduler(
                 do_tickets_sync, 600, "trac_sync",
                 timeout=60 * 10,
                 loop=loop)
-            loop.run_until_complete(trac_sync.start())
-            exit_stack.callback(lambda: loop.run_until_complete(trac_sync.stop()))
+            start_scheduler(trac_sync)
 
         if not skip_checking:
             check_solutions_sync = PeriodicScheduler(
                 do_check_solutions, 30, "check_solutions_sync",
-                timeout=60 * 10,
+                # Checks have separate timeouts.
+                timeout=check_timeout * (_MAX_CHECKS_PER_RUN + 1),
+                max_idle_period=max_idle_period,
                 loop=loop)
-            loop.run_until_complete(check_solutions_sync.start())
-            exit_stack.callback(lambda: loop.run_until_complete(check_solutions_sync.stop()))
+            start_scheduler(check_solutions_sync, exclusive=False)
 
         if not skip_reporting:
             post_reports = PeriodicScheduler(
                 do_post_reports, 30, "post_reports",
                 timeout=60 * 10,
+                max_idle_period=max_idle_period,
                 loop=loop)
-            loop.run_until_complete(post_reports.start())
-            exit_stack.callback(lambda: loop.run_until_complete(post_reports.stop()))
-
-        app = aiohttp.web.Application(loop=loop)
-
-        # Start application server.
-        app_server = Server(
-            app,
-            credentials_checker,
-            token_provider,
-            db,
-            loop=loop,
-            enable_cors=enable_cors)
-        loop.run_until_complete(app_server.start())
-
-        handler = app.make_handler()
-        socket_server = loop.run_until_complete(
-            loop.create_server(handler, hostname, port))
-
-        def stop_app():
-            _logger.info("Stopping web application...")
-            socket_server.close()
-            loop.run_until_complete(socket_server.wait_closed())
-            loop.run_until_complete(app.shutdown())
-            loop.run_until_complete(
-                handler.finish_connections(shutdown_timeout))
-            loop.run_until_complete(app.cleanup())
-
-        # Stop our server first to allow graceful termination of persistent
-        # connections (e.g. WebSockets).
-        # Notice that top of the stack will be executed earlier.
-        exit_stack.callback(stop_app)
-        exit_stack.callback(
-            lambda: loop.run_until_complete(app_server.stop()))
-
-        url = yarl.URL('http://example.org').\
-            with_host(hostname).with_port(port)
-        _logger.info("Server started on {}".format(url.human_repr()))
+            start_scheduler(post_reports)
+
+        app_server = None
+        if serve_http:
+            # Web application is imported only by processes serving it.
+            from testing_server.credentials_checker import \
+                HtpasswdCredentialsChecker
+            from testing_server.server import Server
+
+            credentials_checker = HtpasswdCredentialsChecker(
+                htpasswd, loop=loop)
+            exit_stack.callback(credentials_checker.close)
+
+            ip_login_limiter = None
+            if login_limits_per_ip is not None:
+                rate, burst = login_limits_per_ip
+                ip_login_limiter = TokenBucketLimiter(rate / 60, burst)
+
+            failed_login_limiter = None
+            if failed_login_limits is not None:
+                rate, burst = failed_login_limits
+                failed_login_limiter = TokenBucketLimiter(rate / 60, burst)
+
+            app = aiohttp.web.Application(loop=loop)
+
+            # Start application server.
+            app_server = Server(
+                app,
+                credentials_checker,
+                token_provider,
+                db,
+                loop=loop,
+                enable_cors=enable_cors,
+                blob_store=blob_store,
+                publisher=publisher,
+                ws_flush_interval=ws_flush_interval,
+                ip_login_limiter=ip_login_limiter,
+                failed_login_limiter=failed_login_limiter,
+                trusted_proxies=trusted_proxies,
+                admin_users=admin_users,
+                enable_metrics=enable_metrics,
+                schedulers=schedulers)
+            listen_port = port
+
+        elif run_background and status_port is not None:
+            from testing_server.server import Server
+
+            app = aiohttp.web.Application(loop=loop)
+            app_server = Server(
+                app,
+                None,
+                token_provider,
+                db,
+                loop=loop,
+                admin_users=admin_users,
+                enable_metrics=enable_metrics,
+                schedulers=schedulers,
+                status_only=True)
+            listen_port = status_port
+            reuse_port = False
+
+        elif run_background:
+            _logger.warning(
+                "Background jobs are not reported by readiness check and "
+                "metrics of web server in other processes, use "
+                "--status-port to expose them")
+
+        if app_server is not None:
+            loop.run_until_complete(app_server.start())
+
+            handler = app.make_handler()
+            socket_server = loop.run_until_complete(
+                loop.create_server(handler, hostname, listen_port,
+                                   reuse_port=reuse_port))
+
+            def stop_app():
+                _logger.info("Stopping web application...")
+                socket_server.close()
+                loop.run_until_complete(socket_server.wait_closed())
+                loop.run_until_complete(app.shutdown())
+                loop.run_until_complete(
+                    handler.finish_connections(shutdown_timeout))
+                loop.run_until_complete(app.cleanup())
+
+            # Stop our server first to allow graceful termination of
+            # persistent connections (e.g. WebSockets).
+            # Notice that top of the stack will be executed earlier.
+            exit_stack.callback(stop_app)
+            exit_stack.callback(
+                lambda: loop.run_until_complete(app_server.stop()))
+
+            url = yarl.URL('http://example.org').\
+                with_host(hostname).with_port(listen_port)
+            _logger.info("Server started on {}".format(url.human_repr()))
+
+        _logger.info("Running roles: {}".format(", ".join(
+            role for role in ALL_ROLES if role in roles)))
 
         loop.run_forever()
 
@@ -273,6 +578,14 @@ def main():
         default="8080",
         help="TCP/IP port to serve on (default: %(default)r)",
     )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        help="TCP/IP port for readiness check (/api/ready), schedulers "
+             "status and metrics of process running background jobs "
+             "without web role (e.g. with --workers or --role). Web "
+             "workers don't report background jobs.",
+    )
     parser.add_argument(
         "--htpasswd-file",
         required=True,
@@ -284,6 +597,77 @@ def main():
         help="Allow API methods to be access from all origins according to "
              "CORS specification."
     )
+    parser.add_argument(
+        "--enable-metrics",
+        action='store_true',
+        help="Expose metrics in Prometheus text format on /metrics."
+    )
+    parser.add_argument(
+        "--max-idle-period",
+        type=float,
+        default=300,
+        help="Maximum interval in seconds between Subversion polls, checks "
+             "and reports while there is no new work "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--check-concurrency",
+        type=int,
+        default=2,
+        help="Maximum number of concurrently checked revisions "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--assignment-check-concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of concurrently checked revisions of single "
+             "assignment (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--report-concurrency",
+        type=int,
+        default=2,
+        help="Maximum number of concurrently posted Trac reports "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--assignment-report-concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of concurrently posted Trac reports of "
+             "single assignment (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--check-timeout",
+        type=float,
+        default=60 * 10,
+        help="Timeout in seconds for checking single revision "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--report-timeout",
+        type=float,
+        default=60,
+        help="Timeout in seconds for posting single Trac report "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=60 * 2,
+        help="Time in seconds to wait for running checks on termination "
+             "before they are interrupted, 0 exits immediately "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--admin-user",
+        dest="admin_users",
+        action='append',
+        default=[],
+        help="Login of user which has access to data of all users, "
+             "may be specified multiple times."
+    )
     parser.add_argument(
         "--skip-svn-sync",
         action='store_true',
@@ -314,6 +698,110 @@ def main():
         required=True,
         help="libpq connection string for PostgreSQL."
     )
+    parser.add_argument(
+        "--blob-store-dir",
+        help="Directory for storing blobs as files. If not specified blobs "
+             "are stored in PostgreSQL."
+    )
+    parser.add_argument(
+        "--blob-cache-size",
+        type=int,
+        default=64 * 1024 * 1024,
+        help="Maximum total size in bytes of blobs cached in memory, "
+             "0 disables caching (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--postgres-pubsub",
+        action='store_true',
+        help="Deliver check progress events through PostgreSQL "
+             "LISTEN/NOTIFY (required if checking and web server run in "
+             "different processes)."
+    )
+    parser.add_argument(
+        "--role",
+        dest="roles",
+        action='append',
+        choices=ALL_ROLES,
+        help="Role of process, may be specified several times "
+             "(default: all roles)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of web worker processes sharing port, if greater "
+             "than 1 supervisor process forks them and separate process "
+             "for other roles (implies --postgres-pubsub, see also "
+             "--status-port). Login rate limits are kept by each worker "
+             "separately, so effective limits are multiplied by number "
+             "of workers (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--uvloop",
+        action='store_true',
+        help="Use uvloop event loop if it's installed."
+    )
+    parser.add_argument(
+        "--json-codec",
+        choices=('auto', 'orjson', 'ujson', 'json'),
+        default='auto',
+        help="JSON library, 'auto' selects the fastest installed "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--leader-election",
+        action='store_true',
+        help="Run Subversion and Trac syncs and reporting only in one of "
+             "replicas sharing database, elected using PostgreSQL advisory "
+             "locks. Checking runs in all replicas."
+    )
+    parser.add_argument(
+        "--ws-flush-interval-ms",
+        type=int,
+        default=200,
+        help="Interval for batching check progress events sent over "
+             "web socket (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--login-rate-per-ip",
+        type=float,
+        default=30,
+        help="Allowed login attempts per minute from single IP address, "
+             "0 disables limiting. Behind reverse proxy all clients share "
+             "its address unless it's specified by --trusted-proxy "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--login-burst-per-ip",
+        type=int,
+        default=10,
+        help="Allowed burst of login attempts from single IP address "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--failed-login-rate",
+        type=float,
+        default=5,
+        help="Allowed failed login attempts per minute for single user "
+             "from single IP address, 0 disables limiting "
+             "(default: %(default)r)",
+    )
+    parser.add_argument(
+        "--failed-login-burst",
+        type=int,
+        default=5,
+        help="Allowed burst of failed login attempts for single user "
+             "from single IP address (default: %(default)r)",
+    )
+    parser.add_argument(
+        "--trusted-proxy",
+        dest="trusted_proxies",
+        action='append',
+        default=[],
+        help="Address or network (e.g. 10.0.0.0/8) of reverse proxy, "
+             "client address of requests from it is taken from "
+             "X-Forwarded-For header. May be specified multiple times.",
+    )
     parser.add_argument(
         "--trac-xmlrpc-uri",
         required=True,
@@ -352,33 +840,92 @@ def main():
 
     _setup_logging(args.log_level)
 
-    try:
-        return run_server(
-            args.hostname,
-            args.port,
-            args.htpasswd_file,
-            args.token_secret_file,
-            args.postgres_uri,
-            args.trac_xmlrpc_uri,
-            svn_uri=args.svn_uri,
-            svn_username=args.svn_username,
-            svn_password=args.svn_password,
-            worker_ssh_params=dict(
-                host=args.worker_ssh_host,
-                port=args.worker_ssh_port,
-                username=args.worker_ssh_username,
-                known_hosts=args.worker_ssh_known_hosts_file,
-                client_keys=[args.worker_ssh_key],
-            ),
-            enable_cors=args.enable_cors,
-            skip_svn_sync=args.skip_svn_sync,
-            skip_trac_sync=args.skip_trac_sync,
-            skip_checking=args.skip_checking,
-            skip_reporting=args.skip_reporting)
+    roles = frozenset(args.roles or ALL_ROLES)
 
-    except Exception:
-        _logger.exception("Server failed")
-        return 1
+    try:
+        codec_name = json_codec.use(
+            None if args.json_codec == 'auto' else args.json_codec)
+    except ImportError:
+        parser.error("JSON codec {!r} is not installed".format(
+            args.json_codec))
+    _logger.info("Using JSON codec {!r}".format(codec_name))
+
+    for proxy in args.trusted_proxies:
+        try:
+            ipaddress.ip_network(proxy, strict=False)
+        except ValueError:
+            parser.error("Invalid trusted proxy {!r}".format(proxy))
+
+    postgres_pubsub = args.postgres_pubsub
+    if args.workers > 1 and not postgres_pubsub:
+        # Check progress is published by other process than the ones
+        # serving web sockets.
+        _logger.info("Using PostgreSQL pubsub for multiple workers")
+        postgres_pubsub = True
+
+    run = functools.partial(
+        run_server,
+        args.hostname,
+        args.port,
+        args.htpasswd_file,
+        args.token_secret_file,
+        args.postgres_uri,
+        args.trac_xmlrpc_uri,
+        svn_uri=args.svn_uri,
+        svn_username=args.svn_username,
+        svn_password=args.svn_password,
+        worker_ssh_params=dict(
+            host=args.worker_ssh_host,
+            port=args.worker_ssh_port,
+            username=args.worker_ssh_username,
+            known_hosts=args.worker_ssh_known_hosts_file,
+            client_keys=[args.worker_ssh_key],
+        ),
+        blob_store_dir=args.blob_store_dir,
+        blob_cache_size=args.blob_cache_size,
+        postgres_pubsub=postgres_pubsub,
+        leader_election=args.leader_election,
+        ws_flush_interval=args.ws_flush_interval_ms / 1000,
+        login_limits_per_ip=(
+            (args.login_rate_per_ip, args.login_burst_per_ip)
+            if args.login_rate_per_ip > 0 else None),
+        failed_login_limits=(
+            (args.failed_login_rate, args.failed_login_burst)
+            if args.failed_login_rate > 0 else None),
+        trusted_proxies=args.trusted_proxies,
+        admin_users=args.admin_users,
+        enable_cors=args.enable_cors,
+        enable_metrics=args.enable_metrics,
+        max_idle_period=args.max_idle_period,
+        check_concurrency=args.check_concurrency,
+        assignment_check_concurrency=args.assignment_check_concurrency,
+        report_concurrency=args.report_concurrency,
+        assignment_report_concurrency=args.assignment_report_concurrency,
+        check_timeout=args.check_timeout,
+        report_timeout=args.report_timeout,
+        drain_timeout=args.drain_timeout,
+        skip_svn_sync=args.skip_svn_sync,
+        skip_trac_sync=args.skip_trac_sync,
+        skip_checking=args.skip_checking,
+        skip_reporting=args.skip_reporting,
+        status_port=args.status_port,
+        use_uvloop=args.uvloop)
+
+    if args.workers > 1 and ROLE_WEB in roles:
+        workers = [
+            ('web-{}'.format(idx),
+             functools.partial(_run_safely, run, roles={ROLE_WEB},
+                               reuse_port=True))
+            for idx in range(args.workers)]
+        background_roles = roles - {ROLE_WEB}
+        if background_roles:
+            workers.append(
+                ('background',
+                 functools.partial(_run_safely, run, roles=background_roles)))
+
+        return Supervisor(workers).run()
+
+    return _run_safely(run, roles=roles)
 
 
 if __name__ == '__main__':
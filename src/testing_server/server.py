@@ -1,26 +1,57 @@
 import asyncio
+import collections
+import functools
+import ipaddress
 import logging
-import json
+import math
 import mimetypes
+import os
+import time
 
 import aiohttp
 import aiohttp.hdrs
-from aiohttp import web
+from aiohttp import web, hdrs
 from aiohttp import WSMsgType
-import aiohttp_cors
 import async_timeout
 
 from . import abc
+from . import json_codec
+from . import metrics
 from .jsend import JSendFail, jsend_handler
 from .auth_mixin import AuthMixin, requires_login
+from .ratelimit import TokenBucketLimiter
+from .revision_fields import REVISION_FIELDS, REVISION_LIST_FIELDS
+from .ws_broadcast import Broadcaster
 
 __all__ = ('Server',)
 
 _PING_INTERVAL = 30
 _WS_AUTH_TIMEOUT = 30
+# Interval in seconds for batching check progress events sent to client.
+_WS_FLUSH_INTERVAL = 0.2
+# Maximum number of check progress events queued for single client.
+_WS_MAX_QUEUED_EVENTS = 1000
+
+# Blobs are content-addressed, so they can be cached forever.
+_BLOB_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Size of blob file chunks read and sent at once.
+_BLOB_CHUNK_SIZE = 256 * 1024
+
+# Default and maximum number of items in listing page.
+_DEFAULT_PAGE_SIZE = 100
+_MAX_PAGE_SIZE = 10000
+# Number of listing items fetched from database at once.
+_FETCH_BATCH_SIZE = 500
 
 _logger = logging.getLogger(__name__)
 
+_REQUEST_DURATION = metrics.Histogram(
+    'http_request_duration_seconds',
+    "Duration of HTTP requests handling.", ['method', 'route'])
+_RESPONSES = metrics.Counter(
+    'http_responses',
+    "Number of HTTP responses by status.", ['method', 'route', 'status'])
+
 
 class Server(AuthMixin):
 
@@ -31,7 +62,33 @@ class Server(AuthMixin):
                  db: abc.AbstractDatabase,
                  *,
                  loop,
-                 enable_cors=False):
+                 enable_cors=False,
+                 blob_store: abc.AbstractBlobStore=None,
+                 publisher: abc.AbstracePublisher=None,
+                 ws_flush_interval=_WS_FLUSH_INTERVAL,
+                 ip_login_limiter: TokenBucketLimiter=None,
+                 failed_login_limiter: TokenBucketLimiter=None,
+                 trusted_proxies=(),
+                 admin_users=(),
+                 enable_metrics=False,
+                 schedulers=(),
+                 status_only=False):
+        """
+        :param schedulers: `PeriodicScheduler`s of this process, they are
+            reported by admin and readiness endpoints.
+        :param status_only: serve only readiness, admin schedulers and
+            metrics endpoints, e.g. in process running only background
+            jobs. `credentials_checker` isn't used then.
+        :param enable_metrics: collect HTTP requests metrics and expose
+            all metrics on /metrics.
+        :param admin_users: logins of users which have access to data of
+            all users.
+        :param ip_login_limiter: limits login attempts from client IP.
+        :param failed_login_limiter: limits failed login attempts for
+            login from client IP.
+        :param trusted_proxies: addresses or networks of reverse proxies,
+            client IP of requests from them is taken from X-Forwarded-For.
+        """
         super().__init__(token_provider)
 
         self._app = app
@@ -39,13 +96,32 @@ class Server(AuthMixin):
         self._db = db
         self._loop = loop
         self._enable_cors = enable_cors
+        self._blob_store = blob_store
+        self._publisher = publisher
+        self._ip_login_limiter = ip_login_limiter
+        self._failed_login_limiter = failed_login_limiter
+        self._trusted_proxies = [
+            ipaddress.ip_network(proxy, strict=False)
+            for proxy in trusted_proxies]
+        self._admin_users = frozenset(admin_users)
+        self._enable_metrics = enable_metrics
+        self._schedulers = list(schedulers)
+        self._status_only = status_only
+
+        self._broadcaster = None
+        if publisher is not None:
+            self._broadcaster = Broadcaster(
+                publisher,
+                flush_interval=ws_flush_interval,
+                max_queued_events=_WS_MAX_QUEUED_EVENTS,
+                loop=loop)
 
         self._websockets = set()
 
-        mimetypes.init()
-
     async def start(self):
         if self._enable_cors:
+            import aiohttp_cors
+
             cors = aiohttp_cors.setup(self._app, defaults={
                 "*": aiohttp_cors.ResourceOptions(
                     allow_credentials=True,
@@ -58,9 +134,20 @@ class Server(AuthMixin):
         else:
             wrap = lambda route: route
 
-        wrap(self._app.router.add_get('/', self.get_default))
+        if self._enable_metrics:
+            self._app.middlewares.append(self._metrics_middleware)
+            self._app.router.add_get('/metrics', self.get_metrics)
 
         api_prefix = '/api'
+        self._app.router.add_get(api_prefix + '/ready', self.get_ready)
+        wrap(self._app.router.add_get(
+            api_prefix + '/admin/schedulers', self.get_admin_schedulers))
+
+        if self._status_only:
+            return
+
+        wrap(self._app.router.add_get('/', self.get_default))
+
         wrap(self._app.router.add_post(
             api_prefix + '/login', self.post_login))
 
@@ -75,15 +162,25 @@ class Server(AuthMixin):
             '/blobs/{blob_id}/{task_name}/{user}/{revision}/{name}',
             self.get_blob)
 
-        self._app.router.add_get(
-            '/users', self.handler_not_implemented)
-        self._app.router.add_get(
+        wrap(self._app.router.add_get('/users', self.get_users))
+        wrap(self._app.router.add_get('/revisions', self.get_revisions))
+        wrap(self._app.router.add_get(
+            '/users/{username}/{home_assignment}/',
+            self.get_user_revisions))
+        wrap(self._app.router.add_get(
             '/users/{username}/{home_assignment}/{revision}/',
-            self.handler_not_implemented)
+            self.get_user_revision))
 
         self._app.router.add_get('/ws', self.handler_not_implemented)
 
+    @property
+    def broadcaster(self):
+        return self._broadcaster
+
     async def stop(self):
+        if self._broadcaster is not None:
+            await self._broadcaster.close()
+
         while self._websockets:
             ws = self._websockets.pop()
             await ws.close(
@@ -97,12 +194,39 @@ class Server(AuthMixin):
                             "'application/json'")
 
         try:
-            json_body = await request.json()
+            json_body = await request.json(loads=json_codec.loads)
         except Exception:
             raise JSendFail("Failed to parse JSON request body.")
 
         return json_body
 
+    async def _metrics_middleware(self, app, handler):
+        async def middleware(request):
+            start = time.monotonic()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+
+            except web.HTTPException as ex:
+                status = ex.status
+                raise
+
+            finally:
+                route = _route_name(request)
+                _REQUEST_DURATION.labels(request.method, route).observe(
+                    time.monotonic() - start)
+                _RESPONSES.labels(request.method, route, status).inc()
+
+        return middleware
+
+    async def get_metrics(self, request):
+        await metrics.REGISTRY.collect()
+        return web.Response(
+            body=metrics.REGISTRY.expose().encode(),
+            headers={hdrs.CONTENT_TYPE: metrics.CONTENT_TYPE})
+
     @jsend_handler
     async def get_default(self, request):
         return "Testing server."
@@ -110,24 +234,194 @@ class Server(AuthMixin):
     async def get_blob(self, request):
         blob_id = request.match_info['blob_id']
 
-        blob = await self._db.get_blob(blob_id)
-        if blob is None:
-            raise web.HTTPNotFound
+        etag = '"{}"'.format(blob_id)
+        cache_headers = {
+            hdrs.ETAG: etag,
+            hdrs.CACHE_CONTROL: _BLOB_CACHE_CONTROL,
+        }
+
+        if_none_match = request.headers.get(hdrs.IF_NONE_MATCH)
+        if _etag_matches(if_none_match, etag):
+            # Blob with this id can't change, no need to query database.
+            return web.Response(status=304, headers=cache_headers)
+        # "*" matches only existing blob.
+        if_none_match_any = (
+            if_none_match is not None and if_none_match.strip() == '*')
 
         name = request.match_info['name']
         content_type, _ = mimetypes.guess_type(name)
         if content_type is None:
             content_type = 'text/plain'
 
-        return web.Response(body=blob, content_type=content_type)
+        if self._blob_store is not None:
+            try:
+                path = self._blob_store.path(blob_id)
+            except ValueError:
+                raise web.HTTPNotFound
+
+            if os.path.isfile(path):
+                if if_none_match_any:
+                    return web.Response(status=304, headers=cache_headers)
+
+                headers = dict(cache_headers)
+                headers[hdrs.CONTENT_TYPE] = content_type
+                status, byte_range = self._byte_range(
+                    request, etag, os.path.getsize(path), headers)
+                if status == 416:
+                    return web.Response(status=416, headers=headers)
+
+                start, end = byte_range
+                return await self._stream_file(
+                    request, path, start, end + 1 - start,
+                    status=status, headers=headers)
+
+        # Not yet migrated blobs are still stored in database.
+        blob = await self._db.get_blob(blob_id)
+        if blob is None:
+            raise web.HTTPNotFound
+        if if_none_match_any:
+            return web.Response(status=304, headers=cache_headers)
+
+        headers = dict(cache_headers)
+        status, byte_range = self._byte_range(
+            request, etag, len(blob), headers)
+        if status == 416:
+            return web.Response(status=416, headers=headers)
+
+        elif status == 206:
+            start, end = byte_range
+            blob = blob[start:end + 1]
+
+        return web.Response(
+            status=status, body=blob, content_type=content_type,
+            headers=headers)
+
+    @staticmethod
+    def _byte_range(request, etag, size, headers):
+        """Returns response status and (start, end) inclusive byte range
+        of blob to send for Range and If-Range request headers. Adds
+        range response headers to `headers`."""
+        headers[hdrs.ACCEPT_RANGES] = 'bytes'
+
+        range_header = request.headers.get(hdrs.RANGE)
+        if_range = request.headers.get(hdrs.IF_RANGE)
+        if range_header is not None and (
+                if_range is None or _if_range_matches(if_range, etag)):
+            byte_range = _parse_byte_range(range_header, size)
+            if byte_range is _UNSATISFIABLE_RANGE:
+                headers[hdrs.CONTENT_RANGE] = 'bytes */{}'.format(size)
+                return 416, None
+
+            elif byte_range is not None:
+                headers[hdrs.CONTENT_RANGE] = 'bytes {}-{}/{}'.format(
+                    byte_range[0], byte_range[1], size)
+                return 206, byte_range
+
+        return 200, (0, size - 1)
+
+    async def _stream_file(self, request, path, offset, length, *,
+                           status=200, headers):
+        """Streams `length` bytes of file starting from `offset` in
+        chunks, so large blobs are not read into memory. File is read in
+        executor to not block event loop."""
+        run = functools.partial(self._loop.run_in_executor, None)
+        f = await run(open, path, 'rb')
+        try:
+            await run(f.seek, offset)
+
+            response = web.StreamResponse(status=status, headers=headers)
+            response.content_length = length
+            await response.prepare(request)
+
+            while length > 0:
+                chunk = await run(f.read, min(length, _BLOB_CHUNK_SIZE))
+                if not chunk:
+                    raise EOFError("Blob file {} is truncated".format(path))
+                response.write(chunk)
+                await response.drain()
+                length -= len(chunk)
+
+            await response.write_eof()
+        finally:
+            f.close()
+
+        return response
 
     @jsend_handler
     @requires_login
     async def get_check_token(self, request, token_payload):
         return "Token is valid."
 
+    @jsend_handler
+    async def get_ready(self, request):
+        """Readiness check: fails if some scheduler is stuck, crash
+        looping or stopped."""
+        unhealthy = [scheduler.name for scheduler in self._schedulers
+                     if not scheduler.healthy]
+        if unhealthy:
+            raise JSendFail(
+                data=dict(message="Schedulers are not healthy.",
+                          schedulers=unhealthy),
+                http_code=503)
+
+        return "Ready."
+
+    @jsend_handler
+    @requires_login
+    async def get_admin_schedulers(self, request, token_payload):
+        self._check_access(token_payload)
+
+        return [scheduler.status() for scheduler in self._schedulers]
+
+    @staticmethod
+    def _too_many_requests(retry_after):
+        return web.HTTPTooManyRequests(
+            text="Too many login attempts, try again later.",
+            headers={hdrs.RETRY_AFTER: str(math.ceil(retry_after))})
+
+    def _is_trusted_proxy(self, address):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(address in network for network in self._trusted_proxies)
+
+    def _client_address(self, request):
+        """Returns IP address of client, requests from trusted proxies
+        are attributed to address from X-Forwarded-For."""
+        peername = request.transport.get_extra_info('peername')
+        # Peer name is (host, port, ...) tuple for TCP sockets.
+        remote = peername[0] if isinstance(peername, tuple) else None
+        if not self._is_trusted_proxy(remote):
+            return remote
+
+        addresses = [
+            address.strip()
+            for header in request.headers.getall('X-Forwarded-For', ())
+            for address in header.split(',') if address.strip()]
+        if not addresses:
+            return remote
+
+        # Each proxy appends address of its peer, addresses to the left of
+        # the first untrusted one may be forged by client.
+        for address in reversed(addresses):
+            if not self._is_trusted_proxy(address):
+                return address
+        return addresses[0]
+
     @jsend_handler
     async def post_login(self, request: web.Request):
+        client_address = self._client_address(request)
+
+        # Requests are throttled before any (slow) password verification.
+        if self._ip_login_limiter is not None:
+            retry_after = self._ip_login_limiter.consume(client_address)
+            if retry_after:
+                _logger.warning(
+                    "Login attempts from {} are throttled".format(
+                        client_address))
+                raise self._too_many_requests(retry_after)
+
         json_body = await self._json_body(request)
 
         if not isinstance(json_body, dict):
@@ -143,8 +437,22 @@ class Server(AuthMixin):
             raise JSendFail(
                 "Request JSON body doesn't have 'password' attribute.")
 
+        # Failed attempts are counted per client, so others can't lock
+        # user out by guessing password.
+        failed_login_key = (client_address, login)
+        if self._failed_login_limiter is not None:
+            retry_after = self._failed_login_limiter.check(failed_login_key)
+            if retry_after:
+                _logger.warning(
+                    "Login attempts for user {!r} from {} are "
+                    "throttled".format(login, client_address))
+                raise self._too_many_requests(retry_after)
+
         valid = await self._credentials_checker.check_password(login, password)
         if not valid:
+            if self._failed_login_limiter is not None:
+                self._failed_login_limiter.consume(failed_login_key)
+
             logging.info("Authentication failed for user {!r}".format(login))
             raise JSendFail(
                 "Your user name and password don't match.",
@@ -156,6 +464,147 @@ class Server(AuthMixin):
 
         return token
 
+    def _check_access(self, token_payload, user=None):
+        """Checks that user from token has access to data of `user` (or
+        of all users if `user` is None)."""
+        login = token_payload['login']
+        if login in self._admin_users or (user is not None and user == login):
+            return
+
+        raise web.HTTPForbidden(text="Access denied.")
+
+    @jsend_handler
+    @requires_login
+    async def get_users(self, request, token_payload):
+        """Lists users with their assignments, paginated by user name."""
+        self._check_access(token_payload)
+
+        after = request.GET.get('after')
+        limit = _page_limit(request)
+
+        async def fetch(after, limit):
+            return await self._db.get_users(after=after, limit=limit)
+
+        return await self._stream_page(
+            request, 'users', 'user', fetch, after, limit)
+
+    @jsend_handler
+    @requires_login
+    async def get_revisions(self, request, token_payload):
+        """Lists revisions of all users, optionally filtered by
+        assignment and state."""
+        self._check_access(token_payload)
+
+        return await self._stream_revisions(
+            request,
+            assignment=request.GET.get('assignment'),
+            state=request.GET.get('state'))
+
+    @jsend_handler
+    @requires_login
+    async def get_user_revisions(self, request, token_payload):
+        user = request.match_info['username']
+        self._check_access(token_payload, user)
+
+        return await self._stream_revisions(
+            request,
+            user=user,
+            assignment=request.match_info['home_assignment'],
+            state=request.GET.get('state'))
+
+    @jsend_handler
+    @requires_login
+    async def get_user_revision(self, request, token_payload):
+        user = request.match_info['username']
+        self._check_access(token_payload, user)
+
+        try:
+            revision_id = int(request.match_info['revision'])
+        except ValueError:
+            raise web.HTTPNotFound(text="Revision not found.")
+
+        fields = _fields_query_param(request, REVISION_FIELDS)
+
+        revision = await self._db.get_revision(
+            revision_id, fields=('user', 'assignment') + fields)
+        if (revision is None or
+                revision['user'] != user or
+                revision['assignment'] !=
+                request.match_info['home_assignment']):
+            raise web.HTTPNotFound(text="Revision not found.")
+
+        return {field: revision[field] for field in fields}
+
+    async def _stream_revisions(self, request, **filters):
+        fields = _fields_query_param(request, REVISION_LIST_FIELDS)
+        if 'id' not in fields:
+            # Revision id is pagination cursor.
+            fields = ('id',) + fields
+
+        after = _int_query_param(request, 'after')
+        limit = _page_limit(request)
+
+        async def fetch(after, limit):
+            return await self._db.get_revisions(
+                after=after, limit=limit, fields=fields, **filters)
+
+        return await self._stream_page(
+            request, 'revisions', 'id', fetch, after, limit)
+
+    async def _stream_page(self, request, name, cursor_key, fetch, after,
+                           limit):
+        """Streams page of items as JSend response:
+        {"status": "success", "data": {name: [...], "next": cursor}}.
+
+        Items are fetched with `fetch(after, limit)` in batches and encoded
+        as they arrive, so large pages are not kept in memory. "next" is
+        `after` value for the next page or null if this page is the last.
+        """
+        batch_limit = min(limit, _FETCH_BATCH_SIZE)
+        # Errors of the first query are still reported as JSend response.
+        items = await fetch(after, batch_limit)
+
+        response = web.StreamResponse()
+        response.content_type = 'application/json'
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+
+        try:
+            response.write(
+                '{{"status": "success", "data": {{{}: ['.format(
+                    json_codec.dumps(name)).encode())
+
+            num_items = 0
+            while True:
+                if items:
+                    chunk = b', '.join(
+                        json_codec.dumpb(item) for item in items)
+                    if num_items:
+                        chunk = b', ' + chunk
+                    response.write(chunk)
+                    await response.drain()
+
+                    num_items += len(items)
+                    after = items[-1][cursor_key]
+
+                if len(items) < batch_limit or num_items >= limit:
+                    break
+
+                batch_limit = min(limit - num_items, _FETCH_BATCH_SIZE)
+                items = await fetch(after, batch_limit)
+
+            next_cursor = after if num_items >= limit else None
+            response.write('], "next": {}}}}}'.format(
+                json_codec.dumps(next_cursor)).encode())
+            await response.write_eof()
+
+        except Exception:
+            # Status is already sent, client will get truncated JSON.
+            _logger.exception("Failed to stream {}".format(name))
+            response.force_close()
+
+        return response
+
     async def get_ws(self, request: web.Request):
         ws = web.WebSocketResponse()
         await ws.prepare(request)
@@ -183,11 +632,14 @@ class Server(AuthMixin):
 
         ping_sender_task = self._loop.create_task(send_pings(ws))
 
+        # revision id -> topic
+        subscriptions = {}
+
         def get_msg_payload(msg):
             assert msg.tp == WSMsgType.TEXT
             try:
-                json_body = json.loads(msg.data)
-            except json.JSONDecodeError:
+                json_body = json_codec.loads(msg.data)
+            except json_codec.JSONDecodeError:
                 _logger.exception(
                     "Can't decode JSON from web socket: {!r}".format(
                         msg.data
@@ -233,7 +685,8 @@ class Server(AuthMixin):
                         auth_data['type'], auth_type_string))
                 return ws
 
-            payload = self.token_provider.validate_token(auth_data['token'])
+            payload = await self.token_provider.validate_token(
+                auth_data['token'])
             if payload is None:
                 _logger.error(
                     "Token sent over WS is invalid.")
@@ -242,7 +695,7 @@ class Server(AuthMixin):
                     'data': {
                         'message': 'Invalid token.',
                     },
-                })
+                }, dumps=json_codec.dumps)
                 return ws
             else:
                 _logger.info(
@@ -250,7 +703,7 @@ class Server(AuthMixin):
                 await ws.send_json({
                     'status': 'success',
                     'message': 'Token is valid.',
-                })
+                }, dumps=json_codec.dumps)
 
             async for msg in ws:
                 if msg.tp == WSMsgType.TEXT:
@@ -261,6 +714,18 @@ class Server(AuthMixin):
                     _logger.debug("Got Web Socket message: {!r}".format(
                         json_body))
 
+                    if json_body['type'] == 'SUBSCRIBE':
+                        await self._ws_subscribe(
+                            ws, payload['login'], json_body, subscriptions)
+
+                    elif json_body['type'] == 'UNSUBSCRIBE':
+                        self._ws_unsubscribe(ws, json_body, subscriptions)
+
+                    else:
+                        _logger.error(
+                            "Unknown web socket message type {!r}".format(
+                                json_body['type']))
+
                 elif msg.tp == aiohttp.WSMsgType.ERROR:
                     _logger.error(
                         "Got an exception in web socket",
@@ -275,6 +740,10 @@ class Server(AuthMixin):
             ping_sender_task.cancel()
             await ping_sender_task
 
+            for revision_id in list(subscriptions):
+                self._ws_unsubscribe(ws, dict(revision=revision_id),
+                                     subscriptions)
+
             await ws.close()
 
             # May be already removed is server is shutting down.
@@ -282,6 +751,170 @@ class Server(AuthMixin):
 
         return ws
 
+    async def _ws_subscribe(self, ws, login, json_body, subscriptions):
+        """Subscribes web socket to check progress of user revision.
+
+        Message: {"type": "SUBSCRIBE", "token": ..., "revision": 123}.
+        Events are sent in batches:
+        {"type": "CHECK_PROGRESS", "revision": 123, "events": [...]}.
+        """
+        async def fail(message):
+            ws.send_json({
+                'status': 'fail',
+                'data': {
+                    'message': message,
+                },
+            }, dumps=json_codec.dumps)
+            await ws.drain()
+
+        if self._broadcaster is None:
+            await fail("Check progress is not available.")
+            return
+
+        try:
+            revision_id = int(json_body.get('revision'))
+        except (TypeError, ValueError):
+            await fail("Invalid revision.")
+            return
+
+        if revision_id in subscriptions:
+            await fail("Already subscribed.")
+            return
+
+        if await self._db.get_revision_user(revision_id) != login:
+            # Don't disclose if revision exists.
+            await fail("Revision not found.")
+            return
+
+        topic = 'check.*.{}'.format(revision_id)
+        self._broadcaster.add(topic, ws, {
+            'type': 'CHECK_PROGRESS',
+            'revision': revision_id,
+        })
+        subscriptions[revision_id] = topic
+
+        ws.send_json({
+            'status': 'success',
+            'message': 'Subscribed.',
+        }, dumps=json_codec.dumps)
+        await ws.drain()
+
+    def _ws_unsubscribe(self, ws, json_body, subscriptions):
+        try:
+            revision_id = int(json_body.get('revision'))
+        except (TypeError, ValueError):
+            return
+
+        topic = subscriptions.pop(revision_id, None)
+        if topic is not None:
+            self._broadcaster.remove(topic, ws)
+
     @jsend_handler
     async def handler_not_implemented(self, request):
         raise JSendFail("Not implemented")
+
+
+def _route_name(request):
+    """Returns route path pattern, raw paths are not used as metric labels
+    to keep number of label values bounded."""
+    info = request.match_info.route.get_info()
+    return info.get('formatter') or info.get('path') or 'unmatched'
+
+
+def _int_query_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        raise JSendFail(
+            "Query parameter {!r} must be integer.".format(name))
+
+
+def _page_limit(request):
+    limit = _int_query_param(request, 'limit', _DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= _MAX_PAGE_SIZE:
+        raise JSendFail(
+            "Query parameter 'limit' must be in range [1, {}].".format(
+                _MAX_PAGE_SIZE))
+    return limit
+
+
+def _fields_query_param(request, default):
+    """Parses comma separated list of requested revision fields."""
+    value = request.GET.get('fields')
+    if value is None:
+        return default
+
+    fields = tuple(collections.OrderedDict.fromkeys(
+        field.strip() for field in value.split(',') if field.strip()))
+    unknown_fields = set(fields).difference(REVISION_FIELDS)
+    if not fields or unknown_fields:
+        raise JSendFail(
+            "Query parameter 'fields' must be comma separated list of "
+            "{}.".format(', '.join(REVISION_FIELDS)))
+
+    return fields
+
+
+def _etag_matches(header_value, etag):
+    """Checks If-None-Match header value against ETag with weak
+    comparison, "*" is not matched."""
+    if header_value is None:
+        return False
+
+    for value in header_value.split(','):
+        value = value.strip()
+        if value.startswith('W/'):
+            value = value[2:]
+        if value == etag:
+            return True
+
+    return False
+
+
+def _if_range_matches(header_value, etag):
+    """Checks If-Range header value against ETag with strong comparison,
+    dates are never matched."""
+    return header_value.strip() == etag
+
+
+_UNSATISFIABLE_RANGE = object()
+
+
+def _parse_byte_range(header_value, size):
+    """Parses single byte range from Range header value.
+
+    Returns inclusive (start, end) tuple, None if range should be ignored
+    (e.g. unsupported unit or multiple ranges) or _UNSATISFIABLE_RANGE.
+    """
+    unit, _, ranges = header_value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+
+    start, sep, end = ranges.strip().partition('-')
+    if not sep:
+        return None
+
+    try:
+        if not start:
+            # Suffix range: last N bytes.
+            suffix_length = int(end)
+            if suffix_length <= 0:
+                return _UNSATISFIABLE_RANGE
+            start = max(size - suffix_length, 0)
+            end = size - 1
+        else:
+            start = int(start)
+            end = int(end) if end else max(start, size - 1)
+    except ValueError:
+        return None
+
+    if start < 0 or start > end:
+        return None
+    if start >= size:
+        return _UNSATISFIABLE_RANGE
+
+    return start, min(end, size - 1)
@@ -0,0 +1,120 @@
+import logging
+import os
+import signal
+import time
+
+__all__ = ('Supervisor',)
+
+_logger = logging.getLogger(__name__)
+
+_STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class Supervisor:
+    """Runs workers in forked child processes.
+
+    Workers which die are restarted, termination signals received by
+    supervisor are forwarded to all workers. Workers run in their own
+    sessions, so signals sent to foreground process group (e.g. Ctrl-C in
+    terminal) reach them only once, through supervisor. Supervisor doesn't
+    run event loop, so it must be started before any event loop is
+    created.
+    """
+
+    def __init__(self, workers, *, restart_delay=1, max_restart_delay=60):
+        """
+        :param workers: list of (name, function) pairs, function is called
+            in child process and returns exit code.
+        :param restart_delay: delay in seconds before restart of died
+            worker, doubled for each consecutive failure of worker which
+            didn't live longer than `max_restart_delay`.
+        """
+        self._workers = list(workers)
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+
+        # pid -> (name, function, start time, restart delay)
+        self._children = {}
+        # Received termination signal.
+        self._stop_signal = None
+
+    def run(self):
+        """Runs workers until termination signal, returns exit code."""
+        for signum in _STOP_SIGNALS:
+            signal.signal(signum, self._on_signal)
+
+        for name, function in self._workers:
+            self._spawn(name, function, self._restart_delay)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            child = self._children.pop(pid, None)
+            if child is None:
+                continue
+            name, function, start, delay = child
+
+            if self._stop_signal is not None:
+                _logger.info("Worker {} (pid {}) stopped".format(name, pid))
+                continue
+
+            if time.monotonic() - start > self._max_restart_delay:
+                delay = self._restart_delay
+
+            _logger.error(
+                "Worker {} (pid {}) exited with status {}, restarting "
+                "in {} s".format(name, pid, status, delay))
+            time.sleep(delay)
+            if self._stop_signal is None:
+                self._spawn(name, function,
+                            min(delay * 2, self._max_restart_delay))
+
+        return 0
+
+    def _spawn(self, name, function, restart_delay):
+        # Signals are delivered after child is registered (in supervisor)
+        # or has default handlers (in child).
+        signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                self._run_child(name, function)
+
+            self._children[pid] = (name, function, time.monotonic(),
+                                   restart_delay)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+
+        _logger.info("Started worker {} (pid {})".format(name, pid))
+
+    @staticmethod
+    def _run_child(name, function):
+        os.setsid()
+        for signum in _STOP_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+
+        exit_code = 1
+        try:
+            exit_code = function()
+        except BaseException:
+            _logger.exception("Worker {} failed".format(name))
+        finally:
+            # Child must not return into supervisor code.
+            os._exit(exit_code or 0)
+
+    def _on_signal(self, signum, frame):
+        _logger.info("Received signal {}, stopping workers...".format(signum))
+        self._stop_signal = signum
+        for pid in list(self._children):
+            self._kill(pid, signum)
+
+    @staticmethod
+    def _kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
@@ -4,8 +4,14 @@ from xml.dom import minidom
 
 import yarl
 
+from . import metrics
+
 _logger = logging.getLogger(__name__)
 
+_COMMAND_DURATION = metrics.Histogram(
+    'svn_command_duration_seconds',
+    "Duration of Subversion commands.", ['command'])
+
 
 def parse_log_entry(logentry, path_to_assignment_id):
     revision = int(logentry.attributes['revision'].value)
@@ -97,8 +103,9 @@ async def svn_log(svn_uri, *,
 
     cmd.append(svn_uri)
 
-    revs_xml = await check_output(*cmd, loop=loop,
-                                  args_to_print=_obfuscate_password(cmd))
+    with _COMMAND_DURATION.labels('log').time():
+        revs_xml = await check_output(
+            *cmd, loop=loop, args_to_print=_obfuscate_password(cmd))
 
     return revs_xml
 
@@ -113,8 +120,9 @@ async def svn_checkout(revision, file, svn_uri, svn_username=None, svn_password=
 
     cmd.append(str(yarl.URL(svn_uri) / file.lstrip('/')) + '@' + str(revision))
 
-    file_contents = await check_output(*cmd, loop=loop,
-                                       args_to_print=_obfuscate_password(cmd))
+    with _COMMAND_DURATION.labels('cat').time():
+        file_contents = await check_output(
+            *cmd, loop=loop, args_to_print=_obfuscate_password(cmd))
 
     return file_contents
 
@@ -123,6 +131,7 @@ async def sync_svn(db,
                    path_to_assignment_id,
                    svn_uri,
                    *, svn_username=None, svn_password=None, loop):
+    """Returns number of added revisions."""
     last_commit_id = await db.get_last_synced_svn_revision()
 
     _logger.info("Retrieving subversion log starting from {} commit".format(
@@ -134,6 +143,7 @@ async def sync_svn(db,
         last_commit_id=last_commit_id,
         svn_username=svn_username, svn_password=svn_password, loop=loop)
 
+    num_added = 0
     for revision, file, author, msg, assignment_id in parse_log_xml(
             revs_xml, path_to_assignment_id):
         if revision <= (last_commit_id or 0):
@@ -150,5 +160,8 @@ async def sync_svn(db,
 
         await db.add_revision(revision, author, assignment_id, solution_id,
                               msg)
+        num_added += 1
 
     _logger.info("Done syncing Subversion")
+
+    return num_added
@@ -1,44 +1,84 @@
 import asyncio
+import collections
+import contextlib
 import os
 import logging
-import json
 import codecs
-import random
+import socket
+import uuid
 
-import asyncssh
+import async_timeout
 
-from .db import (
-    LINKED_PTR_ASSIGNMENT_ID,
-    LAZY_STRING_ASSIGNMENT_ID,
-    FUNCTION_ASSIGNMENT_ID,
-    BIND_ASSIGNMENT_ID,
-
-    LINKED_PTR_PATH,
-    LAZY_STRING_PATH,
-    FUNCTION_PATH,
-    BIND_PATH
-)
+from .check_result import get_failures, failure_signature
+from . import json_codec
+from . import metrics
 
 _logger = logging.getLogger(__name__)
 
-__all__ = ('check_solutions',)
+__all__ = ('check_solutions', 'make_claim_owner', 'check_topic')
+
+# Time in seconds for which checked revision is claimed by checker.
+# Claim is renewed while check is running, so if checker dies revision
+# becomes available for other checkers soon.
+CLAIM_LEASE = 60
+
+_STAGE_DURATION = metrics.Histogram(
+    'check_stage_duration_seconds',
+    "Duration of revision check stages.", ['assignment', 'stage'])
+_CHECKS = metrics.Counter(
+    'checks',
+    "Number of finished revision checks by resulting state.",
+    ['assignment', 'state'])
+
+
+def check_topic(assignment_name, revision_id):
+    """Returns topic for events about check of revision.
+
+    Published events are dicts with 'type' key:
+     * 'state': revision check state changed to 'state',
+     * 'output': 'line' was printed by checker.
+    """
+    return 'check.{}.{}'.format(assignment_name, revision_id)
+
+
+def _publish_event(publisher, topic, revision_id, event_type, **kwargs):
+    if publisher is not None:
+        publisher.publish(
+            topic, dict(type=event_type, revision=revision_id, **kwargs))
+
+
+def make_claim_owner():
+    """Returns unique id of checker used for claiming revisions."""
+    return '{}:{}:{}'.format(
+        socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
 
 
 async def run_check(user, revision_id, solution_blob, assignment_name,
                     solution_name, tests_dir, common_header,
-                    *, ssh_params, loop):
+                    *, ssh_params, publisher=None, loop):
     data_dir = os.path.join('check', assignment_name, user, str(revision_id))
 
     solution_file = os.path.join(data_dir, solution_name)
     logs_dir = os.path.join(data_dir, 'logs')
     out_log = os.path.join(data_dir, 'out.log')
 
-    async with asyncssh.connect(**ssh_params, loop=loop) as conn:
-        await conn.run('mkdir -p {}'.format(data_dir), check=True)
-        await conn.run('cat > {}'.format(solution_file),
-                       input=solution_blob,
-                       check=True,
-                       encoding=None)
+    def stage_timer(stage):
+        return _STAGE_DURATION.labels(assignment_name, stage).time()
+
+    # Imported on first check, processes without checker role don't
+    # need it.
+    import asyncssh
+
+    with stage_timer('connect'):
+        conn = await asyncssh.connect(**ssh_params, loop=loop)
+
+    async with conn:
+        with stage_timer('upload'):
+            await conn.run('mkdir -p {}'.format(data_dir), check=True)
+            await conn.run('cat > {}'.format(solution_file),
+                           input=solution_blob,
+                           check=True,
+                           encoding=None)
 
         cmd = (
             '/home/cpptest/env/bin/python -u testing.py {solution_file} '
@@ -49,6 +89,8 @@ async def run_check(user, revision_id, solution_blob, assignment_name,
             solution_file=solution_file, tests_dir=tests_dir,
             logs_dir=logs_dir, out_log=out_log, common_header=common_header)
 
+        topic = check_topic(assignment_name, revision_id)
+
         async def log_stream(stream, name):
             while True:
                 try:
@@ -65,18 +107,21 @@ async def run_check(user, revision_id, solution_blob, assignment_name,
 
                 _logger.debug("{}:{} {}: {}".format(
                     user, revision_id, name, line.rstrip()))
-
-        process = await conn.create_process(cmd)
-        stdout_logger_task = loop.create_task(
-            log_stream(process.stdout, "stdout"))
-
-        try:
-            _logger.debug("{}:{} waiting process termination...".format(
-                user, revision_id))
-            await process.wait()
-        except Exception:
-            stdout_logger_task.cancel()
-            raise
+                _publish_event(publisher, topic, revision_id, 'output',
+                               line=line.rstrip())
+
+        with stage_timer('run'):
+            process = await conn.create_process(cmd)
+            stdout_logger_task = loop.create_task(
+                log_stream(process.stdout, "stdout"))
+
+            try:
+                _logger.debug("{}:{} waiting process termination...".format(
+                    user, revision_id))
+                await process.wait()
+            except Exception:
+                stdout_logger_task.cancel()
+                raise
 
         _logger.debug("{}:{} reading stderr...".format(
             user, revision_id))
@@ -96,7 +141,7 @@ async def run_check(user, revision_id, solution_blob, assignment_name,
                     user, revision_id, err))
             raise
 
-        ci_data = json.loads(ci_log)
+        ci_data = json_codec.loads(ci_log)
 
         #import pprint
         #pprint.pprint(ci_data)
@@ -104,137 +149,248 @@ async def run_check(user, revision_id, solution_blob, assignment_name,
         return ci_data
 
 
-async def check_revision(db, revision_id, assignment_id, *, ssh_params, loop):
-    # TODO
-    assigments_config = {
-        LINKED_PTR_ASSIGNMENT_ID:
-            (os.path.basename(LINKED_PTR_PATH),
-             'linked_ptr/tests/',
-             'linked_ptr/tests/common.h',
-             'linked_ptr'),
-        LAZY_STRING_ASSIGNMENT_ID:
-            (os.path.basename(LAZY_STRING_PATH),
-             'lazy_string/tests/',
-             'lazy_string/tests/common.h',
-             'lazy_string'),
-        FUNCTION_ASSIGNMENT_ID:
-            (os.path.basename(FUNCTION_PATH),
-             'function/tests/',
-             'function/tests/common.h',
-             'function'),
-        BIND_ASSIGNMENT_ID:
-            (os.path.basename(BIND_PATH),
-             'bind/tests/',
-             'bind/tests/common.h',
-             'bind'),
-    }
-
-    assert assignment_id in assigments_config
-    solution_name, tests_dir, common_header, assignment_name = \
-        assigments_config[assignment_id]
-
-    curstate = await db.get_revision_state(revision_id)
-
-    _logger.info("Checking revision {} ({!r})".format(revision_id, curstate))
-
-    assert curstate in ('new', 'failed'), \
-        "Unexpected state {!r}".format(curstate)
-
-    await db.set_revision_state(revision_id, 'checking')
+async def _renew_claim(db, revision_id, owner, lease, *, loop):
+    while True:
+        await asyncio.sleep(lease / 3, loop=loop)
+        try:
+            renewed = await db.renew_revision_claim(revision_id, owner, lease)
+        except Exception:
+            _logger.exception(
+                "Failed to renew claim on revision {}".format(revision_id))
+            continue
+
+        if not renewed:
+            _logger.warning(
+                "Revision {} is not claimed by {!r} anymore".format(
+                    revision_id, owner))
+            return
+
+
+async def check_revision(db, revision_id, assignment, *,
+                         owner, lease=CLAIM_LEASE, ssh_params,
+                         publisher=None, timeout=None, loop):
+    """Checks revision claimed by `owner`.
+
+    Revision is marked as failed if check fails or doesn't finish in
+    `timeout` seconds. If check is cancelled, revision is returned to
+    'new' state.
+    """
+    assignment_name = assignment.name
+
+    _logger.info("Checking revision {}".format(revision_id))
+
+    topic = check_topic(assignment_name, revision_id)
+    _publish_event(publisher, topic, revision_id, 'state', state='checking')
+
+    renew_claim_task = loop.create_task(
+        _renew_claim(db, revision_id, owner, lease, loop=loop))
+
+    def stage_timer(stage):
+        return _STAGE_DURATION.labels(assignment_name, stage).time()
 
     try:
-        user, solution_blob = await db.get_revision_data(revision_id)
-
-        ci_data = await run_check(
-            user, revision_id, solution_blob, assignment_name,
-            solution_name, tests_dir, common_header,
-            ssh_params=ssh_params, loop=loop)
-
-        async def decode(base64_field):
-            if not base64_field:
-                return None
-            return await db.store_blob(
-                codecs.decode(base64_field.encode(), 'base64'))
-
-        ci_data['common_header_contents'] = await decode(
-            ci_data['common_header_contents'])
-
-        for test in ci_data['smoke_tests']['tests']:
-            for test_part in test[1]:
-                test_part[3] = await decode(test_part[3])
-            test[2] = await decode(test[2])
-        for test in ci_data['tests']['tests']:
-            for test_part in test[1]:
-                test_part[3] = await decode(test_part[3])
-            test[2] = await decode(test[2])
-
-        prev_ci_data = await db.get_revision_check_result(revision_id)
-
-        await db.set_revision_check_result(revision_id, ci_data)
-
-        def get_failed_tests_from_tests(tests):
-            for test_file_name, stages, test_source in tests:
-                if not all([s[1] == 0 for s in stages]):
-                    yield (test_file_name, stages, test_source)
-
-        def get_failed_tests_from_check_result(check_result):
-            smoke_tests_exit_code = check_result['smoke_tests']['exit_code']
-            if smoke_tests_exit_code != 0:
-                yield from get_failed_tests_from_tests(
-                    check_result['smoke_tests']['tests'])
+        with async_timeout.timeout(timeout, loop=loop):
+            with stage_timer('fetch'):
+                user, solution_blob = await db.get_revision_data(revision_id)
+
+            ci_data = await run_check(
+                user, revision_id, solution_blob, assignment_name,
+                assignment.solution_name, assignment.tests_dir,
+                assignment.common_header,
+                ssh_params=ssh_params, publisher=publisher, loop=loop)
+
+            async def decode(base64_field):
+                if not base64_field:
+                    return None
+                return await db.store_blob(
+                    codecs.decode(base64_field.encode(), 'base64'))
+
+            with stage_timer('store'):
+                ci_data['common_header_contents'] = await decode(
+                    ci_data['common_header_contents'])
+
+                for test in ci_data['smoke_tests']['tests']:
+                    for test_part in test[1]:
+                        test_part[3] = await decode(test_part[3])
+                    test[2] = await decode(test[2])
+                for test in ci_data['tests']['tests']:
+                    for test_part in test[1]:
+                        test_part[3] = await decode(test_part[3])
+                    test[2] = await decode(test[2])
+
+                prev_signature = await db.get_revision_failure_signature(
+                    revision_id)
+
+                # Claim may be taken over by other checker after lease
+                # expiration, its result must not be overwritten.
+                if not await db.set_revision_check_result(
+                        revision_id, ci_data, owner=owner):
+                    raise RuntimeError(
+                        "Claim on revision {} was lost, check result is "
+                        "not saved".format(revision_id))
+
+            cur_failures = get_failures(ci_data)
+            _logger.info(
+                "revision {}: in current check {} errors".format(
+                    revision_id, len(cur_failures)))
+
+            if prev_signature == failure_signature(cur_failures):
+                # No new failure since last check.
+                _logger.info(
+                    "revision {}: no new failures since last check for".format(
+                        revision_id))
+                new_state = 'reported'
             else:
-                yield from get_failed_tests_from_tests(
-                    check_result['tests']['tests'])
+                new_state = 'checked'
 
-        prev_failures = None
-        if prev_ci_data:
-            prev_failures = list(
-                get_failed_tests_from_check_result(prev_ci_data))
-            _logger.info(
-                "revision {}: in previous check {} errors".format(
-                    revision_id, len(prev_failures)))
-        cur_failures = list(get_failed_tests_from_check_result(ci_data))
-        _logger.info(
-            "revision {}: in current check {} errors".format(
-                revision_id, len(cur_failures)))
-
-        if prev_failures == cur_failures:
-            # No new failure since last check.
-            _logger.info(
-                "revision {}: no new failures since last check for".format(
-                    revision_id))
-            await db.set_revision_state(revision_id, 'reported')
-        else:
-            await db.set_revision_state(revision_id, 'checked')
+    except asyncio.CancelledError:
+        # Check was interrupted (e.g. on shutdown), revision will be
+        # checked again before failed ones.
+        new_state = 'new'
+        raise
 
     except:
-        await db.set_revision_state(revision_id, 'failed')
+        new_state = 'failed'
         raise
 
+    finally:
+        renew_claim_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await renew_claim_task
+
+        released = await db.release_revision_claim(
+            revision_id, owner, new_state)
+        _CHECKS.labels(assignment_name, new_state).inc()
+        if released:
+            _publish_event(publisher, topic, revision_id, 'state',
+                           state=new_state)
+        else:
+            _logger.warning(
+                "Claim on revision {} was lost, check result state {!r} "
+                "is not saved".format(revision_id, new_state))
+
 
-async def check_solutions(db, assignment_id, *,
+async def check_solutions(db, assignments, *,
                           ssh_params,
+                          owner=None,
+                          publisher=None,
+                          max_checks=None,
+                          concurrency=1,
+                          assignment_concurrency=None,
+                          check_timeout=None,
+                          draining=None,
                           loop):
-    _logger.info("Started checking solutions for assignment {}.".format(
-        assignment_id))
-
-    await db.reset_revision_checking_state()
-
-    while True:
-        solutions = await db.get_checkable_solutions(assignment_id)
+    """Checks claimable solutions of assignments.
+
+    Revisions of all assignments are claimed by the same query, so number
+    of database queries per run doesn't grow with number of assignments.
+
+    :param assignments: dict of assignment id -> Assignment.
+    :param max_checks: maximum number of revisions to check, all
+        available are checked if None.
+    :param concurrency: maximum number of concurrently checked revisions.
+    :param assignment_concurrency: maximum number of concurrently checked
+        revisions of single assignment, so assignment with many new
+        solutions doesn't delay checks of others. Not limited if None.
+    :param check_timeout: time in seconds after which single check is
+        cancelled and revision is marked as failed.
+    :param draining: `asyncio.Event` which is set when process is shutting
+        down, running checks are finished, but new revisions aren't
+        claimed.
+
+    Returns number of checked revisions, raises if some of checks failed.
+    """
+    if not assignments:
+        return 0
+
+    _logger.info("Started checking solutions for assignments {!r}.".format(
+        sorted(assignments)))
+
+    if owner is None:
+        owner = make_claim_owner()
+    if assignment_concurrency is None:
+        assignment_concurrency = concurrency
+
+    await db.reset_expired_revision_claims()
+    await db.mark_obsolete_revisions(list(assignments))
+
+    # assignment id -> number of running checks
+    running = collections.Counter()
+    running_changed = asyncio.Condition(loop=loop)
+
+    num_claimed = 0
+    num_checked = 0
+    failed = []
+
+    def claimable_assignment_ids():
+        return [assignment_id for assignment_id in assignments
+                if running[assignment_id] < assignment_concurrency]
+
+    async def claim():
+        # Claims are serialized by condition lock, so per-assignment limits
+        # are not exceeded by concurrent claims.
+        async with running_changed:
+            while True:
+                await running_changed.wait_for(claimable_assignment_ids)
+                if draining is not None and draining.is_set():
+                    return None
+
+                assignment_ids = claimable_assignment_ids()
+                claimed = await db.claim_checkable_solution(
+                    assignment_ids, owner, CLAIM_LEASE)
+
+                if claimed is not None:
+                    running[claimed[1]] += 1
+                    return claimed
+
+                if len(assignment_ids) == len(assignments):
+                    return None
+
+                # Assignments with all check slots taken may have more
+                # solutions to check.
+                await running_changed.wait()
+
+    async def worker():
+        nonlocal num_claimed, num_checked
+        while max_checks is None or num_claimed < max_checks:
+            num_claimed += 1
+            claimed = await claim()
+            if claimed is None:
+                num_claimed -= 1
+                _logger.info("All available solutions checked.")
+                return
+
+            revision_id, assignment_id = claimed
+            try:
+                await check_revision(
+                    db, revision_id, assignments[assignment_id],
+                    owner=owner,
+                    ssh_params=ssh_params,
+                    publisher=publisher,
+                    timeout=check_timeout,
+                    loop=loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception(
+                    "Check of revision {} failed.".format(revision_id))
+                failed.append(revision_id)
+            else:
+                num_checked += 1
+            finally:
+                async with running_changed:
+                    running[assignment_id] -= 1
+                    running_changed.notify_all()
 
-        if not solutions:
-            _logger.info("All available solutions checked.")
-            return
-        else:
-            _logger.info("Need to check {} solutions.".format(solutions))
+    workers = [loop.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers, loop=loop)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True, loop=loop)
 
-        revision_id = random.choice(solutions)
+    if failed:
+        raise RuntimeError("Checks of revisions {!r} failed".format(failed))
 
-        try:
-            await check_revision(db, revision_id, assignment_id,
-                                 ssh_params=ssh_params, loop=loop)
-        except Exception:
-            _logger.exception(
-                "Check of revision {} failed.".format(revision_id))
-            raise
+    return num_checked
@@ -1,10 +1,13 @@
 import datetime
+import hashlib
 import logging
+import time
 
 import jwt
 
 import testing_server
 from .abc import AbstractTokenProvider
+from .cache import TTLCache
 
 __all__ = ("JWTTokenProvider",)
 
@@ -16,9 +19,25 @@ class JWTTokenProvider(AbstractTokenProvider):
 
     def __init__(self,
                  secret,
-                 token_expire_period=datetime.timedelta(days=30)):
+                 token_expire_period=datetime.timedelta(days=30),
+                 *,
+                 cache_size=10000,
+                 cache_ttl=600,
+                 clock=time.time):
+        """
+        :param cache_size: maximum number of validated tokens cached to
+            avoid decoding and verifying them on every request.
+        :param cache_ttl: maximum time in seconds token stays in cache.
+        """
         self._secret = secret
         self._token_expire_period = token_expire_period
+        self._cache_ttl = cache_ttl
+        self._clock = clock
+        self._cache = TTLCache(cache_size, clock=clock)
+
+    @property
+    def cache(self):
+        return self._cache
 
     async def generate_token(self, login):
         issuer = testing_server.__name__ + ':' + testing_server.__version__
@@ -31,7 +50,21 @@ class JWTTokenProvider(AbstractTokenProvider):
         return jwt.encode(payload, self._secret)
 
     async def validate_token(self, token):
-        try:
-            return jwt.decode(token, self._secret)
-        except jwt.InvalidTokenError:
-            return None
+        if isinstance(token, str):
+            token = token.encode()
+        key = hashlib.sha256(token).digest()
+
+        payload = self._cache.get(key)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self._secret)
+            except jwt.InvalidTokenError:
+                return None
+
+            # Cached token must not outlive its expiration time.
+            expires = self._clock() + self._cache_ttl
+            if 'exp' in payload:
+                expires = min(expires, payload['exp'])
+            self._cache.put(key, payload, expires)
+
+        return dict(payload)
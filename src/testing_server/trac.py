@@ -1,10 +1,18 @@
 import logging
 
+from . import metrics
+
 _logger = logging.getLogger(__name__)
 
+# Labelled by XML-RPC method name.
+TRAC_CALL_DURATION = metrics.Histogram(
+    'trac_call_duration_seconds',
+    "Duration of Trac XML-RPC calls.", ['method'])
+
 
 async def sync_ticket(db, trac_rpc, ticket_id, component_to_assignment_id):
-    attributes = (await trac_rpc.ticket.get(ticket_id))[3]
+    with TRAC_CALL_DURATION.labels('ticket.get').time():
+        attributes = (await trac_rpc.ticket.get(ticket_id))[3]
 
     component = attributes['component']
 
@@ -25,10 +33,12 @@ async def sync_tickets(db, trac_rpc, component_to_assignment_id):
     try:
         _logger.info("Tickets sync started")
 
-        api_version = await trac_rpc.system.getAPIVersion()
+        with TRAC_CALL_DURATION.labels('system.getAPIVersion').time():
+            api_version = await trac_rpc.system.getAPIVersion()
         _logger.info("API version: {!r}".format(api_version))
 
-        tickets_ids = await trac_rpc.ticket.query("max=0")
+        with TRAC_CALL_DURATION.labels('ticket.query').time():
+            tickets_ids = await trac_rpc.ticket.query("max=0")
         _logger.info("Trac has {} tickets".format(len(tickets_ids)))
 
         for ticket_id in tickets_ids:
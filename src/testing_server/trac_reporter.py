@@ -1,13 +1,13 @@
+import asyncio
+import collections
 import logging
 import textwrap
 import pathlib
 
-from testing_server.db import (
-    LINKED_PTR_ASSIGNMENT_ID,
-    LAZY_STRING_ASSIGNMENT_ID,
-    FUNCTION_ASSIGNMENT_ID,
-    BIND_ASSIGNMENT_ID,
-)
+import async_timeout
+
+from testing_server.scheduler import run_concurrently, raise_failures
+from testing_server.trac import TRAC_CALL_DURATION
 
 _logger = logging.getLogger(__name__)
 
@@ -115,26 +115,16 @@ def format_tests(build_url, tests):
 
 
 async def report_check_result(db, trac_rpc, revision_id, ticket_id,
-                              assignment_id, *, loop):
+                              assignment, *, loop):
     # TODO
     #uri = "http://localhost:8080"
     uri = "http://cppcheck.rutsky.org"
 
-    assigments_config = {
-        LINKED_PTR_ASSIGNMENT_ID:
-            ("linked_ptr", "common.h"),
-        LAZY_STRING_ASSIGNMENT_ID:
-            ("lazy_string", "common.h"),
-        FUNCTION_ASSIGNMENT_ID:
-            ("function", "common.h"),
-        BIND_ASSIGNMENT_ID:
-            ("bind", "common.h"),
-    }
-
-    assert assignment_id in assigments_config
-    task_name, common_header_name = assigments_config[assignment_id]
+    task_name = assignment.name
+    common_header_name = assignment.common_header_name
 
-    check_result = await db.get_revision_check_result(revision_id)
+    smoke_tests_exit_code, tests_exit_code, common_header_id = \
+        await db.get_revision_check_summary(revision_id)
     user = await db.get_revision_user(revision_id)
 
     def build_url(blob_id, name):
@@ -149,7 +139,9 @@ async def report_check_result(db, trac_rpc, revision_id, ticket_id,
 
     res += "Tested revision {} by {}.\n\n".format(revision_id, user)
 
-    smoke_test_res = format_tests(build_url, check_result['smoke_tests']['tests'])
+    smoke_test_res = format_tests(
+        build_url,
+        await db.get_revision_failed_tests(revision_id, 'smoke_tests'))
     if smoke_test_res:
         res += textwrap.dedent(
             """\
@@ -158,10 +150,10 @@ async def report_check_result(db, trac_rpc, revision_id, ticket_id,
             """)
         res += smoke_test_res
 
-    smoke_tests_exit_code = check_result['smoke_tests']['exit_code']
-
     if smoke_tests_exit_code == 0:
-        main_tests_res = format_tests(build_url, check_result['tests']['tests'])
+        main_tests_res = format_tests(
+            build_url,
+            await db.get_revision_failed_tests(revision_id, 'tests'))
         if main_tests_res:
             res += textwrap.dedent(
                 """\
@@ -171,12 +163,12 @@ async def report_check_result(db, trac_rpc, revision_id, ticket_id,
             res += main_tests_res
 
     success = False
-    if smoke_tests_exit_code == 0 and check_result['tests']['exit_code'] == 0:
+    if smoke_tests_exit_code == 0 and tests_exit_code == 0:
         res += "\nAll tests passed. Good job!\n\n"
         success = True
     else:
         res += "\nCommon header used in some tests: " + build_url(
-            check_result['common_header_contents'],
+            common_header_id,
             common_header_name) + "\n\n"
 
     attributes = {}
@@ -184,40 +176,71 @@ async def report_check_result(db, trac_rpc, revision_id, ticket_id,
         attributes = {
             'type': 'ожидаются исправления'
         }
-    await trac_rpc.ticket.update(ticket_id, res, attributes, True)
-
-    #import pprint
-    #pprint.pprint(check_result)
+    with TRAC_CALL_DURATION.labels('ticket.update').time():
+        await trac_rpc.ticket.update(ticket_id, res, attributes, True)
 
     #with open('log.txt', 'a') as f:
     #    f.write(res)
 
 
-async def report_solutions(db, trac_rpc, assignment_id,
-                           *, loop):
-    _logger.info("Started reporting results for assignment {}.".format(
-        assignment_id))
+async def report_solutions(db, trac_rpc, assignments,
+                           *, concurrency=1, assignment_concurrency=None,
+                           timeout=None, loop):
+    """Reports checked solutions of assignments to their tickets.
+
+    :param assignments: dict of assignment id -> Assignment.
+    :param concurrency: maximum number of concurrent reports.
+    :param assignment_concurrency: maximum number of concurrent reports
+        of single assignment, so assignment with many checked solutions
+        doesn't delay reports of others. Not limited if None.
+    :param timeout: time in seconds after which single report is
+        cancelled.
+
+    Returns number of reported solutions, raises if some of reports failed.
+    """
+    if not assignments:
+        return 0
 
+    _logger.info("Started reporting results for assignments {!r}.".format(
+        sorted(assignments)))
+
+    if assignment_concurrency is None:
+        assignment_concurrency = concurrency
+
+    semaphore = asyncio.Semaphore(concurrency, loop=loop)
+    # assignment id -> semaphore limiting its reports
+    assignment_semaphores = collections.defaultdict(
+        lambda: asyncio.Semaphore(assignment_concurrency, loop=loop))
+
+    num_reported = 0
     while True:
-        solutions = await db.get_reportable_solutions(assignment_id)
+        solutions = await db.get_reportable_solutions(list(assignments))
 
         if not solutions:
             _logger.info("All checked solutions reported.")
-            return
+            return num_reported
         else:
             _logger.info("Need to report {} solutions.".format(solutions))
 
-        for solution in solutions:
-            revision_id, ticket_id = solution
-
-            try:
-                await report_check_result(db, trac_rpc, revision_id, ticket_id,
-                                          assignment_id, loop=loop)
-
-                await db.set_revision_state(revision_id, 'reported')
-
-            except Exception:
-                _logger.exception(
-                    "Report of revision {} to ticket {} failed.".format(
-                        revision_id, ticket_id))
-                raise
+        # revision id -> (ticket id, assignment id)
+        reports = {revision_id: (ticket_id, assignment_id)
+                   for revision_id, ticket_id, assignment_id in solutions}
+
+        async def report(revision_id):
+            nonlocal num_reported
+            ticket_id, assignment_id = reports[revision_id]
+            # Report waiting for its assignment slot doesn't take slot of
+            # other assignments.
+            async with assignment_semaphores[assignment_id], semaphore:
+                with async_timeout.timeout(timeout, loop=loop):
+                    await report_check_result(
+                        db, trac_rpc, revision_id, ticket_id,
+                        assignments[assignment_id], loop=loop)
+
+            await db.set_revision_state(revision_id, 'reported')
+            num_reported += 1
+
+        results = await run_concurrently(report, reports, loop=loop)
+        # Failed reports would be retried forever by this loop, so they
+        # are left for the next run.
+        raise_failures(results)
@@ -0,0 +1,181 @@
+import asyncio
+import contextlib
+import logging
+
+from . import json_codec
+
+__all__ = ('Broadcaster',)
+
+_logger = logging.getLogger(__name__)
+
+# "Try Again Later" close code, sent to web socket which can't keep up.
+_WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class Broadcaster:
+    """Fans out published events to web sockets.
+
+    All web sockets watching the same topic share single publisher
+    subscription. Events are collected into batches every
+    `flush_interval` seconds, each batch is JSON-encoded once and the same
+    text frame is sent to all web sockets.
+
+    Each web socket has its own bounded queue of frames, so slow client
+    doesn't delay others. Web socket which has more than
+    `max_queued_frames` unsent frames is closed.
+    """
+
+    class _Channel:
+        def __init__(self, subscriber, header):
+            self.subscriber = subscriber
+            self.header = header
+            self.websockets = set()
+            self.task = None
+
+    class _Outbox:
+        def __init__(self, ws, *, maxsize, loop):
+            self.ws = ws
+            self.queue = asyncio.Queue(maxsize, loop=loop)
+            self.topics = set()
+            self.overflowed = False
+            self.task = None
+
+    def __init__(self, publisher, *,
+                 flush_interval,
+                 max_batch_size=100,
+                 max_queued_events=1000,
+                 max_queued_frames=100,
+                 loop):
+        self._publisher = publisher
+        self._flush_interval = flush_interval
+        self._max_batch_size = max_batch_size
+        self._max_queued_events = max_queued_events
+        self._max_queued_frames = max_queued_frames
+        self._loop = loop
+
+        # topic -> _Channel
+        self._channels = {}
+        # web socket -> _Outbox
+        self._outboxes = {}
+
+        self.frames_sent = 0
+        self.frames_encoded = 0
+        self.slow_websockets_closed = 0
+
+    @property
+    def num_websockets(self):
+        return sum(len(channel.websockets)
+                   for channel in self._channels.values())
+
+    def add(self, topic, ws, header):
+        """Starts sending events from topic to web socket.
+
+        Events are sent as `dict(header, events=[...])`.
+        """
+        channel = self._channels.get(topic)
+        if channel is None:
+            sub = self._publisher.subscribe(
+                topic, maxsize=self._max_queued_events)
+            channel = self._Channel(sub, header)
+            channel.task = self._loop.create_task(self._forward(channel))
+            self._channels[topic] = channel
+
+        channel.websockets.add(ws)
+
+        outbox = self._outboxes.get(ws)
+        if outbox is None:
+            outbox = self._Outbox(
+                ws, maxsize=self._max_queued_frames, loop=self._loop)
+            outbox.task = self._loop.create_task(self._sender(outbox))
+            self._outboxes[ws] = outbox
+        outbox.topics.add(topic)
+
+    def remove(self, topic, ws):
+        channel = self._channels.get(topic)
+        if channel is not None:
+            channel.websockets.discard(ws)
+            if not channel.websockets:
+                del self._channels[topic]
+                channel.task.cancel()
+                channel.subscriber.close()
+
+        outbox = self._outboxes.get(ws)
+        if outbox is not None:
+            outbox.topics.discard(topic)
+            if not outbox.topics:
+                del self._outboxes[ws]
+                outbox.task.cancel()
+
+    async def close(self):
+        channels = list(self._channels.values())
+        self._channels.clear()
+        outboxes = list(self._outboxes.values())
+        self._outboxes.clear()
+
+        for channel in channels:
+            channel.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await channel.task
+            channel.subscriber.close()
+
+        for outbox in outboxes:
+            outbox.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await outbox.task
+
+    async def _forward(self, channel):
+        queue = channel.subscriber.queue
+        while True:
+            events = [await queue.get()]
+            await asyncio.sleep(self._flush_interval, loop=self._loop)
+
+            # Small events are coalesced into batches.
+            while not queue.empty():
+                events.append(queue.get_nowait())
+
+            for idx in range(0, len(events), self._max_batch_size):
+                batch = events[idx:idx + self._max_batch_size]
+                text = json_codec.dumps(dict(channel.header, events=batch))
+                self.frames_encoded += 1
+
+                for ws in channel.websockets:
+                    self._enqueue(self._outboxes[ws], text)
+
+    def _enqueue(self, outbox, text):
+        if outbox.overflowed:
+            return
+
+        try:
+            outbox.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            _logger.warning(
+                "Web socket has {} unsent frames, closing it".format(
+                    outbox.queue.qsize()))
+            outbox.overflowed = True
+            self.slow_websockets_closed += 1
+            outbox.task.cancel()
+            outbox.task = self._loop.create_task(self._close_slow(outbox))
+
+    async def _sender(self, outbox):
+        while True:
+            text = await outbox.queue.get()
+            try:
+                outbox.ws.send_str(text)
+                await outbox.ws.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Web socket will be removed by its handler.
+                _logger.warning(
+                    "Failed to send to web socket: {!r}".format(e))
+            else:
+                self.frames_sent += 1
+
+    async def _close_slow(self, outbox):
+        try:
+            await outbox.ws.close(
+                code=_WS_CLOSE_TRY_AGAIN_LATER, message=b'Too slow')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _logger.debug("Failed to close web socket: {!r}".format(e))
@@ -0,0 +1,50 @@
+from testing_server.assignments import AssignmentRegistry
+
+
+class StubDatabase:
+    def __init__(self, assignments):
+        self.assignments = assignments
+        self.num_loads = 0
+
+    async def get_assignments_version(self):
+        return repr(self.assignments)
+
+    async def get_assignments(self):
+        self.num_loads += 1
+        return [dict(assignment) for assignment in self.assignments]
+
+
+def _assignment(id, name, active=True):
+    return dict(
+        id=id,
+        name=name,
+        svn_path='ha{}/{}.hpp'.format(id, name),
+        trac_component='HA#{} {}'.format(id, name),
+        tests_dir='{}/tests/'.format(name),
+        common_header='{}/tests/common.h'.format(name),
+        active=active)
+
+
+async def test_registry_refresh(loop):
+    db = StubDatabase([_assignment(1, 'linked_ptr'),
+                       _assignment(2, 'bind', active=False)])
+    registry = AssignmentRegistry(db)
+
+    assert await registry.refresh()
+    assert sorted(registry.all) == [1, 2]
+    assert list(registry.active) == [1]
+
+    assignment = registry.get(1)
+    assert assignment.solution_name == 'linked_ptr.hpp'
+    assert assignment.common_header_name == 'common.h'
+    assert registry.path_to_assignment_id() == {'ha1/linked_ptr.hpp': 1}
+    assert registry.component_to_assignment_id() == {'HA#1 linked_ptr': 1}
+
+    # Unchanged assignments are not reloaded.
+    assert not await registry.refresh()
+    assert db.num_loads == 1
+
+    db.assignments[1]['active'] = True
+    assert await registry.refresh()
+    assert db.num_loads == 2
+    assert sorted(registry.active) == [1, 2]
@@ -0,0 +1,38 @@
+import hashlib
+import os
+import tempfile
+
+import pytest
+
+from testing_server.blob_store import FilesystemBlobStore
+
+
+@pytest.fixture
+def blob_store(loop):
+    with tempfile.TemporaryDirectory() as root:
+        yield FilesystemBlobStore(root, loop=loop)
+
+
+async def test_blob_store(blob_store):
+    data = b'int main() {}\n'
+    blob_id = hashlib.sha256(data).hexdigest()
+
+    path = blob_store.path(blob_id)
+    assert path == os.path.join(
+        blob_store.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    assert not await blob_store.exists(blob_id)
+    assert await blob_store.read(blob_id) is None
+
+    await blob_store.store(blob_id, data)
+    # Storing the same blob again is no-op.
+    await blob_store.store(blob_id, data)
+
+    assert await blob_store.exists(blob_id)
+    assert await blob_store.read(blob_id) == data
+    assert os.listdir(os.path.dirname(path)) == [blob_id]
+
+
+def test_blob_store_invalid_id(blob_store):
+    with pytest.raises(ValueError):
+        blob_store.path('../../etc/passwd')
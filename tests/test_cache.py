@@ -0,0 +1,81 @@
+import asyncio
+
+from testing_server.cache import LRUCache, TTLCache
+
+
+async def test_lru_cache_eviction(loop):
+    cache = LRUCache(10, loop=loop)
+
+    async def fetch(key):
+        return key * 4
+
+    assert await cache.get('a', fetch) == 'aaaa'
+    assert await cache.get('b', fetch) == 'bbbb'
+    assert cache.size == 8
+
+    # Make 'a' most recently used.
+    assert await cache.get('a', fetch) == 'aaaa'
+
+    assert await cache.get('c', fetch) == 'cccc'
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.size == 8
+
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 3
+    assert cache.stats()['evictions'] == 1
+
+
+async def test_lru_cache_coalescing(loop):
+    cache = LRUCache(100, loop=loop)
+    num_fetches = 0
+
+    async def fetch(key):
+        nonlocal num_fetches
+        num_fetches += 1
+        await asyncio.sleep(0.01, loop=loop)
+        return b'data'
+
+    res = await asyncio.gather(
+        *[cache.get('key', fetch) for _ in range(10)], loop=loop)
+    assert res == [b'data'] * 10
+    assert num_fetches == 1
+    assert cache.coalesced == 9
+
+
+async def test_lru_cache_skips_none(loop):
+    cache = LRUCache(100, loop=loop)
+
+    async def fetch(key):
+        return None
+
+    assert await cache.get('key', fetch) is None
+    assert 'key' not in cache
+
+
+def test_ttl_cache():
+    now = 100
+    cache = TTLCache(2, clock=lambda: now)
+
+    cache.put('a', 1, expires=110)
+    cache.put('b', 2, expires=120)
+    # Already expired.
+    cache.put('c', 3, expires=100)
+
+    assert cache.get('a') == 1
+    assert cache.get('c') is None
+
+    now = 115
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+    cache.put('d', 4, expires=200)
+    cache.put('e', 5, expires=200)
+    assert cache.get('b') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 3
+    assert stats['expirations'] == 1
+    assert stats['evictions'] == 1
@@ -0,0 +1,79 @@
+from testing_server.check_result import (
+    iter_test_results, get_failures, failure_signature, group_tests)
+
+
+def make_check_result(smoke_tests_exit_code=0, tests_exit_code=1):
+    return {
+        'common_header_contents': 'header',
+        'smoke_tests': {
+            'exit_code': smoke_tests_exit_code,
+            'tests': [
+                ['smoke/t1.cpp',
+                 [['build', 0, None, 'log1', ['g++', 't1.cpp']],
+                  ['run', smoke_tests_exit_code, None, 'log2']],
+                 'source1'],
+            ],
+        },
+        'tests': {
+            'exit_code': tests_exit_code,
+            'tests': [
+                ['t2.cpp',
+                 [['build', 0, None, 'log3'],
+                  ['run', tests_exit_code, 'Timeout', 'log4']],
+                 'source2'],
+                ['t3.cpp',
+                 [['build', 0, None, 'log5']],
+                 'source3'],
+            ],
+        },
+    }
+
+
+def test_iter_test_results():
+    rows = list(iter_test_results(make_check_result()))
+    assert len(rows) == 5
+    assert rows[0] == dict(
+        suite='smoke_tests', test='smoke/t1.cpp', test_index=0,
+        stage='build', stage_index=0, status=0, info=None,
+        log_blob_id='log1', command=['g++', 't1.cpp'],
+        source_blob_id='source1')
+    # Tests are indexed within suite.
+    assert rows[3]['suite'] == 'tests'
+    assert rows[3]['test_index'] == 0
+    assert rows[3]['stage_index'] == 1
+    assert rows[3]['info'] == 'Timeout'
+    assert rows[4]['test_index'] == 1
+
+
+def test_group_tests_roundtrip():
+    check_result = make_check_result()
+    rows = list(iter_test_results(check_result))
+
+    assert group_tests(
+        [row for row in rows if row['suite'] == 'smoke_tests']) == \
+        check_result['smoke_tests']['tests']
+    assert group_tests(
+        [row for row in rows if row['suite'] == 'tests']) == \
+        check_result['tests']['tests']
+
+
+def test_get_failures():
+    assert get_failures(make_check_result(0, 1)) == [
+        ('tests', 't2.cpp', 'run', 1)]
+
+    # Main tests failures are ignored if smoke tests failed.
+    assert get_failures(make_check_result(1, 1)) == [
+        ('smoke_tests', 'smoke/t1.cpp', 'run', 1)]
+
+    assert get_failures(make_check_result(0, 0)) == []
+
+
+def test_failure_signature():
+    failures = get_failures(make_check_result(0, 1))
+    assert failure_signature(failures) == \
+        failure_signature(list(reversed(failures)))
+    assert failure_signature(failures) == \
+        failure_signature(get_failures(make_check_result(0, 1)))
+    assert failure_signature(failures) != \
+        failure_signature(get_failures(make_check_result(0, 2)))
+    assert failure_signature(failures) != failure_signature([])
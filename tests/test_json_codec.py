@@ -0,0 +1,28 @@
+import pytest
+
+from testing_server import json_codec
+
+
+@pytest.fixture(params=json_codec.available())
+def codec(request):
+    prev_codec = json_codec.current()
+    json_codec.use(request.param)
+    yield request.param
+    json_codec.use(prev_codec)
+
+
+def test_round_trip(codec):
+    data = {'status': 'success', 'data': [1, 2.5, None, True, "тест"]}
+    assert json_codec.loads(json_codec.dumps(data)) == data
+    assert json_codec.loads(json_codec.dumpb(data)) == data
+    assert json_codec.dumpb(data).decode() == json_codec.dumps(data)
+
+
+def test_compatible_with_json(codec):
+    # Non-string keys are converted as by standard `json`.
+    assert json_codec.loads(json_codec.dumps({1: 'a'})) == {'1': 'a'}
+
+    with pytest.raises(json_codec.JSONDecodeError):
+        json_codec.loads('{')
+    with pytest.raises(TypeError):
+        json_codec.dumps(object())
@@ -0,0 +1,130 @@
+import asyncio
+
+from testing_server.leader import LeaderElection
+
+
+class StubLockServer:
+    """Session-level advisory locks of PostgreSQL."""
+
+    def __init__(self):
+        # key -> holding connection
+        self.locks = {}
+
+
+class StubConnection:
+    def __init__(self, server):
+        self._server = server
+
+    async def scalar(self, query, **params):
+        if query.startswith('SELECT pg_advisory_unlock('):
+            return self._server.locks.pop(params['key'], None) is self
+        return 1
+
+    def execute(self, query, **params):
+        if query == 'SELECT pg_advisory_unlock_all()':
+            self._unlock_all()
+            return _Rows([])
+
+        rows = []
+        for key in params['keys']:
+            holder = self._server.locks.setdefault(key, self)
+            rows.append((key, holder is self))
+        return _Rows(rows)
+
+    def _unlock_all(self):
+        for key, holder in list(self._server.locks.items()):
+            if holder is self:
+                del self._server.locks[key]
+
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = iter(rows)
+
+    def __await__(self):
+        return iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class StubEngine:
+    def __init__(self, server):
+        self._server = server
+
+    async def acquire(self):
+        return StubConnection(self._server)
+
+    def release(self, conn):
+        pass
+
+
+class StubDatabase:
+    def __init__(self, server):
+        self.engine = StubEngine(server)
+
+
+class StubScheduler:
+    def __init__(self, name):
+        self.name = name
+        self.running = False
+
+    @property
+    def healthy(self):
+        return self.running
+
+    def status(self):
+        return dict(name=self.name, healthy=self.healthy)
+
+    def trigger(self):
+        pass
+
+    async def start(self):
+        assert not self.running
+        self.running = True
+
+    async def stop(self):
+        assert self.running
+        self.running = False
+
+
+async def test_failover(loop):
+    server = StubLockServer()
+
+    async def start_replica():
+        election = LeaderElection(
+            StubDatabase(server), poll_interval=0.01, loop=loop)
+        scheduler = StubScheduler('svn_sync')
+        wrapped = election.wrap(scheduler)
+        await wrapped.start()
+        await election.start()
+        await asyncio.sleep(0.05, loop=loop)
+        return election, scheduler, wrapped
+
+    election1, scheduler1, wrapped1 = await start_replica()
+    election2, scheduler2, wrapped2 = await start_replica()
+
+    # Exactly one replica runs the job, both are healthy.
+    assert scheduler1.running
+    assert not scheduler2.running
+    assert wrapped1.healthy and wrapped2.healthy
+    assert wrapped1.status()['leader']
+    assert not wrapped2.status()['leader']
+
+    # Leader shuts down, standby takes over.
+    await wrapped1.stop()
+    await election1.stop()
+    assert not scheduler1.running
+    await asyncio.sleep(0.05, loop=loop)
+    assert scheduler2.running
+    assert wrapped2.is_leader
+
+    await wrapped2.stop()
+    await election2.stop()
+    assert not server.locks
@@ -7,7 +7,10 @@ import pytest
 import aiohttp
 from aiohttp import hdrs
 
+from testing_server.blob_store import FilesystemBlobStore
 from testing_server.server import Server
+from testing_server.pubsub import Publisher
+from testing_server.ratelimit import TokenBucketLimiter
 from testing_server.token_provider import JWTTokenProvider
 from testing_server.credentials_checker import HtpasswdCredentialsChecker
 
@@ -24,22 +27,123 @@ def credentials_checker():
         f.flush()
         os.fsync(f.fileno())
 
-        yield HtpasswdCredentialsChecker(f.name)
+        checker = HtpasswdCredentialsChecker(f.name)
+        yield checker
+        checker.close()
 
 
 @pytest.fixture
-def client(loop: asyncio.BaseEventLoop, test_server, test_client,
-           credentials_checker, token_provider):
-    app = aiohttp.web.Application(loop=loop)
-    db = None  # TODO
-    app_server = Server(app, credentials_checker, token_provider, db, loop=loop)
-    loop.run_until_complete(app_server.start())
-    server = loop.run_until_complete(test_server(app))
-    client = loop.run_until_complete(test_client(server))
+def make_client(loop: asyncio.BaseEventLoop, test_server, test_client,
+                credentials_checker, token_provider):
+    """Returns coroutine function which starts `Server` with given
+    database and keyword arguments and returns test client for it."""
+    app_servers = []
 
-    yield client
+    async def make(db=None, **server_kwargs):
+        app = aiohttp.web.Application(loop=loop)
+        app_server = Server(
+            app, credentials_checker, token_provider, db, loop=loop,
+            **server_kwargs)
+        await app_server.start()
+        app_servers.append(app_server)
+        return await test_client(await test_server(app))
 
-    loop.run_until_complete(app_server.stop())
+    yield make
+
+    for app_server in app_servers:
+        loop.run_until_complete(app_server.stop())
+
+
+@pytest.fixture
+def client(loop, make_client):
+    return loop.run_until_complete(make_client())
+
+
+class BlobsDatabase:
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.num_queries = 0
+
+    async def get_blob(self, blob_id):
+        self.num_queries += 1
+        return self.blobs.get(blob_id)
+
+
+class RevisionsDatabase:
+    def __init__(self, revision_users):
+        self.revision_users = revision_users
+
+    async def get_revision_user(self, revision_id):
+        return self.revision_users.get(revision_id)
+
+
+class ListingDatabase:
+    def __init__(self, revisions):
+        self.revisions = revisions
+        self.num_queries = 0
+
+    async def get_revisions(self, *, user=None, assignment=None, state=None,
+                            after=None, limit, fields):
+        self.num_queries += 1
+        revisions = [
+            r for r in self.revisions
+            if (user is None or r['user'] == user) and
+               (assignment is None or r['assignment'] == assignment) and
+               (after is None or r['id'] > after)]
+        return [{field: r[field] for field in fields}
+                for r in revisions[:limit]]
+
+    async def get_revision(self, id, *, fields):
+        for r in self.revisions:
+            if r['id'] == id:
+                return {field: r[field] for field in fields}
+        return None
+
+
+@pytest.fixture
+def listing_client(loop, make_client):
+    db = ListingDatabase([
+        dict(id=id, user='user' if id % 2 else 'other_user',
+             assignment='linked_ptr', state='checked', check_result={})
+        for id in range(1, 21)])
+    return loop.run_until_complete(make_client(db, admin_users=['admin']))
+
+
+@pytest.fixture
+def publisher(loop):
+    return Publisher(loop=loop)
+
+
+@pytest.fixture
+def progress_client(loop, make_client, publisher):
+    db = RevisionsDatabase({1: 'user', 2: 'other_user'})
+    return loop.run_until_complete(make_client(
+        db, publisher=publisher, ws_flush_interval=0.01))
+
+
+@pytest.fixture
+def blobs_db():
+    return BlobsDatabase({'a' * 64: b'0123456789'})
+
+
+@pytest.fixture
+def blobs_client(loop, make_client, blobs_db):
+    return loop.run_until_complete(make_client(blobs_db))
+
+
+@pytest.fixture(params=['database', 'filesystem'])
+def range_client(request, loop, make_client, blobs_db, tmpdir):
+    """Serves blobs of `blobs_db` from database or moved to filesystem
+    blob store."""
+    if request.param == 'database':
+        return loop.run_until_complete(make_client(blobs_db))
+
+    blob_store = FilesystemBlobStore(str(tmpdir), loop=loop)
+    for blob_id in list(blobs_db.blobs):
+        loop.run_until_complete(
+            blob_store.store(blob_id, blobs_db.blobs.pop(blob_id)))
+    return loop.run_until_complete(
+        make_client(blobs_db, blob_store=blob_store))
 
 
 async def get_success_resp_data(resp: aiohttp.ClientResponse):
@@ -70,3 +174,261 @@ async def test_server_auth(client):
         headers={hdrs.AUTHORIZATION: 'Bearer {}'.format(token)})
     message = await get_success_resp_data(resp)
     assert 'valid' in message
+
+
+async def test_blob_caching(blobs_client, blobs_db):
+    url = '/api/blobs/{}/task/user/1/test.log'.format('a' * 64)
+
+    resp = await blobs_client.get(url)
+    assert resp.status == 200
+    assert await resp.read() == b'0123456789'
+    etag = resp.headers[hdrs.ETAG]
+    assert etag == '"{}"'.format('a' * 64)
+    assert 'immutable' in resp.headers[hdrs.CACHE_CONTROL]
+    assert blobs_db.num_queries == 1
+
+    resp = await blobs_client.get(url, headers={hdrs.IF_NONE_MATCH: etag})
+    assert resp.status == 304
+    assert blobs_db.num_queries == 1
+
+    # "*" matches only existing blob.
+    resp = await blobs_client.get(url, headers={hdrs.IF_NONE_MATCH: '*'})
+    assert resp.status == 304
+    missing_url = '/api/blobs/{}/task/user/1/test.log'.format('b' * 64)
+    resp = await blobs_client.get(
+        missing_url, headers={hdrs.IF_NONE_MATCH: '*'})
+    assert resp.status == 404
+
+
+async def test_blob_range(range_client):
+    url = '/api/blobs/{}/task/user/1/test.log'.format('a' * 64)
+
+    resp = await range_client.get(url, headers={hdrs.RANGE: 'bytes=2-4'})
+    assert resp.status == 206
+    assert await resp.read() == b'234'
+    assert resp.headers[hdrs.CONTENT_RANGE] == 'bytes 2-4/10'
+
+    resp = await range_client.get(url, headers={hdrs.RANGE: 'bytes=-3'})
+    assert resp.status == 206
+    assert await resp.read() == b'789'
+
+    resp = await range_client.get(url, headers={hdrs.RANGE: 'bytes=20-'})
+    assert resp.status == 416
+    assert resp.headers[hdrs.CONTENT_RANGE] == 'bytes */10'
+
+    # If-Range requires strong match, otherwise whole blob is sent.
+    etag = '"{}"'.format('a' * 64)
+    resp = await range_client.get(
+        url, headers={hdrs.RANGE: 'bytes=2-4', hdrs.IF_RANGE: etag})
+    assert resp.status == 206
+    assert await resp.read() == b'234'
+    for if_range in ('W/' + etag, '*'):
+        resp = await range_client.get(
+            url, headers={hdrs.RANGE: 'bytes=2-4', hdrs.IF_RANGE: if_range})
+        assert resp.status == 200
+        assert await resp.read() == b'0123456789'
+
+
+async def test_ws_check_progress(progress_client, token_provider,
+                                 publisher):
+    token = (await token_provider.generate_token('user')).decode()
+
+    ws = await progress_client.ws_connect('/api/ws')
+    await ws.send_json({'type': 'AUTH', 'token': token})
+    assert (await ws.receive_json())['status'] == 'success'
+
+    # Revision of other user.
+    await ws.send_json({'type': 'SUBSCRIBE', 'token': token, 'revision': 2})
+    assert (await ws.receive_json())['status'] == 'fail'
+
+    await ws.send_json({'type': 'SUBSCRIBE', 'token': token, 'revision': 1})
+    assert (await ws.receive_json())['status'] == 'success'
+
+    publisher.publish('check.linked_ptr.2', {'type': 'output', 'line': 'x'})
+    publisher.publish('check.linked_ptr.1', {'type': 'output', 'line': 'a'})
+    publisher.publish('check.linked_ptr.1', {'type': 'output', 'line': 'b'})
+
+    data = await ws.receive_json()
+    assert data == {
+        'type': 'CHECK_PROGRESS',
+        'revision': 1,
+        'events': [
+            {'type': 'output', 'line': 'a'},
+            {'type': 'output', 'line': 'b'},
+        ],
+    }
+
+    await ws.close()
+
+
+async def test_token_validation_cache(token_provider):
+    token = await token_provider.generate_token('user')
+
+    payload = await token_provider.validate_token(token)
+    assert payload['login'] == 'user'
+    assert await token_provider.validate_token(token) == payload
+    assert token_provider.cache.stats()['hits'] == 1
+
+    assert await token_provider.validate_token(b'invalid') is None
+
+
+async def test_htpasswd_reload(loop):
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(b'user:password\n')
+        f.flush()
+
+        def rewrite(contents, *, mtime_delta):
+            f.seek(0)
+            f.truncate()
+            f.write(contents)
+            f.flush()
+            stat = os.stat(f.name)
+            os.utime(f.name, (stat.st_atime, stat.st_mtime + mtime_delta))
+
+        checker = HtpasswdCredentialsChecker(
+            f.name, reload_check_interval=0, loop=loop)
+        try:
+            assert await checker.check_password('user', 'password')
+            assert not await checker.check_password('user', 'wrong')
+            # Successful verification is cached.
+            assert await checker.check_password('user', 'password')
+            assert checker.cache.stats()['hits'] == 1
+
+            rewrite(b'user:new_password\n', mtime_delta=1)
+            assert not await checker.check_password('user', 'password')
+            assert await checker.check_password('user', 'new_password')
+
+            # Malformed file is not loaded, reload is retried.
+            rewrite(b'user\n', mtime_delta=2)
+            assert await checker.check_password('user', 'new_password')
+            rewrite(b'user:password\n', mtime_delta=3)
+            assert await checker.check_password('user', 'password')
+        finally:
+            checker.close()
+
+
+async def test_login_throttling(make_client):
+    # Test client connects from 127.0.0.1.
+    client = await make_client(
+        failed_login_limiter=TokenBucketLimiter(rate=0.01, burst=2),
+        trusted_proxies=['127.0.0.0/8'])
+
+    async def login(password, forwarded_for):
+        return await client.post(
+            '/api/login',
+            data=json.dumps(dict(login='user', password=password)),
+            headers={'Content-Type': 'application/json',
+                     'X-Forwarded-For': forwarded_for})
+
+    assert (await login('wrong', '10.0.0.1')).status == 400
+    assert (await login('wrong', '10.0.0.1')).status == 400
+
+    resp = await login('password', '10.0.0.1')
+    assert resp.status == 429
+    assert int(resp.headers[hdrs.RETRY_AFTER]) > 0
+
+    # User is not locked out for other clients.
+    assert (await login('password', '10.0.0.2')).status == 200
+    # Address added by trusted proxy is used, not forged by client.
+    resp = await login('password', '10.0.0.2, 10.0.0.1, 127.0.0.2')
+    assert resp.status == 429
+
+
+async def test_revisions_listing(listing_client, token_provider):
+    async def get(url, login='user'):
+        token = (await token_provider.generate_token(login)).decode()
+        return await listing_client.get(
+            url, headers={hdrs.AUTHORIZATION: 'Bearer {}'.format(token)})
+
+    url = '/users/user/linked_ptr/'
+
+    data = await get_success_resp_data(
+        await get(url + '?limit=4&fields=state'))
+    assert data['revisions'] == [
+        dict(id=id, state='checked') for id in (1, 3, 5, 7)]
+    assert data['next'] == 7
+
+    data = await get_success_resp_data(
+        await get(url + '?after=7&limit=4&fields=state'))
+    assert [r['id'] for r in data['revisions']] == [9, 11, 13, 15]
+
+    data = await get_success_resp_data(await get(url + '?after=15'))
+    assert [r['id'] for r in data['revisions']] == [17, 19]
+    assert 'check_result' not in data['revisions'][0]
+    assert data['next'] is None
+
+    resp = await get(url + '?fields=password')
+    assert resp.status == 400
+
+    resp = await get('/users/other_user/linked_ptr/')
+    assert resp.status == 403
+
+    resp = await get('/revisions')
+    assert resp.status == 403
+
+    data = await get_success_resp_data(
+        await get('/revisions?limit=1000&fields=id', login='admin'))
+    assert [r['id'] for r in data['revisions']] == list(range(1, 21))
+
+    data = await get_success_resp_data(await get(url + '3/'))
+    assert data['check_result'] == {}
+
+    resp = await get(url + '2/')
+    assert resp.status == 404
+
+
+async def test_metrics(make_client):
+    client = await make_client(enable_metrics=True)
+
+    await get_success_resp_data(await client.get('/'))
+
+    resp = await client.get('/metrics')
+    assert resp.status == 200
+    text = await resp.text()
+    assert 'http_request_duration_seconds_count{method="GET",route="/"}' \
+        in text
+    assert 'http_responses_total{method="GET",route="/",status="200"}' \
+        in text
+
+
+class StubScheduler:
+    def __init__(self, name, healthy):
+        self.name = name
+        self.healthy = healthy
+
+    def status(self):
+        return dict(name=self.name, healthy=self.healthy)
+
+
+async def test_readiness(make_client, token_provider):
+    schedulers = [StubScheduler('svn_sync', True),
+                  StubScheduler('check_solutions_sync', True)]
+
+    client = await make_client(admin_users=['admin'], schedulers=schedulers)
+
+    await get_success_resp_data(await client.get('/api/ready'))
+
+    schedulers[1].healthy = False
+    resp = await client.get('/api/ready')
+    assert resp.status == 503
+    data = await resp.json()
+    assert data['data']['schedulers'] == ['check_solutions_sync']
+
+    token = (await token_provider.generate_token('admin')).decode()
+    data = await get_success_resp_data(await client.get(
+        '/api/admin/schedulers',
+        headers={hdrs.AUTHORIZATION: 'Bearer {}'.format(token)}))
+    assert [s['name'] for s in data] == ['svn_sync', 'check_solutions_sync']
+
+
+async def test_status_only(make_client):
+    schedulers = [StubScheduler('check_solutions_sync', True)]
+    client = await make_client(
+        enable_metrics=True, schedulers=schedulers, status_only=True)
+
+    await get_success_resp_data(await client.get('/api/ready'))
+    assert (await client.get('/metrics')).status == 200
+
+    # Web API is not served.
+    resp = await client.post('/api/login')
+    assert resp.status in (404, 405)
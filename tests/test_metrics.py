@@ -0,0 +1,40 @@
+from testing_server.metrics import Counter, Gauge, Histogram, Registry
+
+
+async def test_exposition(loop):
+    registry = Registry()
+    requests = Counter('requests', "Requests.", ['route'], registry=registry)
+    queue = Gauge('queue', "Queue depth.", ['state'], registry=registry)
+    duration = Histogram('duration_seconds', "Duration.",
+                         buckets=[0.1, 1], registry=registry)
+
+    requests.labels('/users').inc()
+    requests.labels('/users').inc(2)
+    requests.labels('/a"b').inc()
+    duration.observe(0.05)
+    duration.observe(0.1)
+    duration.observe(5)
+
+    async def collect():
+        queue.clear()
+        queue.labels('new').set(3)
+
+    registry.add_collector(collect)
+    await registry.collect()
+
+    assert registry.expose().splitlines() == [
+        '# HELP requests Requests.',
+        '# TYPE requests counter',
+        'requests_total{route="/users"} 3',
+        'requests_total{route="/a\\"b"} 1',
+        '# HELP queue Queue depth.',
+        '# TYPE queue gauge',
+        'queue{state="new"} 3',
+        '# HELP duration_seconds Duration.',
+        '# TYPE duration_seconds histogram',
+        'duration_seconds_bucket{le="0.1"} 2',
+        'duration_seconds_bucket{le="1.0"} 2',
+        'duration_seconds_bucket{le="+Inf"} 3',
+        'duration_seconds_sum 5.15',
+        'duration_seconds_count 3',
+    ]
@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import json
+
+import async_timeout
+
+from testing_server import pg_pubsub
+from testing_server.pg_pubsub import PostgresPublisher
+
+_Notify = collections.namedtuple('_Notify', 'channel payload')
+
+
+class _StubConnection:
+    """Listening connection, delivers notifications of `_StubDatabase`."""
+
+    def __init__(self, *, loop, broken=False):
+        self.connection = self
+        self.notifies = asyncio.Queue(loop=loop)
+        self.channels = set()
+        self.broken = broken
+
+    async def execute(self, sql):
+        command, channel = sql.split()
+        if command == 'LISTEN':
+            if self.broken:
+                raise ConnectionError("Connection is broken")
+            self.channels.add(channel.strip('"'))
+        else:
+            self.channels.discard(channel.strip('"'))
+
+    async def scalar(self, sql):
+        if self.broken:
+            raise ConnectionError("Connection is broken")
+        return 1
+
+
+class _StubDatabase:
+    def __init__(self, *, loop):
+        self._loop = loop
+        self.engine = self
+        self.connections = []
+        self.released = []
+        # Number of next acquired connections which are broken.
+        self.num_broken_connections = 0
+        # id -> payload
+        self.payloads = {}
+
+    async def acquire(self):
+        conn = _StubConnection(
+            loop=self._loop, broken=self.num_broken_connections > 0)
+        self.num_broken_connections -= 1
+        self.connections.append(conn)
+        return conn
+
+    def release(self, conn):
+        self.released.append(conn)
+
+    async def notify(self, channel, payload):
+        assert len(payload.encode()) < 8000
+        for conn in self.connections:
+            if channel in conn.channels and not conn.broken:
+                conn.notifies.put_nowait(_Notify(channel, payload))
+
+    async def store_pubsub_payload(self, payload):
+        payload_id = len(self.payloads) + 1
+        self.payloads[payload_id] = payload
+        return payload_id
+
+    async def get_pubsub_payload(self, id):
+        return self.payloads.get(id)
+
+    async def delete_old_pubsub_payloads(self, max_age):
+        pass
+
+
+async def test_large_payload(loop):
+    db = _StubDatabase(loop=loop)
+    publisher = PostgresPublisher(db, loop=loop)
+    await publisher.start()
+
+    large_message = {'line': 'x' * 10000}
+    with async_timeout.timeout(5, loop=loop), \
+            publisher.subscribe('topic') as sub:
+        publisher.publish('topic', {'line': 'a'})
+        publisher.publish('topic', large_message)
+
+        assert await sub.queue.get() == {'line': 'a'}
+        assert await sub.queue.get() == large_message
+
+    # Only large message is stored in table.
+    assert len(db.payloads) == 1
+
+    await publisher.stop()
+    assert db.released == db.connections
+
+
+async def test_missing_payload(loop):
+    db = _StubDatabase(loop=loop)
+    publisher = PostgresPublisher(db, loop=loop)
+    await publisher.start()
+
+    with async_timeout.timeout(5, loop=loop), \
+            publisher.subscribe('topic') as sub:
+        # E.g. payload which was already cleaned up.
+        await db.notify('testing_server_pubsub', json.dumps(dict(ref=100)))
+        publisher.publish('topic', 'message')
+
+        # Listener survives missing payload.
+        assert await sub.queue.get() == 'message'
+        assert sub.queue.empty()
+
+    await publisher.stop()
+
+
+async def test_reconnect(loop, monkeypatch):
+    monkeypatch.setattr(pg_pubsub, '_LISTEN_HEALTH_CHECK_INTERVAL', 0.01)
+    monkeypatch.setattr(pg_pubsub, '_RECONNECT_DELAY', 0.01)
+
+    db = _StubDatabase(loop=loop)
+    publisher = PostgresPublisher(db, loop=loop)
+    await publisher.start()
+
+    with async_timeout.timeout(5, loop=loop), \
+            publisher.subscribe('topic') as sub:
+        # The first reconnect fails at LISTEN.
+        db.num_broken_connections = 1
+        db.connections[0].broken = True
+
+        # Broken connections are detected by health check or LISTEN and
+        # released.
+        while len(db.connections) < 3:
+            await asyncio.sleep(0.01, loop=loop)
+        assert db.released == db.connections[:2]
+
+        publisher.publish('topic', 'message')
+        assert await sub.queue.get() == 'message'
+
+    await publisher.stop()
+    assert db.released == db.connections
@@ -5,7 +5,11 @@ import inspect
 
 import async_timeout
 
-from testing_server.pubsub import Publisher
+from testing_server.pubsub import (
+    Publisher, DISCONNECTED,
+    OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_COALESCE,
+    OVERFLOW_DISCONNECT,
+)
 
 
 def set_timeout(timeout=30):
@@ -46,3 +50,97 @@ async def test_pubsub(loop):
     res = await asyncio.gather(
         read_topic1_task1, read_topic1_task2, read_topic2_task1)
     assert res == ['test1', 'test1', 'test2']
+
+
+def get_all(queue):
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get_nowait())
+    return messages
+
+
+def test_pubsub_drop_oldest(loop):
+    pub = Publisher(loop=loop)
+
+    with pub.subscribe('topic', maxsize=2,
+                       overflow=OVERFLOW_DROP_OLDEST) as sub:
+        for i in range(5):
+            pub.publish('topic', i)
+
+        assert get_all(sub.queue) == [3, 4]
+        assert sub.dropped == 3
+        assert pub.dropped == 3
+
+
+def test_pubsub_drop_newest(loop):
+    pub = Publisher(loop=loop)
+
+    with pub.subscribe('topic', maxsize=2,
+                       overflow=OVERFLOW_DROP_NEWEST) as sub:
+        for i in range(5):
+            pub.publish('topic', i)
+
+        assert get_all(sub.queue) == [0, 1]
+        assert sub.dropped == 3
+
+
+def test_pubsub_coalesce(loop):
+    pub = Publisher(loop=loop)
+
+    with pub.subscribe('topic', maxsize=2, overflow=OVERFLOW_COALESCE,
+                       key=lambda m: m[0]) as sub:
+        pub.publish('topic', ('a', 1))
+        pub.publish('topic', ('b', 1))
+        pub.publish('topic', ('a', 2))
+        assert sub.dropped == 0
+
+        # New key in full queue: the oldest message is dropped.
+        pub.publish('topic', ('c', 1))
+        assert sub.dropped == 1
+
+        assert get_all(sub.queue) == [('b', 1), ('c', 1)]
+
+
+def test_pubsub_disconnect(loop):
+    pub = Publisher(loop=loop, maxsize=2, overflow=OVERFLOW_DISCONNECT)
+
+    with pub.subscribe('topic') as sub:
+        for i in range(3):
+            pub.publish('topic', i)
+
+        assert sub.disconnected
+        assert get_all(sub.queue) == [DISCONNECTED]
+        assert pub.disconnected == 1
+
+        # Disconnected subscriber doesn't receive messages.
+        pub.publish('topic', 4)
+        assert sub.queue.empty()
+
+
+def test_pubsub_wildcards(loop):
+    pub = Publisher(loop=loop)
+
+    subs = {
+        pattern: pub.subscribe(pattern)
+        for pattern in [
+            'check.linked_ptr.1', 'check.linked_ptr.*', 'check.*.1',
+            'check.#', '#', 'check.*', 'check.linked_ptr.1.#',
+        ]
+    }
+
+    pub.publish('check.linked_ptr.1', 'a')
+    pub.publish('check.bind.2', 'b')
+    pub.publish('check', 'c')
+
+    assert get_all(subs['check.linked_ptr.1'].queue) == ['a']
+    assert get_all(subs['check.linked_ptr.*'].queue) == ['a']
+    assert get_all(subs['check.*.1'].queue) == ['a']
+    assert get_all(subs['check.#'].queue) == ['a', 'b', 'c']
+    assert get_all(subs['#'].queue) == ['a', 'b', 'c']
+    assert get_all(subs['check.*'].queue) == []
+    assert get_all(subs['check.linked_ptr.1.#'].queue) == ['a']
+
+    for sub in subs.values():
+        sub.close()
+
+    assert not pub._subscribers._root.children
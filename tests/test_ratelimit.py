@@ -0,0 +1,51 @@
+import pytest
+
+from testing_server.ratelimit import TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    clock = Clock()
+    limiter = TokenBucketLimiter(rate=1, burst=2, clock=clock)
+
+    assert limiter.consume('a') == 0
+    assert limiter.consume('a') == 0
+    assert limiter.consume('a') == pytest.approx(1)
+    # Other keys have own buckets.
+    assert limiter.consume('b') == 0
+
+    clock.now = 0.5
+    assert limiter.check('a') == pytest.approx(0.5)
+
+    clock.now = 1
+    assert limiter.check('a') == 0
+    assert limiter.consume('a') == 0
+    assert limiter.consume('a') == pytest.approx(1)
+
+    assert limiter.rejected == 3
+
+
+def test_token_bucket_expiration():
+    clock = Clock()
+    limiter = TokenBucketLimiter(rate=1, burst=2, max_keys=3, clock=clock)
+
+    limiter.consume('a')
+    clock.now = 1
+    limiter.consume('b')
+    assert len(limiter) == 2
+
+    # 'a' bucket is full again.
+    clock.now = 2
+    limiter.check('c')
+    assert len(limiter) == 1
+
+    for key in ['c', 'd', 'e', 'f']:
+        limiter.consume(key)
+    assert len(limiter) == 3
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from testing_server.scheduler import (
+    PeriodicScheduler, RUN_SUCCESS, RUN_TIMEOUT, MORE_WORK, IDLE,
+    run_concurrently, raise_failures)
+
+
+async def test_run_history(loop):
+    num_runs = 0
+    third_run_finished = asyncio.Event(loop=loop)
+
+    async def work():
+        nonlocal num_runs
+        num_runs += 1
+        if num_runs == 1:
+            raise ValueError
+        elif num_runs == 2:
+            await asyncio.sleep(1, loop=loop)
+        else:
+            third_run_finished.set()
+
+    scheduler = PeriodicScheduler(
+        work, 0.1, "test", timeout=0.05, history_size=2, loop=loop)
+    assert not scheduler.healthy
+
+    await scheduler.start()
+    await third_run_finished.wait()
+    assert scheduler.healthy
+    await scheduler.stop()
+
+    # The oldest run is dropped.
+    history = scheduler.history
+    assert [(run.outcome, run.exception_type) for run in history] == [
+        (RUN_TIMEOUT, None),
+        (RUN_SUCCESS, None),
+    ]
+    assert history[0].duration >= 0.05
+
+    status = scheduler.status()
+    assert status['name'] == 'test'
+    assert status['last_success'] is not None
+    assert status['history'][1]['outcome'] == RUN_SUCCESS
+
+
+async def test_adaptive_scheduling(loop):
+    results = [MORE_WORK, MORE_WORK, None, IDLE, IDLE, IDLE]
+    num_runs = 0
+    ran = asyncio.Event(loop=loop)
+
+    async def work():
+        nonlocal num_runs
+        num_runs += 1
+        ran.set()
+        return results.pop(0) if results else IDLE
+
+    scheduler = PeriodicScheduler(
+        work, 0.05, "test", max_idle_period=0.1, jitter=0, loop=loop)
+    await scheduler.start()
+
+    # Runs returned MORE_WORK are repeated without waiting.
+    await asyncio.sleep(0.02, loop=loop)
+    assert num_runs == 3
+
+    # Idle delay grows up to maximum.
+    await asyncio.sleep(0.2, loop=loop)
+    assert scheduler.status()['idle_delay'] == 0.1
+
+    ran.clear()
+    num_runs = 0
+    scheduler.trigger()
+    await asyncio.wait_for(ran.wait(), 0.05, loop=loop)
+    assert num_runs == 1
+
+    await scheduler.stop()
+
+
+async def test_drain(loop):
+    started = asyncio.Event(loop=loop)
+    finished = False
+    num_runs = 0
+
+    async def work():
+        nonlocal finished, num_runs
+        num_runs += 1
+        started.set()
+        await asyncio.sleep(0.05, loop=loop)
+        finished = True
+        return MORE_WORK
+
+    scheduler = PeriodicScheduler(work, 0.01, "test", jitter=0, loop=loop)
+    await scheduler.start()
+    await started.wait()
+
+    # Running run is finished, but the next one isn't started.
+    await scheduler.drain(1)
+    assert finished
+    assert num_runs == 1
+    await scheduler.stop()
+
+    # Run which doesn't finish in time is cancelled.
+    started.clear()
+    finished = False
+    await scheduler.start()
+    await started.wait()
+    await scheduler.drain(0.01)
+    assert not finished
+    await scheduler.stop()
+
+
+async def test_run_concurrently(loop):
+    async def work(key):
+        if key == 'slow':
+            await asyncio.sleep(1, loop=loop)
+        elif key == 'failing':
+            raise ValueError
+        await asyncio.sleep(0.01, loop=loop)
+        return key
+
+    results = await run_concurrently(
+        work, ['a', 'slow', 'failing', 'b'], timeout=0.05, loop=loop)
+
+    assert results['a'] == 'a'
+    assert results['b'] == 'b'
+    assert isinstance(results['slow'], asyncio.TimeoutError)
+    assert isinstance(results['failing'], ValueError)
+
+    with pytest.raises(RuntimeError):
+        raise_failures(results)
+    raise_failures(dict(a='a'))
+
+    # Cancellation isn't reported as failed run.
+    task = loop.create_task(run_concurrently(work, ['slow'], loop=loop))
+    await asyncio.sleep(0.01, loop=loop)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
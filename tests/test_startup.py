@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+# Imported only by roles or options which use them. Import time is
+# measured by benchmarks/startup_time.py.
+_LAZY_MODULES = (
+    'aiohttp_cors',
+    'aioxmlrpc',
+    'asyncssh',
+    'passlib',
+    'psycopg2',
+    'raven',
+    'raven_aiohttp',
+    'sqlalchemy',
+)
+
+# Seconds, import of server script with all dependencies. Leaves room for
+# connecting to database and binding socket in restart under a second.
+_IMPORT_BUDGET = 0.75
+
+
+def test_server_script_import():
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, testing_server.scripts.server; '
+        'print("\\n".join(sorted(sys.modules)))'])
+
+    imported = {name.split('.')[0] for name in output.decode().split()}
+    assert 'testing_server' in imported
+    assert not imported.intersection(_LAZY_MODULES)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason="-X importtime requires Python 3.7")
+def test_server_script_import_time():
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import testing_server.scripts.server'],
+        stderr=subprocess.PIPE, check=True).stderr.decode()
+
+    # Cumulative times of top-level imports include nested ones, which
+    # are indented.
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  ') and cumulative.strip().isdigit():
+            total += int(cumulative) / 1e6
+    assert total < _IMPORT_BUDGET
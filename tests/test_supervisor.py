@@ -0,0 +1,37 @@
+import os
+import signal
+import tempfile
+
+from testing_server.supervisor import Supervisor
+
+
+def test_restart_and_stop():
+    prev_handlers = {signum: signal.getsignal(signum)
+                     for signum in (signal.SIGINT, signal.SIGTERM)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runs_file = os.path.join(tmp_dir, 'runs')
+
+        def worker():
+            with open(runs_file, 'a') as f:
+                f.write('run\n')
+            with open(runs_file) as f:
+                num_runs = len(f.readlines())
+
+            if num_runs == 1:
+                # Crashed worker is restarted.
+                return 1
+
+            # Supervisor forwards signal and exits.
+            os.kill(os.getppid(), signal.SIGTERM)
+            signal.pause()
+
+        try:
+            supervisor = Supervisor([('worker', worker)], restart_delay=0.01)
+            assert supervisor.run() == 0
+        finally:
+            for signum, handler in prev_handlers.items():
+                signal.signal(signum, handler)
+
+        with open(runs_file) as f:
+            assert len(f.readlines()) == 2
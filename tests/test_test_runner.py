@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from testing_server import test_runner
+from testing_server.assignments import Assignment
+from testing_server.test_runner import check_revision
+
+_ASSIGNMENT = Assignment(
+    1, 'linked_ptr', 'trunk/linked_ptr/linked_ptr.hpp', 'linked_ptr',
+    'linked_ptr', None, True)
+
+
+class _StubDatabase:
+    def __init__(self, claimed=True):
+        self.claimed = claimed
+        self.check_results = {}
+        self.released = []
+
+    async def get_revision_data(self, revision_id):
+        return 'user', b'solution'
+
+    async def renew_revision_claim(self, revision_id, owner, lease):
+        return self.claimed
+
+    async def get_revision_failure_signature(self, revision_id):
+        return None
+
+    async def set_revision_check_result(self, revision_id, check_result, *,
+                                        owner):
+        if not self.claimed:
+            return False
+        self.check_results[revision_id] = check_result
+        return True
+
+    async def release_revision_claim(self, revision_id, owner, new_state):
+        self.released.append((revision_id, owner, new_state))
+        return True
+
+
+@pytest.fixture
+def started_check(loop, monkeypatch):
+    """Replaces remote check by the one which never finishes, returns
+    event which is set when check is started."""
+    started = asyncio.Event(loop=loop)
+
+    async def run_check(*args, loop, **kwargs):
+        started.set()
+        await asyncio.sleep(60, loop=loop)
+
+    monkeypatch.setattr(test_runner, 'run_check', run_check)
+    return started
+
+
+async def test_cancelled_check_is_resumed(loop, started_check):
+    db = _StubDatabase()
+    task = loop.create_task(check_revision(
+        db, 1, _ASSIGNMENT, owner='owner', ssh_params={}, loop=loop))
+
+    await started_check.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Interrupted check is returned to queue.
+    assert db.released == [(1, 'owner', 'new')]
+
+
+async def test_timed_out_check_fails(loop, started_check):
+    db = _StubDatabase()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await check_revision(
+            db, 1, _ASSIGNMENT, owner='owner', ssh_params={}, timeout=0.01,
+            loop=loop)
+
+    assert db.released == [(1, 'owner', 'failed')]
+
+
+async def test_result_of_lost_claim_is_not_saved(loop, monkeypatch):
+    async def run_check(*args, loop, **kwargs):
+        return {
+            'common_header_contents': None,
+            'smoke_tests': {'exit_code': 0, 'tests': []},
+            'tests': {'exit_code': 0, 'tests': []},
+        }
+
+    monkeypatch.setattr(test_runner, 'run_check', run_check)
+
+    db = _StubDatabase()
+    await check_revision(
+        db, 1, _ASSIGNMENT, owner='owner', ssh_params={}, loop=loop)
+    assert 1 in db.check_results
+    assert db.released == [(1, 'owner', 'checked')]
+
+    db = _StubDatabase(claimed=False)
+    with pytest.raises(RuntimeError):
+        await check_revision(
+            db, 1, _ASSIGNMENT, owner='owner', ssh_params={}, loop=loop)
+    assert not db.check_results
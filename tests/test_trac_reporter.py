@@ -0,0 +1,55 @@
+import asyncio
+import collections
+
+from testing_server import trac_reporter
+from testing_server.assignments import Assignment
+from testing_server.trac_reporter import report_solutions
+
+_ASSIGNMENTS = {
+    id: Assignment(id, name, 'trunk/{0}/{0}.hpp'.format(name), name, name,
+                   None, True)
+    for id, name in ((1, 'linked_ptr'), (2, 'lazy_string'))}
+
+
+class _StubDatabase:
+    def __init__(self, solutions):
+        # [(revision id, ticket id, assignment id)]
+        self.solutions = solutions
+        self.reported = []
+
+    async def get_reportable_solutions(self, assignment_ids):
+        return [solution for solution in self.solutions
+                if solution[0] not in self.reported]
+
+    async def set_revision_state(self, revision_id, state):
+        assert state == 'reported'
+        self.reported.append(revision_id)
+
+
+async def test_assignment_concurrency(loop, monkeypatch):
+    running = collections.Counter()
+    max_running = collections.Counter()
+
+    async def report_check_result(db, trac_rpc, revision_id, ticket_id,
+                                  assignment, *, loop):
+        running[assignment.id] += 1
+        max_running[assignment.id] = max(
+            max_running[assignment.id], running[assignment.id])
+        await asyncio.sleep(0.01, loop=loop)
+        running[assignment.id] -= 1
+
+    monkeypatch.setattr(
+        trac_reporter, 'report_check_result', report_check_result)
+
+    # The first assignment has backlog, the second one isn't starved.
+    db = _StubDatabase(
+        [(revision_id, revision_id, 1) for revision_id in range(1, 6)] +
+        [(6, 6, 2)])
+    num_reported = await report_solutions(
+        db, None, _ASSIGNMENTS, concurrency=3, assignment_concurrency=2,
+        loop=loop)
+
+    assert num_reported == 6
+    # Reported in the first batch together with two reports of backlog.
+    assert db.reported.index(6) < 3
+    assert max_running == {1: 2, 2: 1}
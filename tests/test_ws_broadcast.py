@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import async_timeout
+
+from testing_server.pubsub import Publisher
+from testing_server.ws_broadcast import Broadcaster
+
+
+class _StubWebSocket:
+    def __init__(self, *, loop, stalled=False):
+        self.frames = asyncio.Queue(loop=loop)
+        self.stalled = stalled
+        self.close_code = None
+        self._loop = loop
+
+    def send_str(self, text):
+        self.frames.put_nowait(json.loads(text))
+
+    async def drain(self):
+        if self.stalled:
+            # Client doesn't read, write buffer is full.
+            await asyncio.sleep(60, loop=self._loop)
+
+    async def close(self, *, code, message):
+        self.close_code = code
+
+
+async def test_broadcast(loop):
+    publisher = Publisher(loop=loop)
+    broadcaster = Broadcaster(publisher, flush_interval=0.01, loop=loop)
+
+    ws1 = _StubWebSocket(loop=loop)
+    ws2 = _StubWebSocket(loop=loop)
+    broadcaster.add('check.task.1', ws1, {'revision': 1})
+    broadcaster.add('check.task.1', ws2, {'revision': 1})
+
+    publisher.publish('check.task.1', 'a')
+    publisher.publish('check.task.1', 'b')
+
+    with async_timeout.timeout(5, loop=loop):
+        for ws in (ws1, ws2):
+            assert await ws.frames.get() == {
+                'revision': 1, 'events': ['a', 'b']}
+
+    # Batch is encoded once for all web sockets.
+    assert broadcaster.frames_encoded == 1
+    assert broadcaster.frames_sent == 2
+
+    broadcaster.remove('check.task.1', ws1)
+    broadcaster.remove('check.task.1', ws2)
+    assert broadcaster.num_websockets == 0
+
+    await broadcaster.close()
+
+
+async def test_slow_websocket(loop):
+    publisher = Publisher(loop=loop)
+    broadcaster = Broadcaster(
+        publisher, flush_interval=0.01, max_queued_frames=2, loop=loop)
+
+    stalled_ws = _StubWebSocket(loop=loop, stalled=True)
+    ws = _StubWebSocket(loop=loop)
+    broadcaster.add('check.task.1', stalled_ws, {'revision': 1})
+    broadcaster.add('check.task.1', ws, {'revision': 1})
+
+    # Stalled web socket doesn't delay others.
+    with async_timeout.timeout(5, loop=loop):
+        for i in range(5):
+            publisher.publish('check.task.1', i)
+            assert await ws.frames.get() == {'revision': 1, 'events': [i]}
+
+    # Stalled web socket is closed instead of dropping its events.
+    await asyncio.sleep(0, loop=loop)
+    assert stalled_ws.close_code == 1013
+    assert broadcaster.slow_websockets_closed == 1
+
+    await broadcaster.close()